@@ -1,10 +1,38 @@
-from pydantic import BaseModel
+import os
+from typing import List, Type, TypeVar, Union
+
+from fastapi.responses import ORJSONResponse
+from pydantic import BaseModel, ConfigDict
+
+# Em produção as respostas montadas pelo próprio backend não são revalidadas;
+# ENABLE_VALIDATION=true mantém a validação completa (útil em desenvolvimento)
+ENABLE_VALIDATION = os.getenv("ENABLE_VALIDATION", "false").lower() == "true"
+
+ModelT = TypeVar("ModelT", bound=BaseModel)
+
+# Modelos de entrada: campos extras são descartados e as instâncias são imutáveis
+REQUEST_MODEL_CONFIG = ConfigDict(extra="ignore", frozen=True, validate_assignment=False)
+
+
+def build_response(model_cls: Type[ModelT], **fields) -> Union[ModelT, ORJSONResponse]:
+    """Monta a resposta de um DTO com dados confiáveis (gerados pelo backend).
+
+    Sem validação, os campos (já com os defaults do modelo) são serializados direto,
+    sem o ciclo dict -> modelo -> dict que o FastAPI faria com o response_model.
+    Vale apenas para DTOs planos; não usar para payloads vindos do cliente. A rota não deve declarar
+    response_model (senão o FastAPI revalida o modelo devolvido): documentar com responses={200: {"model": ...}}.
+    """
+    if ENABLE_VALIDATION:
+        return model_cls(**fields)
+    return ORJSONResponse(model_cls.model_construct(**fields).__dict__)
+
 
 class UploadResponse(BaseModel):
     message: str
     pdf_name: str
 
 class QuestionRequest(BaseModel):
+    model_config = REQUEST_MODEL_CONFIG
     question: str
     pdf_name: str
 
@@ -17,5 +45,11 @@ class ChatHistoryResponse(BaseModel):
     question: str
     answer: str
 
+class ChatHistoryBatch(BaseModel):
+    """Histórico em formato colunar: a linha i é (pdf_names[i], questions[i], answers[i])"""
+    pdf_names: List[str]
+    questions: List[str]
+    answers: List[str]
+
 class TableCreationResponse(BaseModel):
-    message: str
\ No newline at end of file
+    message: str
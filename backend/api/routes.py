@@ -1,37 +1,89 @@
-from fastapi import APIRouter, UploadFile, File, Form, Request
-from fastapi.responses import HTMLResponse
+import asyncio
+import orjson
+from contextlib import asynccontextmanager
+from typing import List
+
+from fastapi import APIRouter, BackgroundTasks, Depends, FastAPI, UploadFile, File, Form, Request
+from fastapi.responses import HTMLResponse, ORJSONResponse, StreamingResponse
 from fastapi.templating import Jinja2Templates
+from api.models import ChatHistoryBatch, QuestionRequest, TableCreationResponse, UploadResponse, build_response
 from services.pdf_service import PDFService
 from services.chat_service import ChatService
 from services.db_service import DBService
+from services.dynamodb_service import DynamoDBService
+from services.chromadb_client import ChromaDBService
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Cria os serviços uma única vez por processo e os guarda em app.state"""
+    dynamodb = DynamoDBService()
+    chromadb = ChromaDBService()
+    app.state.pdf_service = PDFService()
+    app.state.chat_service = ChatService(dynamodb=dynamodb, chromadb=chromadb)
+    app.state.db_service = DBService(dynamodb=dynamodb, chromadb=chromadb)
+    # A página inicial não depende da requisição: renderizada uma única vez
+    app.state.index_html = templates.get_template("index.html").render()
+    yield
+
 
-router = APIRouter()
-templates = Jinja2Templates(directory="frontend/templates")
+router = APIRouter(default_response_class=ORJSONResponse)
+templates = Jinja2Templates(directory="frontend/templates", auto_reload=False, cache_size=400)
 
-pdf_service = PDFService()
-chat_service = ChatService()
-db_service = DBService()
+
+def get_pdf_service(request: Request) -> PDFService:
+    return request.app.state.pdf_service
+
+def get_chat_service(request: Request) -> ChatService:
+    return request.app.state.chat_service
+
+def get_db_service(request: Request) -> DBService:
+    return request.app.state.db_service
 
 @router.get("/", response_class=HTMLResponse)
-def index(request: Request):
-    return templates.TemplateResponse("index.html", {"request": request})
+async def index(request: Request):
+    return HTMLResponse(request.app.state.index_html, headers={"Cache-Control": "public, max-age=300"})
+
+@router.post("/upload", responses={200: {"model": UploadResponse}})
+async def upload_pdf(file: UploadFile = File(...), pdf_service: PDFService = Depends(get_pdf_service)):
+    result = await pdf_service.upload_pdf(file)
+    return build_response(UploadResponse, **result)
 
-@router.post("/upload")
-def upload_pdf(file: UploadFile = File(...)):
-    return pdf_service.upload_pdf(file)
+@router.get("/pdfs", response_model=List[str])
+async def list_pdfs(pdf_service: PDFService = Depends(get_pdf_service)):
+    return await asyncio.to_thread(pdf_service.list_pdfs)
 
-@router.get("/pdfs")
-def list_pdfs():
-    return pdf_service.list_pdfs()
+@router.post("/ask", response_class=StreamingResponse)
+async def ask_question(payload: QuestionRequest, chat_service: ChatService = Depends(get_chat_service)):
+    # Resposta enviada como Server-Sent Events à medida que o LLM gera o texto
+    # (mesmo formato do /chat/stream do main.py)
+    async def event_stream():
+        async for event in chat_service.stream_question(payload.question, payload.pdf_name):
+            yield b"data: " + orjson.dumps(event) + b"\n\n"
+        yield b"data: [DONE]\n\n"
 
-@router.post("/ask")
-def ask_question(question: str, pdf_name: str):
-    return chat_service.ask_question(question, pdf_name)
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
 
-@router.get("/chat-history")
-def recent_chats():
-    return db_service.recent_chats()
+@router.get("/chat-history", responses={200: {"model": ChatHistoryBatch}})
+async def recent_chats(db_service: DBService = Depends(get_db_service)):
+    chats = await asyncio.to_thread(db_service.recent_chats)
+    return build_response(
+        ChatHistoryBatch,
+        pdf_names=[chat["pdf_name"] for chat in chats],
+        questions=[chat["question"] for chat in chats],
+        answers=[chat["answer"] for chat in chats]
+    )
 
-@router.post("/create-table")
-def create_table_from_pdf(pdf_name: str = Form(...)):
-    return db_service.create_table_from_pdf(pdf_name)
\ No newline at end of file
+@router.post("/create-table", status_code=202, response_model=TableCreationResponse)
+async def create_table_from_pdf(
+    background_tasks: BackgroundTasks,
+    pdf_name: str = Form(...),
+    db_service: DBService = Depends(get_db_service)
+):
+    # Processamento longo: executado após a resposta (BackgroundTasks roda funções síncronas no threadpool)
+    background_tasks.add_task(db_service.create_table_from_pdf, pdf_name)
+    return {"message": f"Criação da tabela do PDF {pdf_name} iniciada"}
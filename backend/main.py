@@ -1,32 +1,70 @@
 from fastapi import FastAPI, UploadFile, File, HTTPException, Depends, Form, BackgroundTasks, Query, Request
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import ORJSONResponse, StreamingResponse
 from pydantic import BaseModel
+import asyncio
 import logging
+import logging.handlers
 import os
+import queue
+import heapq
 import time
 import uuid
-import json
-from datetime import datetime
-from typing import List, Dict, Any, Optional
-import tempfile
-from concurrent.futures import ThreadPoolExecutor
-
+import orjson
+from contextlib import asynccontextmanager
+from typing import List, Dict, Any, Optional, Tuple, Callable
+import threading
+import multiprocessing
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+from cachetools import TTLCache
+from boto3.dynamodb.conditions import Key
+
+from api.models import build_response, REQUEST_MODEL_CONFIG
 from services.dynamodb_service import DynamoDBService
 from services.chromadb_client import ChromaDBService
-from services.chat_service import ChatService
+from services.chat_service import ChatService, fit_context_docs
 from services.db_service import DBService
 from services.pdf_processing_service import PDFProcessingService
 from services.s3_pdf_processor import S3PDFProcessor
+from services.upload_utils import save_upload_to_tempfile, file_digest, has_pdf_signature
+from services.query_batcher import QueryBatcher
+
 
+# Os registros de log vão para uma fila; uma thread dedicada (QueueListener) formata e escreve,
+# assim os handlers das requisições não disputam o lock nem esperam pelo I/O do log
+log_queue = queue.SimpleQueue()
+_log_output_handler = logging.StreamHandler()
+_log_output_handler.setFormatter(logging.Formatter(logging.BASIC_FORMAT))
+root_logger = logging.getLogger()
+root_logger.handlers = [logging.handlers.QueueHandler(log_queue)]
+root_logger.setLevel(logging.INFO)
+log_listener = logging.handlers.QueueListener(log_queue, _log_output_handler, respect_handler_level=True)
+log_listener.start()
 
-logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
 
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Inicialização e encerramento da aplicação"""
+    # Aquecimento em segundo plano: o servidor já atende, mas /health responde 503 até terminar
+    warmup_task = asyncio.create_task(asyncio.to_thread(_warmup))
+    status_cleanup_task = asyncio.create_task(_status_cleanup_loop())
+    yield
+    warmup_task.cancel()
+    status_cleanup_task.cancel()
+    # Grava os chats ainda na fila antes de encerrar
+    await asyncio.to_thread(dynamodb_service.flush_chat_writes)
+    # Escreve os logs pendentes e encerra a thread do listener
+    log_listener.stop()
+
+
 app = FastAPI(
     title="ChatHib Backend",
     description="Backend com suporte a Chat com RAG, DynamoDB, ChromaDB e Geração de tabelas delta",
-    version="2.1.0"
+    version="2.1.0",
+    default_response_class=ORJSONResponse,
+    lifespan=lifespan
 )
 
 # CORS
@@ -44,15 +82,18 @@ app.add_middleware(
     expose_headers=["*"]  
 )
 
-# Inicializar serviços
+# Inicializar serviços (clientes DynamoDB/ChromaDB compartilhados entre os serviços)
 dynamodb_service = DynamoDBService()
 chromadb_service = ChromaDBService()
 
 use_bedrock = os.getenv("USE_BEDROCK", "true").lower() == "true"
-chat_service = ChatService(use_bedrock=use_bedrock)
+chat_service = ChatService(use_bedrock=use_bedrock, dynamodb=dynamodb_service, chromadb=chromadb_service)
+
+db_service = DBService(dynamodb=dynamodb_service, chromadb=chromadb_service)
+pdf_processing_service = PDFProcessingService(dynamodb=dynamodb_service, chromadb=chromadb_service)
 
-db_service = DBService()
-pdf_processing_service = PDFProcessingService()
+# Buscas de /chat e /query concorrentes são agrupadas em uma única requisição ao ChromaDB
+query_batcher = QueryBatcher(chromadb_service)
 
 try:
     s3_processor = S3PDFProcessor(use_bedrock=use_bedrock)
@@ -61,11 +102,107 @@ except Exception as e:
     logger.error(f"Erro ao inicializar S3PDFProcessor: {e}")
     s3_processor = None
 
-# Cache para armazenar status de processamento
-processing_status = {}
+# Cache para armazenar status de processamento (limitado e com expiração, para não crescer
+# indefinidamente). Escrito pelas tarefas em background e lido pelos endpoints: acesso sob lock
+processing_status = TTLCache(
+    maxsize=int(os.getenv("STATUS_MAX", "10000")),
+    ttl=int(os.getenv("STATUS_TTL", "86400"))
+)
+processing_status_lock = threading.RLock()
+
+# Status sem atualização há mais de STATUS_CLEAR_AFTER segundos são removidos pela limpeza periódica.
+# Heap de (prazo monotônico, task_id) + último prazo de cada tarefa: a limpeza só visita os vencidos
+STATUS_CLEAR_AFTER = int(os.getenv("STATUS_CLEAR_AFTER", "3600"))
+STATUS_CLEAR_INTERVAL = int(os.getenv("STATUS_CLEAR_INTERVAL", "60"))
+_status_expiry_heap: List[Tuple[float, str]] = []
+_status_deadlines: Dict[str, float] = {}
+
+# Resultados das verificações de conectividade (ChromaDB, S3) reaproveitados por HEALTH_CACHE_TTL segundos:
+# dashboards fazendo polling custam ~1 verificação real por intervalo. Nome -> (instante monotônico, resultado)
+HEALTH_CACHE_TTL = float(os.getenv("HEALTH_CACHE_TTL", "5"))
+_probe_results: Dict[str, Tuple[float, Any]] = {}
+_probe_locks = {"chromadb": threading.Lock(), "s3": threading.Lock()}
+
+# Com REDIS_URL definido os status ficam no Redis, compartilhados entre workers do Uvicorn e réplicas
+# (o polling de /upload-status pode cair em qualquer processo) e expirados pelo próprio Redis após
+# STATUS_CLEAR_AFTER segundos sem atualização; sem ele, no cache em memória acima
+REDIS_URL = os.getenv("REDIS_URL")
+STATUS_KEY_PREFIX = "task:"
+status_redis = None
+if REDIS_URL:
+    try:
+        import redis
+        status_redis = redis.Redis.from_url(REDIS_URL, socket_connect_timeout=2, socket_timeout=2)
+        status_redis.ping()
+        logger.info("Status de processamento armazenados no Redis")
+    except Exception as e:
+        logger.error(f"Erro ao conectar ao Redis, usando status em memória: {e}")
+        status_redis = None
+
+# Uploads repetidos (mesmo usuário, nome e conteúdo) reaproveitam a tarefa já concluída. Com Redis, no mesmo
+# store dos status (compartilhado entre workers: um DELETE em qualquer processo vale para todos), um hash por
+# (user_id, nome do arquivo) com digest -> task_id; sem ele, em memória: (user_id, nome do arquivo, digest) -> task_id
+UPLOAD_DEDUP_TTL = int(os.getenv("UPLOAD_DEDUP_TTL", "3600"))
+UPLOAD_DEDUP_KEY_PREFIX = "upload:"
+upload_dedup = TTLCache(maxsize=int(os.getenv("UPLOAD_DEDUP_MAX", "10000")), ttl=UPLOAD_DEDUP_TTL)
+upload_dedup_lock = threading.Lock()
+
+# Listagens de /s3-files por pasta, reaproveitadas por S3_LIST_CACHE_TTL segundos (polling da UI)
+s3_list_cache = TTLCache(maxsize=128, ttl=int(os.getenv("S3_LIST_CACHE_TTL", "30")))
+s3_list_cache_lock = threading.Lock()
+
+# Com USE_PROCESS_POOL=1 o processamento de PDFs roda em um pool de processos (paralelismo real
+# para a extração, que é CPU-bound); caso contrário, em thread via BackgroundTasks
+USE_PROCESS_POOL = os.getenv("USE_PROCESS_POOL", "0") == "1"
+PDF_PROCESS_WORKERS = int(os.getenv("PDF_PROCESS_WORKERS", str(os.cpu_count() or 2)))
+
+# Pool de processos (criado sob demanda no processo principal)
+pdf_process_pool = None
+
+# Nos processos do pool: fila para enviar eventos de status ao processo principal
+_worker_event_queue = None
+
+# Endpoints de debug só ficam disponíveis com ENABLE_DEBUG=true
+ENABLE_DEBUG = os.getenv("ENABLE_DEBUG", "false").lower() == "true"
+
+# Limite de requisições simultâneas nos endpoints que chamam embeddings/LLM: quando
+# saturado, responde 503 imediatamente em vez de acumular trabalho no threadpool
+CHAT_CONCURRENCY = int(os.getenv("CHAT_CONCURRENCY", "8"))
+UPLOAD_CONCURRENCY = int(os.getenv("UPLOAD_CONCURRENCY", "2"))
+
+class RequestLimiter:
+    """Semáforo não bloqueante: entra se houver vaga, senão levanta HTTP 503"""
+
+    def __init__(self, limit: int, name: str):
+        self._semaphore = asyncio.Semaphore(limit)
+        self.name = name
+
+    async def __aenter__(self):
+        if self._semaphore.locked():
+            logger.warning(f"Limite de concorrência atingido em {self.name}")
+            raise HTTPException(
+                status_code=503,
+                detail="Servidor ocupado, tente novamente em instantes",
+                headers={"Retry-After": "1"}
+            )
+        await self._semaphore.acquire()
+        return self
+
+    async def __aexit__(self, *exc_info):
+        self._semaphore.release()
+
+chat_limiter = RequestLimiter(CHAT_CONCURRENCY, "/chat")
+upload_limiter = RequestLimiter(UPLOAD_CONCURRENCY, "/upload-pdf")
+
+async def chat_slot():
+    """Dependência que ocupa uma vaga do chat_limiter durante a requisição"""
+    async with chat_limiter:
+        yield
 
-# Thread pool para processamento assíncrono
-executor = ThreadPoolExecutor(max_workers=2)
+async def upload_slot():
+    """Dependência que ocupa uma vaga do upload_limiter durante a requisição"""
+    async with upload_limiter:
+        yield
 
 class ProcessingStatus:
     PENDING = "pending"
@@ -74,25 +211,30 @@ class ProcessingStatus:
     ERROR = "error"
 
 class ChatRequest(BaseModel):
+    model_config = REQUEST_MODEL_CONFIG
     message: str
     pdf_name: Optional[str] = None
     user_id: Optional[str] = None
     use_context: bool = True
     max_context_chunks: int = 5
+    no_cache: bool = False  # True: ignora respostas em cache e gera uma nova
 
 class FeedbackRequest(BaseModel):
+    model_config = REQUEST_MODEL_CONFIG
     message_id: str
     feedback_type: int  # 0 = positivo, 1 = negativo
     comment: Optional[str] = None
     user_id: Optional[str] = None
 
 class QueryRequest(BaseModel):
+    model_config = REQUEST_MODEL_CONFIG
     question: str
     pdf_name: str
     user_id: Optional[str] = None
     top_k: int = 5
 
 class UserRequest(BaseModel):
+    model_config = REQUEST_MODEL_CONFIG
     name: str
     email: str
     additional_info: Optional[Dict[str, Any]] = None
@@ -107,15 +249,234 @@ class PDFUploadResponse(BaseModel):
     task_id: Optional[str] = None
 
 
+# Timestamp ISO (UTC) com granularidade de segundo, formatado no máximo uma vez por segundo
+_cached_timestamp = (0, "")
+
+def utc_timestamp() -> str:
+    """Retorna o timestamp UTC atual em ISO 8601, reaproveitando a string dentro do mesmo segundo"""
+    global _cached_timestamp
+    second, formatted = _cached_timestamp
+    now = int(time.time())
+    if now != second:
+        formatted = time.strftime("%Y-%m-%dT%H:%M:%S", time.gmtime(now))
+        _cached_timestamp = (now, formatted)
+    return formatted
+
+def _cached_probe(name: str, probe: Callable[[], Any]) -> Any:
+    """Executa a verificação (bloqueante) ou reaproveita o resultado recente; chamadas simultâneas
+    esperam a que está em andamento em vez de repeti-la"""
+    with _probe_locks[name]:
+        cached = _probe_results.get(name)
+        if cached is not None and time.monotonic() - cached[0] < HEALTH_CACHE_TTL:
+            return cached[1]
+        result = probe()
+        _probe_results[name] = (time.monotonic(), result)
+        return result
+
+def check_chromadb_health() -> bool:
+    """Health check do serviço ChromaDB (com cache curto)"""
+    return _cached_probe("chromadb", chromadb_service.client.health_check)
+
+def check_s3_connection() -> bool:
+    """Teste de conexão com o S3 (com cache curto)"""
+    return _cached_probe("s3", s3_processor.test_s3_connection)
+
+# Fica True quando o aquecimento termina (com sucesso ou não); até lá /health responde 503
+warmup_done = False
+
+def _warmup():
+    """Faz uma busca de teste para carregar o modelo de embeddings e o índice do ChromaDB e, com
+    LLM_WARMUP=true, uma chamada mínima ao LLM (credenciais e conexão prontas antes da primeira pergunta)"""
+    global warmup_done
+    start_time = time.time()
+    try:
+        chromadb_service.search_similar_content(
+            query="warmup",
+            pdf_name=None,
+            user_id="__warmup__",
+            max_results=1
+        )
+        chat_service.warmup_llm()
+        logger.info(f"Aquecimento concluído em {time.time() - start_time:.2f}s")
+    except Exception as e:
+        logger.warning(f"Falha no aquecimento: {e}")
+    finally:
+        warmup_done = True
+
+def _store_status(task_id: str, entry: dict):
+    """Grava o status no processo principal e renova o prazo de limpeza da tarefa"""
+    if status_redis is not None:
+        status_redis.set(STATUS_KEY_PREFIX + task_id, orjson.dumps(entry), ex=STATUS_CLEAR_AFTER)
+        return
+    deadline = time.monotonic() + STATUS_CLEAR_AFTER
+    with processing_status_lock:
+        processing_status[task_id] = entry
+        _status_deadlines[task_id] = deadline
+        heapq.heappush(_status_expiry_heap, (deadline, task_id))
+
+def clear_expired_status() -> int:
+    """Remove os status cujo prazo venceu; retorna quantos foram removidos"""
+    if status_redis is not None:
+        # As chaves expiram no próprio Redis
+        return 0
+    now = time.monotonic()
+    removed = 0
+    with processing_status_lock:
+        while _status_expiry_heap and _status_expiry_heap[0][0] <= now:
+            deadline, task_id = heapq.heappop(_status_expiry_heap)
+            # Entrada antiga de uma tarefa atualizada depois: o prazo vigente está mais adiante no heap
+            if _status_deadlines.get(task_id) != deadline:
+                continue
+            del _status_deadlines[task_id]
+            if processing_status.pop(task_id, None) is not None:
+                removed += 1
+    return removed
+
+async def _status_cleanup_loop():
+    """Limpeza periódica dos status antigos (não depende de chamadas a /clear-old-status)"""
+    while True:
+        await asyncio.sleep(STATUS_CLEAR_INTERVAL)
+        removed = clear_expired_status()
+        if removed:
+            logger.info(f"Limpeza periódica: {removed} status antigos removidos")
+
+def get_task_status(task_id: str) -> Optional[dict]:
+    """Retorna o status de uma tarefa (ou None se não existir/tiver expirado)"""
+    if status_redis is not None:
+        raw = status_redis.get(STATUS_KEY_PREFIX + task_id)
+        return orjson.loads(raw) if raw is not None else None
+    with processing_status_lock:
+        return processing_status.get(task_id)
+
+def snapshot_processing_status() -> List[tuple]:
+    """Cópia dos pares (task_id, status) para iteração fora do lock"""
+    if status_redis is not None:
+        keys = list(status_redis.scan_iter(match=STATUS_KEY_PREFIX + "*", count=1000))
+        if not keys:
+            return []
+        prefix_len = len(STATUS_KEY_PREFIX)
+        return [
+            (key.decode()[prefix_len:], orjson.loads(raw))
+            for key, raw in zip(keys, status_redis.mget(keys))
+            if raw is not None
+        ]
+    with processing_status_lock:
+        return list(processing_status.items())
+
+def count_processing_status() -> int:
+    """Número de tarefas com status armazenado"""
+    if status_redis is not None:
+        return sum(1 for _ in status_redis.scan_iter(match=STATUS_KEY_PREFIX + "*", count=1000))
+    return len(processing_status)
+
+def _upload_dedup_redis_key(user_id: str, filename: str) -> str:
+    return UPLOAD_DEDUP_KEY_PREFIX + orjson.dumps([user_id, filename]).decode()
+
+def _remember_upload(user_id: str, filename: str, digest: str, task_id: str):
+    """Registra a tarefa que processa este upload (para reaproveitar em uploads repetidos)"""
+    if status_redis is not None:
+        key = _upload_dedup_redis_key(user_id, filename)
+        pipe = status_redis.pipeline()
+        pipe.hset(key, digest, task_id)
+        pipe.expire(key, UPLOAD_DEDUP_TTL)
+        pipe.execute()
+        return
+    with upload_dedup_lock:
+        upload_dedup[(user_id, filename, digest)] = task_id
+
+def forget_uploads(user_id: str, filename: str, digest: str = None):
+    """Descarta as tarefas registradas para um arquivo (todas as versões, ou só a do digest)"""
+    if status_redis is not None:
+        key = _upload_dedup_redis_key(user_id, filename)
+        if digest is None:
+            status_redis.delete(key)
+        else:
+            status_redis.hdel(key, digest)
+        return
+    with upload_dedup_lock:
+        for key in [key for key in upload_dedup if key[:2] == (user_id, filename) and digest in (None, key[2])]:
+            del upload_dedup[key]
+
+def find_reusable_upload(user_id: str, filename: str, digest: str) -> Optional[Tuple[str, dict]]:
+    """
+    Tarefa (task_id, resultado) de um upload idêntico já concluído com o PDF indexado. Tarefas que
+    terminaram com erro ou sem indexar o PDF não são reaproveitadas (e deixam de ser consideradas)
+    """
+    if status_redis is not None:
+        raw = status_redis.hget(_upload_dedup_redis_key(user_id, filename), digest)
+        task_id = raw.decode() if raw is not None else None
+    else:
+        with upload_dedup_lock:
+            task_id = upload_dedup.get((user_id, filename, digest))
+    if task_id is None:
+        return None
+    
+    task = get_task_status(task_id)
+    if task is None:
+        forget_uploads(user_id, filename, digest)
+        return None
+    result = task.get("result") or {}
+    if task["status"] == ProcessingStatus.COMPLETED and result.get("traditional_processing", {}).get("success"):
+        return task_id, result
+    if task["status"] in (ProcessingStatus.COMPLETED, ProcessingStatus.ERROR):
+        forget_uploads(user_id, filename, digest)
+    return None
+
+def _init_pdf_worker(event_queue):
+    """Inicializador dos processos do pool de PDFs"""
+    global _worker_event_queue
+    _worker_event_queue = event_queue
+
+def _drain_worker_events(event_queue):
+    """Aplica no processo principal os eventos enviados pelos processos do pool"""
+    while True:
+        kind, payload = event_queue.get()
+        if kind == "status":
+            task_id, entry = payload
+            _store_status(task_id, entry)
+        elif kind == "pdf_indexed":
+            chat_service.invalidate_answer_cache(payload)
+
+def _get_pdf_process_pool() -> ProcessPoolExecutor:
+    """Cria (uma vez) o pool de processos e a thread que consome seus eventos"""
+    global pdf_process_pool
+    if pdf_process_pool is None:
+        # spawn: não herda as threads/conexões abertas do servidor
+        mp_context = multiprocessing.get_context("spawn")
+        event_queue = mp_context.Queue()
+        threading.Thread(
+            target=_drain_worker_events, args=(event_queue,), name="pdf-worker-events", daemon=True
+        ).start()
+        pdf_process_pool = ProcessPoolExecutor(
+            max_workers=PDF_PROCESS_WORKERS,
+            mp_context=mp_context,
+            initializer=_init_pdf_worker,
+            initargs=(event_queue,)
+        )
+        logger.info(f"Pool de processos para PDFs iniciado com {PDF_PROCESS_WORKERS} workers")
+    return pdf_process_pool
+
+def _notify_pdf_indexed(pdf_name: str):
+    """Invalida respostas em cache do PDF (no processo principal, se estiver em um worker)"""
+    if _worker_event_queue is not None:
+        _worker_event_queue.put(("pdf_indexed", pdf_name))
+    else:
+        chat_service.invalidate_answer_cache(pdf_name)
+
 def update_processing_status(task_id: str, status: str, progress: int = 0, message: str = "", result: dict = None):
     """Atualiza o status de processamento"""
-    processing_status[task_id] = {
+    entry = {
         "status": status,
         "progress": progress,
         "message": message,
         "result": result,
-        "timestamp": datetime.utcnow().isoformat()
+        "timestamp": utc_timestamp()
     }
+    if _worker_event_queue is not None:
+        # Executando no pool de processos: o status vive no processo principal
+        _worker_event_queue.put(("status", (task_id, entry)))
+    else:
+        _store_status(task_id, entry)
     
     # Log detalhado baseado no status
     if status == ProcessingStatus.COMPLETED:
@@ -128,7 +489,7 @@ def update_processing_status(task_id: str, status: str, progress: int = 0, messa
         logger.info(f"Status atualizado para {task_id}: {status} ({progress}%) - {message}")
 
     # Log adicional para debug
-    logger.debug(f"Task {task_id} - Status: {status}, Progress: {progress}%, Total tasks: {len(processing_status)}")
+    logger.debug("Task %s - Status: %s, Progress: %s%%", task_id, status, progress)
 
 def _format_processing_time(seconds: float) -> str:
     """Formata tempo de processamento em formato legível"""
@@ -141,8 +502,64 @@ def _format_processing_time(seconds: float) -> str:
         hours = seconds / 3600
         return f"{hours:.2f}h"
 
-def process_pdf_sync(file_content: bytes, filename: str, user_id: str, task_id: str):
-    """Processa PDF em background"""
+def _build_context_and_sources(similar_docs: List[dict], default_pdf_name: str) -> tuple:
+    """
+    Monta o contexto para o modelo (limitado a MAX_CTX_CHARS, como nas buscas do ChatService), a lista
+    de fontes e o número de PDFs distintos numa única passada pelos documentos
+    """
+    texts = []
+    sources = []
+    pdfs_found = {}  # dict como conjunto ordenado
+    for doc in fit_context_docs(similar_docs):
+        text = doc.get("text", "")
+        metadata = doc.get("metadata", {})
+        pdf_name = metadata.get("pdf_name", default_pdf_name)
+        texts.append(text)
+        pdfs_found[pdf_name] = None
+        sources.append({
+            "text": text[:200] + "...",
+            "pdf_name": pdf_name,
+            "chunk_index": metadata.get("chunk_index", 0),
+            "similarity_score": doc.get("score", 0)
+        })
+    return " ".join(texts), sources, len(pdfs_found)
+
+def _s3_error_message(s3_result: dict) -> str:
+    """Mensagem detalhada (para o status da tarefa) de um erro da extração S3"""
+    error_message = s3_result['error']
+    error_type = s3_result.get('error_type', 'unknown')
+    solution = s3_result.get('solution', '')
+    
+    # Mensagem detalhada baseada no tipo de erro
+    if error_type == 'dependency':
+        detailed_message = f"Dependência faltando: {error_message}"
+        if solution:
+            detailed_message += f" |  Solução: {solution}"
+    elif error_type == 'encryption':
+        detailed_message = f"PDF criptografado: {error_message}"
+        if solution:
+            detailed_message += f" |  Solução: {solution}"
+    else:
+        detailed_message = f"Erro no processamento: {error_message}"
+    return detailed_message
+
+# Status HTTP dos tipos de erro da extração de tabelas (demais tipos: 500)
+S3_ERROR_HTTP_STATUS = {'dependency': 422, 'encryption': 422}
+
+def run_table_extraction(tmp_file_path: str, filename: str, target_tables: List[str] = None) -> dict:
+    """Extrai as tabelas do PDF gravado em tmp_file_path e salva no S3 (o arquivo é removido ao final)"""
+    try:
+        return s3_processor.process_pdf_with_table_extraction(
+            tmp_file_path, target_tables, original_filename=filename
+        )
+    finally:
+        try:
+            os.unlink(tmp_file_path)
+        except OSError:
+            pass
+
+def process_pdf_sync(tmp_file_path: str, filename: str, user_id: str, task_id: str):
+    """Processa em background o PDF gravado em tmp_file_path (o arquivo é removido ao final)"""
     start_time = time.time()
     
     try:
@@ -156,52 +573,54 @@ def process_pdf_sync(file_content: bytes, filename: str, user_id: str, task_id:
 
             
         # Verificar conexão S3
-        s3_available = s3_processor.test_s3_connection()
+        s3_available = check_s3_connection()
         if not s3_available:
             logger.warning("S3 não disponível")
             
-        # Salvar arquivo temporário para processamento S3
-        with tempfile.NamedTemporaryFile(delete=False, suffix='.pdf') as tmp_file:
-            tmp_file.write(file_content)
-            tmp_file_path = tmp_file.name
-        
         logger.info(f"Processando PDF com S3: {tmp_file_path}")
         
-        # Processar PDF com extração de tabelas e salvamento no S3
-        update_processing_status(task_id, ProcessingStatus.PROCESSING, 50, f"Extraindo tabelas de {filename}...")
-        s3_result = s3_processor.process_pdf_with_table_extraction(tmp_file_path, original_filename=filename)
+        # Extração S3 e indexação (ChromaDB + DynamoDB) leem o mesmo arquivo e não
+        # dependem uma da outra: a indexação roda numa thread auxiliar enquanto
+        # esta thread cuida da extração de tabelas.
+        update_processing_status(task_id, ProcessingStatus.PROCESSING, 50, f"Extraindo tabelas e indexando {filename}...")
+        def indexing_progress(done: int, total: int):
+            update_processing_status(
+                task_id, ProcessingStatus.PROCESSING, 70 + int(25 * done / total),
+                f"Indexando no ChromaDB... ({done}/{total} chunks)"
+            )
         
-        # Limpar arquivo temporário
-        os.unlink(tmp_file_path)
+        with ThreadPoolExecutor(max_workers=1, thread_name_prefix="pdf-index") as index_executor:
+            index_future = index_executor.submit(
+                pdf_processing_service.process_pdf_path,
+                pdf_path=tmp_file_path,
+                filename=filename,
+                user_id=user_id,
+                progress_callback=indexing_progress
+            )
+            s3_result = s3_processor.process_pdf_with_table_extraction(tmp_file_path, original_filename=filename)
+            traditional_result = index_future.result()
         
-        if 'error' in s3_result:
-            error_message = s3_result['error']
-            error_type = s3_result.get('error_type', 'unknown')
-            solution = s3_result.get('solution', '')
-            
-            # Mensagem detalhada baseada no tipo de erro
-            if error_type == 'dependency':
-                detailed_message = f"Dependência faltando: {error_message}"
-                if solution:
-                    detailed_message += f" |  Solução: {solution}"
-            elif error_type == 'encryption':
-                detailed_message = f"PDF criptografado: {error_message}"
-                if solution:
-                    detailed_message += f" |  Solução: {solution}"
-            else:
-                detailed_message = f"Erro no processamento: {error_message}"
+        # Indexação e extração rodam juntas: o resultado de cada uma é reportado separadamente
+        index_status = "indexed" if traditional_result.get('success') else "error"
+        extraction_status = "error" if 'error' in s3_result else "completed"
+
+        if extraction_status == "error":
+            # A tarefa falha como antes; os chunks que já foram indexados ficam no ChromaDB, mas o
+            # índice não é tratado como válido (sem invalidar o cache nem reaproveitar o upload)
+            detailed_message = _s3_error_message(s3_result)
 
             logger.error(f"Erro no processamento S3: {detailed_message}")
-            update_processing_status(task_id, ProcessingStatus.ERROR, 0, detailed_message)
+            update_processing_status(task_id, ProcessingStatus.ERROR, 0, detailed_message, {
+                'pdf_name': filename,
+                'index_status': index_status,
+                'extraction_status': extraction_status,
+                'traditional_processing': traditional_result
+            })
             return
-        
-        # Processar (ChromaDB + DynamoDB)
-        update_processing_status(task_id, ProcessingStatus.PROCESSING, 70, f"Indexando no ChromaDB...")
-        traditional_result = pdf_processing_service.process_uploaded_pdf(
-            file_content=file_content,
-            filename=filename,
-            user_id=user_id
-        )
+
+        if index_status == "indexed":
+            # Conteúdo do PDF mudou: respostas em cache sobre ele não são mais válidas
+            _notify_pdf_indexed(filename)
         
         # Calcular tempo de processamento total
         total_processing_time = time.time() - start_time
@@ -213,11 +632,13 @@ def process_pdf_sync(file_content: bytes, filename: str, user_id: str, task_id:
             'pdf_id': traditional_result.get('pdf_id') if traditional_result.get('success') else None,
             's3_processing': s3_result,
             'traditional_processing': traditional_result,
+            'index_status': index_status,
+            'extraction_status': extraction_status,
             'tables_extracted': s3_result.get('tables_extracted', []),
             's3_csv_files': s3_result.get('s3_csv_files', {}),
             's3_delta_files': s3_result.get('s3_delta_files', {}),
             'chunks_created': traditional_result.get('extraction_stats', {}).get('chunks_created', 0),
-            'processing_time': datetime.utcnow().isoformat(),
+            'processing_time': utc_timestamp(),
             'processing_time_seconds': total_processing_time,
             'processing_time_formatted': _format_processing_time(total_processing_time)
         }
@@ -225,7 +646,7 @@ def process_pdf_sync(file_content: bytes, filename: str, user_id: str, task_id:
         # Logs
         if s3_result.get('tables_extracted'):
             for table_name in s3_result['tables_extracted']:
-                table_count = len(s3_result['tables'][table_name])
+                table_count = s3_result['tables'][table_name]['total_rows']
                 logger.info(f"Tabela {table_name}: {table_count} linhas extraídas")
         
         if s3_result.get('s3_delta_files'):
@@ -249,16 +670,43 @@ def process_pdf_sync(file_content: bytes, filename: str, user_id: str, task_id:
         update_processing_status(task_id, ProcessingStatus.COMPLETED, 100, success_message, combined_result)
             
     except Exception as e:
-        # Limpar arquivo temporário se houver erro
-        if 'tmp_file_path' in locals():
-            try:
-                os.unlink(tmp_file_path)
-            except:
-                pass
-        logger.error(f"Erro no processamento em background: {e}")
-        import traceback
-        logger.error(f"Traceback: {traceback.format_exc()}")
+        logger.error(f"Erro no processamento em background: {e}", exc_info=True)
         update_processing_status(task_id, ProcessingStatus.ERROR, 0, f"Erro interno: {str(e)}")
+    finally:
+        # Limpar arquivo temporário
+        try:
+            os.unlink(tmp_file_path)
+        except OSError:
+            pass
+
+def process_pdf_tables_sync(tmp_file_path: str, filename: str, task_id: str):
+    """Extrai em background as tabelas do PDF para o S3 (o arquivo é removido ao final)"""
+    try:
+        update_processing_status(task_id, ProcessingStatus.PROCESSING, 30, f"Extraindo tabelas de {filename}...")
+        
+        result = run_table_extraction(tmp_file_path, filename)
+        
+        if 'error' in result:
+            detailed_message = _s3_error_message(result)
+            logger.error(f"Erro no processamento S3: {detailed_message}")
+            update_processing_status(task_id, ProcessingStatus.ERROR, 0, detailed_message)
+            return
+        
+        update_processing_status(
+            task_id, ProcessingStatus.COMPLETED, 100,
+            f"PDF processado com sucesso. Tabelas extraídas e salvas no S3.",
+            {
+                "pdf_info": result["pdf_info"],
+                "tables_extracted": result["tables_extracted"],
+                "s3_csv_files": result["s3_csv_files"],
+                "s3_delta_files": result["s3_delta_files"],
+                "processing_date": result["processing_date"]
+            }
+        )
+        
+    except Exception as e:
+        logger.error(f"Erro na extração de tabelas em background: {e}")
+        update_processing_status(task_id, ProcessingStatus.ERROR, 0, f"Erro ao processar PDF: {str(e)}")
 
 # Modelos Pydantic para requests
 
@@ -269,6 +717,11 @@ def get_current_user_id(request: Request = None):
         if not request:
             return "user_default_001"  # Fallback para compatibilidade
         
+        # Já resolvido nesta requisição (a dependência pode ser avaliada mais de uma vez)
+        cached_email = getattr(request.state, "user_email", None)
+        if cached_email is not None:
+            return cached_email
+        
         # Verifica se há token nos cookies
         access_token = request.cookies.get("access_token")
         if not access_token:
@@ -277,7 +730,7 @@ def get_current_user_id(request: Request = None):
         # Verifica se há informações do usuário nos cookies
         user_info = request.cookies.get("user_info")
         if user_info:
-            user_data = json.loads(user_info)
+            user_data = orjson.loads(user_info)
             # Retorna o email do usuário
             email = (
                 user_data.get("email") or
@@ -286,6 +739,7 @@ def get_current_user_id(request: Request = None):
                 user_data.get("preferredUsername") or
                 "user_default_001"
             )
+            request.state.user_email = email
             return email
         
         return "user_default_001"
@@ -300,12 +754,18 @@ def get_user_id_dependency(request: Request):
 
 @app.get("/health")
 async def health_check():
-    """Health check para Kubernetes"""
+    """Health check para Kubernetes (503 enquanto o aquecimento não terminar)"""
+    if not warmup_done:
+        return ORJSONResponse(
+            status_code=503,
+            content={"status": "warming_up", "timestamp": utc_timestamp()}
+        )
+    
     try:
         # Health check básico - só verifica se a aplicação está rodando
         return {
             "status": "healthy",
-            "timestamp": datetime.utcnow().isoformat(),
+            "timestamp": utc_timestamp(),
             "services": {
                 "backend": "running"
             },
@@ -316,7 +776,7 @@ async def health_check():
         return {
             "status": "unhealthy", 
             "error": str(e),
-            "timestamp": datetime.utcnow().isoformat()
+            "timestamp": utc_timestamp()
         }
 
 @app.get("/health/detailed")
@@ -326,13 +786,13 @@ async def detailed_health_check():
         # Verifica serviços externos com timeout
         chromadb_health = False
         try:
-            chromadb_health = chromadb_service.client.health_check()
+            chromadb_health = await asyncio.to_thread(check_chromadb_health)
         except Exception as e:
             logger.warning(f"ChromaDB health check failed: {e}")
         
         return {
             "status": "healthy",
-            "timestamp": datetime.utcnow().isoformat(),
+            "timestamp": utc_timestamp(),
             "services": {
                 "dynamodb": "connected",
                 "chromadb": "connected" if chromadb_health else "disconnected",
@@ -345,7 +805,7 @@ async def detailed_health_check():
         return {
             "status": "unhealthy", 
             "error": str(e),
-            "timestamp": datetime.utcnow().isoformat()
+            "timestamp": utc_timestamp()
         }
 
 @app.get("/health/processing")
@@ -353,12 +813,12 @@ async def health_check_processing():
     """Health check que considera processamento ativo"""
     try:
         # Verifica se há processamento ativo
-        active_tasks = len([task for task in processing_status.values() 
+        active_tasks = len([task for _, task in await asyncio.to_thread(snapshot_processing_status)
                           if task['status'] == ProcessingStatus.PROCESSING])
         
         return {
             "status": "healthy",
-            "timestamp": datetime.utcnow().isoformat(),
+            "timestamp": utc_timestamp(),
             "active_tasks": active_tasks,
             "processing_active": active_tasks > 0,
             "services": {
@@ -371,45 +831,80 @@ async def health_check_processing():
         return {
             "status": "unhealthy", 
             "error": str(e),
-            "timestamp": datetime.utcnow().isoformat()
+            "timestamp": utc_timestamp()
         }
 
-@app.post("/upload-pdf", response_model=PDFUploadResponse)
+# Sem response_model: build_response já entrega a resposta pronta e o FastAPI não a revalida
+# (o modelo segue documentado no OpenAPI via responses)
+@app.post("/upload-pdf", responses={200: {"model": PDFUploadResponse}}, dependencies=[Depends(upload_slot)])
 async def upload_pdf(
     background_tasks: BackgroundTasks,
+    request: Request,
     file: UploadFile = File(...),
     user_id: str = Form(default=None)
 ):
     """Upload e processamento assíncrono de PDF"""
+    # Arquivo temporário ainda sob responsabilidade desta requisição (removido no finally se a tarefa em
+    # background não chegar a ser agendada; depois disso quem o remove é process_pdf_sync)
+    tmp_file_path = None
     try:
         # Se user_id não foi passado no Form, usa o padrão da dependência
         if not user_id:
-            user_id = Depends(get_user_id_dependency)
-            print(f"USUARIO DA get_user_id_dependency: {user_id}")
+            user_id = get_current_user_id(request)
         
         logger.info(f"Iniciando upload de PDF: {file.filename} para usuário: {user_id}")
         
         if not file.filename.lower().endswith('.pdf'):
             logger.warning(f"Tipo de arquivo inválido: {file.filename}")
             raise HTTPException(status_code=400, detail="Apenas arquivos PDF são permitidos")
-
-        # Ler conteúdo do arquivo
-        file_content = await file.read()
-        logger.info(f"Arquivo lido: {len(file_content)} bytes")
+        
+        # Rejeitar antes de gravar em disco um arquivo que não é PDF (só a extensão não garante)
+        if not await has_pdf_signature(file):
+            logger.warning(f"Arquivo sem assinatura de PDF: {file.filename}")
+            raise HTTPException(status_code=400, detail="O arquivo enviado não é um PDF válido")
+
+        # Gravar o upload em arquivo temporário (sem carregar o PDF inteiro em memória)
+        tmp_file_path = await save_upload_to_tempfile(file)
+        logger.info(f"Arquivo gravado: {os.path.getsize(tmp_file_path)} bytes")
+        
+        # Mesmo conteúdo já processado recentemente para este usuário: reaproveitar o resultado
+        digest = await asyncio.to_thread(file_digest, tmp_file_path)
+        previous = await asyncio.to_thread(find_reusable_upload, user_id, file.filename, digest)
+        if previous is not None:
+            previous_task_id, previous_result = previous
+            logger.info(f"Upload repetido de {file.filename}: reaproveitando a tarefa {previous_task_id}")
+            return build_response(
+                PDFUploadResponse,
+                success=True,
+                message=f"PDF '{file.filename}' já foi processado recentemente; resultado reaproveitado.",
+                pdf_id=previous_result.get("pdf_id"),
+                pdf_name=file.filename,
+                chunks_created=previous_result.get("chunks_created", 0),
+                processing_time="0s",
+                task_id=previous_task_id
+            )
         
         # Gerar ID de tarefa único para rastrear o processamento
         task_id = str(uuid.uuid4())
         
         # Inicializar status
-        update_processing_status(task_id, ProcessingStatus.PENDING, 10, f"Iniciando processamento de {file.filename}...")
+        await asyncio.to_thread(
+            update_processing_status, task_id, ProcessingStatus.PENDING, 10, f"Iniciando processamento de {file.filename}..."
+        )
+        await asyncio.to_thread(_remember_upload, user_id, file.filename, digest, task_id)
         
-        # Iniciar processamento em background usando BackgroundTasks
-        background_tasks.add_task(process_pdf_sync, file_content, file.filename, user_id, task_id)
+        # Iniciar processamento em background (pool de processos ou BackgroundTasks)
+        if USE_PROCESS_POOL:
+            _get_pdf_process_pool().submit(process_pdf_sync, tmp_file_path, file.filename, user_id, task_id)
+        else:
+            background_tasks.add_task(process_pdf_sync, tmp_file_path, file.filename, user_id, task_id)
+        tmp_file_path = None
         
         logger.info(f"Processamento agendado para background - Task ID: {task_id}")
         
         # Retornar resposta imediata com o ID da tarefa
-        return PDFUploadResponse(
+        return build_response(
+            PDFUploadResponse,
             success=True,
             message=f"PDF '{file.filename}' recebido e está sendo processado com extração de tabelas S3 em segundo plano.",
             pdf_id=None,
@@ -424,8 +919,14 @@ async def upload_pdf(
     except Exception as e:
         logger.error(f"Erro no upload de PDF: {e}")
         raise HTTPException(status_code=500, detail=f"Erro interno: {str(e)}")
+    finally:
+        if tmp_file_path is not None:
+            try:
+                os.unlink(tmp_file_path)
+            except OSError:
+                pass
 
-@app.post("/chat")
+@app.post("/chat", dependencies=[Depends(chat_slot)])
 async def chat_with_documents(
     request: ChatRequest,
     user_id: str = Depends(get_user_id_dependency)
@@ -437,17 +938,17 @@ async def chat_with_documents(
         
         if request.pdf_name:
             # Chat específico com um PDF usando ChromaDB
-            print(f"DEBUG: Chat com PDF específico: {request.pdf_name}")
+            logger.debug("Chat com PDF específico: %s", request.pdf_name)
             
             # Buscar documentos similares no ChromaDB
-            similar_docs = chromadb_service.search_similar_content(
+            similar_docs = await query_batcher.search(
                 query=request.message,
                 pdf_name=request.pdf_name,
                 user_id=actual_user_id,
                 max_results=request.max_context_chunks
             )
             
-            print(f"DEBUG: Encontrados {len(similar_docs)} documentos similares no ChromaDB")
+            logger.debug("Encontrados %d documentos similares no ChromaDB", len(similar_docs))
             
             if not similar_docs:
                 return {
@@ -460,24 +961,15 @@ async def chat_with_documents(
                 }
             
             # Preparar contexto para o modelo
-            context_text = " ".join([doc.get("text", "") for doc in similar_docs])
-            sources = []
-            
-            for doc in similar_docs:
-                metadata = doc.get("metadata", {})
-                sources.append({
-                    "text": doc.get("text", "")[:200] + "...",
-                    "pdf_name": metadata.get("pdf_name", request.pdf_name),
-                    "chunk_index": metadata.get("chunk_index", 0),
-                    "similarity_score": doc.get("score", 0)
-                })
+            context_text, sources, _ = _build_context_and_sources(similar_docs, request.pdf_name)
             
             # Usar o chat service para gerar resposta
-            result = chat_service.ask_question(
+            result = await chat_service.ask_question(
                 question=request.message,
                 pdf_name=request.pdf_name,
                 user_id=actual_user_id,
-                context_override=context_text  # Passa o contexto do ChromaDB
+                context_override=context_text,  # Passa o contexto do ChromaDB
+                no_cache=request.no_cache
             )
             
             return {
@@ -488,16 +980,17 @@ async def chat_with_documents(
                 "metadata": {
                     "chunks_used": len(similar_docs),
                     "pdf_name": request.pdf_name,
-                    "user_id": actual_user_id
+                    "user_id": actual_user_id,
+                    "cache_hit": result.get("metadata", {}).get("cache_hit", False)
                 },
                 "pdf_name": request.pdf_name
             }
         else:
             # Chat geral - buscar em todos os PDFs
-            print(f"DEBUG: Chat geral - buscando em todos os PDFs")
+            logger.debug("Chat geral - buscando em todos os PDFs")
 
             # Buscar documentos similares em todos os PDFs
-            similar_docs = chromadb_service.search_similar_content(
+            similar_docs = await query_batcher.search(
                 query=request.message,
                 pdf_name=None,  # Busca em todos os PDFs
                 user_id=actual_user_id,
@@ -515,23 +1008,14 @@ async def chat_with_documents(
                 }
             
             # Preparar contexto
-            context_text = " ".join([doc.get("text", "") for doc in similar_docs])
-            sources = []
-            
-            for doc in similar_docs:
-                metadata = doc.get("metadata", {})
-                sources.append({
-                    "text": doc.get("text", "")[:200] + "...",
-                    "pdf_name": metadata.get("pdf_name", "Unknown"),
-                    "chunk_index": metadata.get("chunk_index", 0),
-                    "similarity_score": doc.get("score", 0)
-                })
+            context_text, sources, pdfs_found = _build_context_and_sources(similar_docs, "Unknown")
             
             # Gerar resposta usando chat service
-            result = chat_service.ask_question_general(
+            result = await chat_service.ask_question_general(
                 question=request.message,
                 user_id=actual_user_id,
-                context_override=context_text
+                context_override=context_text,
+                no_cache=request.no_cache
             )
             
             # Garantir que sempre há uma resposta, mesmo se o LLM falhar
@@ -550,17 +1034,60 @@ async def chat_with_documents(
                 "sources": sources,
                 "metadata": {
                     "chunks_used": len(similar_docs),
-                    "pdfs_found": len(set(s["pdf_name"] for s in sources)),
-                    "user_id": actual_user_id
+                    "pdfs_found": pdfs_found,
+                    "user_id": actual_user_id,
+                    "cache_hit": result.get("metadata", {}).get("cache_hit", False)
                 }
             }
         
     except Exception as e:
-        logger.error(f"Erro no chat: {e}")
-        import traceback
-        logger.error(f"Traceback: {traceback.format_exc()}")
+        logger.error(f"Erro no chat: {e}", exc_info=True)
         raise HTTPException(status_code=500, detail=f"Erro no chat: {str(e)}")
 
+@app.post("/chat/stream", dependencies=[Depends(chat_slot)])
+async def chat_with_documents_stream(
+    request: ChatRequest,
+    user_id: str = Depends(get_user_id_dependency)
+):
+    """
+    Versão em streaming (Server-Sent Events) do /chat: envia as fontes e depois a resposta
+    em trechos, à medida que o LLM gera. Eventos: sources, delta, done ou error; fim com [DONE]
+    """
+    actual_user_id = request.user_id or user_id
+    
+    similar_docs = await query_batcher.search(
+        query=request.message,
+        pdf_name=request.pdf_name,
+        user_id=actual_user_id,
+        max_results=request.max_context_chunks
+    )
+    
+    if similar_docs:
+        context_text, sources, _ = _build_context_and_sources(similar_docs, request.pdf_name or "Unknown")
+        events = chat_service.stream_answer(
+            question=request.message,
+            pdf_name=request.pdf_name,
+            combined_context=context_text,
+            sources=sources,
+            user_id=actual_user_id
+        )
+    else:
+        events = None
+    
+    async def event_stream():
+        if events is None:
+            yield b"data: " + orjson.dumps({"type": "error", "error": "Nenhum contexto relevante encontrado"}) + b"\n\n"
+        else:
+            async for event in events:
+                yield b"data: " + orjson.dumps(event) + b"\n\n"
+        yield b"data: [DONE]\n\n"
+    
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
 @app.post("/query")
 async def query_documents(
     request: QueryRequest,
@@ -571,7 +1098,7 @@ async def query_documents(
         actual_user_id = request.user_id or user_id
         
         # Buscar documentos similares no ChromaDB
-        similar_docs = chromadb_service.search_similar_content(
+        similar_docs = await query_batcher.search(
             query=request.question,
             pdf_name=request.pdf_name,
             user_id=actual_user_id,
@@ -604,7 +1131,7 @@ async def query_documents(
             "total_docs_found": len(context_chunks),
             "query_metadata": {
                 "user_id": actual_user_id,
-                "timestamp": datetime.utcnow().isoformat()
+                "timestamp": utc_timestamp()
             }
         }
         
@@ -613,41 +1140,23 @@ async def query_documents(
         raise HTTPException(status_code=500, detail=f"Erro na query: {str(e)}")
 
 @app.get("/pdfs")
-async def list_user_pdfs(user_id: str = None):
-    """Lista PDFs do usuário"""
+async def list_pdfs(request: Request, scope: str = Query("all"), user_id: Optional[str] = None):
+    """Lista os PDFs indexados (scope=all) ou apenas os do usuário (scope=user)"""
     try:
-        # Se não fornecido, usa o usuário padrão
+        # Se não fornecido, usa o usuário da sessão
         if not user_id:
-            user_id: str = Depends(get_user_id_dependency)
-            
-        pdfs = db_service.list_pdfs()
+            user_id = get_current_user_id(request)
         
-        return {
-            "user_id": user_id,
-            "pdfs": pdfs,
-            "total_pdfs": len(pdfs),
-            "timestamp": datetime.utcnow().isoformat()
-        }
-        
-    except Exception as e:
-        logger.error(f"Erro ao listar PDFs: {e}")
-        raise HTTPException(status_code=500, detail=f"Erro ao listar PDFs: {str(e)}")
-    
-@app.get("/pdfs_user")
-async def list_user_pdfs(user_id: str = None):
-    """Lista PDFs do usuário"""
-    try:
-        # Se não fornecido, usa o usuário padrão
-        if not user_id:
-            user_id: str = Depends(get_user_id_dependency)
-            
-        pdfs = db_service.list_user_pdfs(user_id)
+        if scope == "user":
+            pdfs = await asyncio.to_thread(db_service.list_user_pdfs, user_id)
+        else:
+            pdfs = await asyncio.to_thread(db_service.list_pdfs)
         
         return {
             "user_id": user_id,
             "pdfs": pdfs,
             "total_pdfs": len(pdfs),
-            "timestamp": datetime.utcnow().isoformat()
+            "timestamp": utc_timestamp()
         }
         
     except Exception as e:
@@ -661,7 +1170,7 @@ async def get_pdf_status(
 ):
     """Obtém status de processamento de um PDF"""
     try:
-        status = pdf_processing_service.get_pdf_processing_status(pdf_name, user_id)
+        status = await asyncio.to_thread(pdf_processing_service.get_pdf_processing_status, pdf_name, user_id)
         return status
         
     except Exception as e:
@@ -675,7 +1184,10 @@ async def delete_pdf(
 ):
     """Remove um PDF e todos os seus dados"""
     try:
-        result = pdf_processing_service.delete_pdf_data(pdf_name, user_id)
+        result = await asyncio.to_thread(pdf_processing_service.delete_pdf_data, pdf_name, user_id)
+        
+        # Um novo upload do mesmo arquivo precisa ser processado de novo (em qualquer worker, com Redis)
+        await asyncio.to_thread(forget_uploads, user_id, pdf_name)
         
         if not result['success']:
             raise HTTPException(status_code=500, detail=result.get('error', 'Erro desconhecido'))
@@ -694,6 +1206,7 @@ async def delete_pdf(
 
 @app.get("/chat-history")
 async def get_chat_history(
+    request: Request,
     user_id: Optional[str] = Query(None),
     limit: int = Query(10, ge=1, le=100)
 ):
@@ -701,13 +1214,13 @@ async def get_chat_history(
     try:
         # Se user_id não for fornecido, usar o padrão
         if not user_id:
-            user_id: str = Depends(get_user_id_dependency)
+            user_id = get_current_user_id(request)
         
         logger.info(f"Backend: Buscando chat history para user_id: {user_id}, limit: {limit}")
         logger.info(f"Backend: DynamoDB disponível: {dynamodb_service.is_available()}")
         
         # Buscar diretamente no DynamoDB apenas por user_id e timestamp
-        chats = dynamodb_service.get_chat_history(user_id, limit)
+        chats = await asyncio.to_thread(dynamodb_service.get_chat_history, user_id, limit)
         
         logger.info(f"Backend: Encontrados {len(chats)} chats no DynamoDB para user_id: {user_id}")
         
@@ -733,7 +1246,7 @@ async def get_chat_history(
             "user_id": user_id,
             "chats": formatted_chats,
             "total_chats": len(formatted_chats),
-            "timestamp": datetime.utcnow().isoformat()
+            "timestamp": utc_timestamp()
         }
         
     except Exception as e:
@@ -741,8 +1254,11 @@ async def get_chat_history(
         raise HTTPException(status_code=500, detail=f"Erro ao obter histórico: {str(e)}")
 
 @app.get("/debug/chat-history")
-async def debug_chat_history():
-    """Debug endpoint para verificar se há chats salvos no DynamoDB"""
+async def debug_chat_history(request: Request, user_id: Optional[str] = Query(None)):
+    """Debug endpoint para verificar se há chats salvos no DynamoDB (apenas com ENABLE_DEBUG=true)"""
+    if not ENABLE_DEBUG:
+        raise HTTPException(status_code=404, detail="Not Found")
+    
     try:
         logger.info("DEBUG: Verificando status do DynamoDB")
         
@@ -757,10 +1273,17 @@ async def debug_chat_history():
                 "available": False
             }
         
-        # Tentar listar todos os chats (scan limitado)
+        # Listar os chats mais recentes do usuário (query no GSI, sem scan da tabela)
         try:
+            user_id = user_id or get_current_user_id(request)
             table = dynamodb_service.dynamodb.Table(dynamodb_service.tables['chat_history'])
-            response = table.scan(Limit=10)
+            response = await asyncio.to_thread(
+                table.query,
+                IndexName='user_id-index',
+                KeyConditionExpression=Key('user_id').eq(user_id),
+                Limit=10,
+                ScanIndexForward=False
+            )
             items = response.get('Items', [])
             
             logger.info(f"DEBUG: Encontrados {len(items)} chats na tabela")
@@ -768,6 +1291,7 @@ async def debug_chat_history():
             return {
                 "status": "success",
                 "dynamodb_available": True,
+                "user_id": user_id,
                 "total_chats_found": len(items),
                 "sample_chats": items[:3],  # Mostrar apenas os primeiros 3
                 "table_name": dynamodb_service.tables['chat_history']
@@ -788,7 +1312,7 @@ async def debug_chat_history():
             "message": f"Erro geral: {str(e)}"
         }
 
-@app.post("/users", response_model=Dict[str, Any])
+@app.post("/users")
 async def create_user(user_data: UserRequest):
     """Cria um novo usuário ou atualiza existente"""
     try:
@@ -800,14 +1324,12 @@ async def create_user(user_data: UserRequest):
         if user_data.additional_info:
             user_dict["additional_info"] = user_data.additional_info
         
-        user_id = dynamodb_service.create_user(user_dict)
-        
-        # Busca o usuário completo para retornar
-        user_info = dynamodb_service.get_user(user_id)
+        # O item gravado já é o usuário completo: sem get_item adicional
+        user_info = await asyncio.to_thread(dynamodb_service.upsert_user, user_dict)
         
         return {
             "message": "Usuário processado com sucesso",
-            "user": user_info or {"user_id": user_id}
+            "user": user_info
         }
         
     except Exception as e:
@@ -818,7 +1340,7 @@ async def create_user(user_data: UserRequest):
 async def get_user(user_id: str):
     """Obtém dados de um usuário"""
     try:
-        user = dynamodb_service.get_user(user_id)
+        user = await asyncio.to_thread(dynamodb_service.get_user, user_id)
         
         if not user:
             raise HTTPException(status_code=404, detail="Usuário não encontrado")
@@ -837,11 +1359,11 @@ async def get_user(user_id: str):
 async def get_system_stats(user_id: str = Depends(get_user_id_dependency)):
     """Obtém estatísticas do sistema"""
     try:
-        stats = db_service.get_database_stats(user_id)
+        stats = await asyncio.to_thread(db_service.get_database_stats, user_id)
         
         return {
             "stats": stats,
-            "timestamp": datetime.utcnow().isoformat()
+            "timestamp": utc_timestamp()
         }
         
     except Exception as e:
@@ -855,7 +1377,7 @@ async def reprocess_pdf(
 ):
     """Reprocessa um PDF existente"""
     try:
-        result = pdf_processing_service.reprocess_pdf(pdf_name, user_id)
+        result = await asyncio.to_thread(pdf_processing_service.reprocess_pdf, pdf_name, user_id)
         
         if not result['success']:
             raise HTTPException(status_code=500, detail=result.get('error', 'Erro no reprocessamento'))
@@ -870,31 +1392,34 @@ async def reprocess_pdf(
 
 # Endpoint de compatibilidade para o frontend
 @app.get("/available-pdfs")
-async def available_pdfs(user_id: str = None):
+async def available_pdfs(request: Request, user_id: str = None):
     """Endpoint de compatibilidade para listar PDFs disponíveis"""
     try:
         # Se não fornecido, usa o usuário padrão
         if not user_id:
-            user_id: str = Depends(get_user_id_dependency)
+            user_id = get_current_user_id(request)
             
-        pdfs = db_service.list_user_pdfs(user_id)
-        
-        # Adapta formato para compatibilidade com frontend
-        formatted_pdfs = []
-        for pdf in pdfs:
-            formatted_pdfs.append({
-                "filename": pdf.get("filename", pdf.get("name", "Unknown")),
-                "upload_date": pdf.get("upload_date", datetime.utcnow().isoformat()),
+        pdfs = await asyncio.to_thread(db_service.list_user_pdfs, user_id)
+        
+        # Adapta formato para compatibilidade com frontend (timestamp padrão calculado uma vez;
+        # "name" só é consultado quando falta "filename")
+        now = utc_timestamp()
+        formatted_pdfs = [
+            {
+                "filename": pdf["filename"] if "filename" in pdf else pdf.get("name", "Unknown"),
+                "upload_date": pdf.get("upload_date", now),
                 "status": pdf.get("status", "processed"),
                 "size": pdf.get("size", 0),
                 "pages": pdf.get("pages", 0)
-            })
+            }
+            for pdf in pdfs
+        ]
         
         return {
             "available_files": formatted_pdfs,
             "total_pdfs": len(formatted_pdfs),
             "user_id": user_id,
-            "timestamp": datetime.utcnow().isoformat()
+            "timestamp": now
         }
         
     except Exception as e:
@@ -910,7 +1435,7 @@ async def available_pdfs(user_id: str = None):
 async def get_recent_chats_legacy(user_id: str = Depends(get_user_id_dependency)):
     """Endpoint de compatibilidade para chats recentes"""
     try:
-        chats = db_service.recent_chats(user_id, 10)
+        chats = await asyncio.to_thread(db_service.recent_chats, user_id, 10)
         return chats
         
     except Exception as e:
@@ -928,7 +1453,7 @@ async def create_table_from_pdf_legacy(
         if not pdf_name:
             raise HTTPException(status_code=400, detail="pdf_name é obrigatório")
         
-        result = db_service.create_table_from_pdf(pdf_name, user_id)
+        result = await asyncio.to_thread(db_service.create_table_from_pdf, pdf_name, user_id)
         return result
         
     except HTTPException:
@@ -941,9 +1466,8 @@ async def create_table_from_pdf_legacy(
 async def get_upload_status(task_id: str):
     """Verifica o status de processamento de upload por task_id"""
     try:
-        if task_id in processing_status:
-            status_data = processing_status[task_id]
-            
+        status_data = await asyncio.to_thread(get_task_status, task_id)
+        if status_data is not None:
             # Adicionar informações extras para debug
             status_data_with_debug = {
                 **status_data,
@@ -952,8 +1476,8 @@ async def get_upload_status(task_id: str):
                 "is_error": status_data.get('status') == ProcessingStatus.ERROR,
                 "is_processing": status_data.get('status') == ProcessingStatus.PROCESSING,
                 "debug_info": {
-                    "total_tasks_in_memory": len(processing_status),
-                    "current_timestamp": datetime.utcnow().isoformat()
+                    "total_tasks_in_memory": await asyncio.to_thread(count_processing_status),
+                    "current_timestamp": utc_timestamp()
                 }
             }
             
@@ -970,22 +1494,23 @@ async def get_upload_status(task_id: str):
 async def test_chromadb():
     """Testa conectividade com ChromaDB"""
     try:
-        # Testa health check
-        health = chromadb_service.client.health_check()
-        
-        # Testa listar coleções (se o endpoint existir)
-        collections_info = {"error": "Endpoint não disponível"}
-        try:
-            collections_info = chromadb_service.client.list_collections()
-        except Exception as e:
-            collections_info = {"error": str(e)}
+        # Health check e listagem de coleções (se o endpoint existir) são independentes: em paralelo
+        health, collections_info = await asyncio.gather(
+            asyncio.to_thread(check_chromadb_health),
+            asyncio.to_thread(lambda: chromadb_service.client.list_collections()),
+            return_exceptions=True
+        )
+        if isinstance(health, Exception):
+            raise health
+        if isinstance(collections_info, Exception):
+            collections_info = {"error": str(collections_info)}
         
         return {
             "chromadb_health": health,
             "collections": collections_info,
             "base_url": chromadb_service.client.base_url,
             "default_collection": chromadb_service.default_collection,
-            "timestamp": datetime.utcnow().isoformat()
+            "timestamp": utc_timestamp()
         }
         
     except Exception as e:
@@ -994,7 +1519,7 @@ async def test_chromadb():
             "error": str(e),
             "chromadb_health": False,
             "base_url": chromadb_service.client.base_url,
-            "timestamp": datetime.utcnow().isoformat()
+            "timestamp": utc_timestamp()
         }
 
 @app.post("/test-chat-simple")
@@ -1007,17 +1532,17 @@ async def test_chat_simple(request: dict):
         if not message:
             raise HTTPException(status_code=400, detail="Message é obrigatório")
         
-        print(f"DEBUG: Testando chat - message: {message}, pdf_name: {pdf_name}")
+        logger.debug("Testando chat - message: %s, pdf_name: %s", message, pdf_name)
         
-        # Buscar diretamente no ChromaDB
-        similar_docs = chromadb_service.search_similar_content(
+        # Buscar no ChromaDB (em lote com as demais buscas concorrentes, sem bloquear o event loop)
+        similar_docs = await query_batcher.search(
             query=message,
             pdf_name=pdf_name if pdf_name else None,
             user_id="user_default_001",
             max_results=3
         )
         
-        print(f"DEBUG: ChromaDB retornou {len(similar_docs)} documentos")
+        logger.debug("ChromaDB retornou %d documentos", len(similar_docs))
         
         if not similar_docs:
             return {
@@ -1028,9 +1553,10 @@ async def test_chat_simple(request: dict):
                 "debug": "Nenhum documento similar encontrado no ChromaDB"
             }
         
-        # Preparar contexto simples
+        # Sem LLM neste teste, o contexto só é medido: o tamanho do texto unido por espaços
+        # é calculado sem montar a string
         context_texts = [doc.get("text", "") for doc in similar_docs]
-        context = " ".join(context_texts)
+        context_length = sum(map(len, context_texts)) + len(context_texts) - 1
         
         # Resposta simples sem LLM para teste
         simple_response = f"Encontrei {len(similar_docs)} trechos relevantes. Primeiro trecho: {context_texts[0][:200]}..."
@@ -1042,15 +1568,13 @@ async def test_chat_simple(request: dict):
             "sources": similar_docs,
             "debug": {
                 "docs_found": len(similar_docs),
-                "context_length": len(context),
+                "context_length": context_length,
                 "pdf_name": pdf_name
             }
         }
         
     except Exception as e:
-        logger.error(f"Erro no teste de chat: {e}")
-        import traceback
-        logger.error(f"Traceback: {traceback.format_exc()}")
+        logger.error(f"Erro no teste de chat: {e}", exc_info=True)
         return {
             "error": str(e),
             "message": request.get("message", ""),
@@ -1061,43 +1585,38 @@ async def test_chat_simple(request: dict):
 async def test_chromadb_data():
     """Testa se há dados no ChromaDB e como estão estruturados"""
     try:
-        # Fazer uma query sem filtros para ver todos os dados
-        result = chromadb_service.client.query_documents(
-            collection_name="rag_documents",
-            query_text="documento",  # Query genérica
-            n_results=10,
-            filter_metadata=None
-        )
+        # Health check em paralelo com as queries (não depende delas)
+        health_task = asyncio.create_task(asyncio.to_thread(check_chromadb_health))
+        
+        # Total de documentos da coleção e os 3 primeiros de uma query sem filtros
+        sample = await asyncio.to_thread(chromadb_service.sample_collection, 3)
         
         # Testar também com filtro específico se houver dados
         result_with_filter = None
-        if result.get("documents"):
+        if sample["documents"]:
             # Pegar metadados do primeiro documento para teste
-            first_metadata = result.get("metadatas", [{}])[0] if result.get("metadatas") else {}
+            first_metadata = (sample["metadatas"][0] or {}) if sample["metadatas"] else {}
             if "pdf_name" in first_metadata:
-                result_with_filter = chromadb_service.client.query_documents(
+                result_with_filter = await asyncio.to_thread(
+                    chromadb_service.client.query_documents,
                     collection_name="rag_documents",
                     query_text="documento",
                     n_results=5,
                     filter_metadata={"pdf_name": first_metadata["pdf_name"]}
                 )
         
-        return {
+        chromadb_health = await health_task
+        
+        return ORJSONResponse({
             "collection_name": "rag_documents",
-            "query_all_results": {
-                "total_found": len(result.get("documents", [])),
-                "documents": result.get("documents", [])[:3],  # Primeiros 3 apenas
-                "metadatas": result.get("metadatas", [])[:3],
-                "distances": result.get("distances", [])[:3],
-                "ids": result.get("ids", [])[:3]
-            },
+            "query_all_results": sample,
             "query_with_filter": result_with_filter,
             "debug_info": {
-                "chromadb_health": chromadb_service.client.health_check(),
+                "chromadb_health": chromadb_health,
                 "default_collection": chromadb_service.default_collection
             },
-            "timestamp": datetime.utcnow().isoformat()
-        }
+            "timestamp": utc_timestamp()
+        })
         
     except Exception as e:
         logger.error(f"Erro no teste ChromaDB data: {e}")
@@ -1105,7 +1624,7 @@ async def test_chromadb_data():
         return {
             "error": str(e),
             "traceback": traceback.format_exc(),
-            "timestamp": datetime.utcnow().isoformat()
+            "timestamp": utc_timestamp()
         }
 
 @app.post("/test-global-search")
@@ -1115,17 +1634,18 @@ async def test_global_search(request: dict):
     """
     try:
         message = request.get("message", "documento")
-        print(f"DEBUG Global Search: Testando busca global com query: '{message}'")
+        logger.debug("Busca global com query: '%s'", message)
         
         # Buscar GLOBALMENTE sem filtros de usuário
-        similar_docs = chromadb_service.search_similar_content(
+        similar_docs = await asyncio.to_thread(
+            chromadb_service.search_similar_content,
             query=message,
             pdf_name=None,  # Buscar em todos os PDFs
             user_id=None,   # Não filtrar por usuário
             max_results=10
         )
         
-        print(f"DEBUG Global Search: Encontrados {len(similar_docs)} documentos")
+        logger.debug("Busca global: encontrados %d documentos", len(similar_docs))
         
         # Mostrar metadados para debug
         metadatas_summary = []
@@ -1145,11 +1665,11 @@ async def test_global_search(request: dict):
             "documents_preview": metadatas_summary,
             "success": True,
             "global_search": True,
-            "timestamp": datetime.utcnow().isoformat()
+            "timestamp": utc_timestamp()
         }
         
     except Exception as e:
-        print(f"DEBUG Global Search: Erro: {e}")
+        logger.error(f"Erro na busca global: {e}")
         import traceback
         return {
             "error": str(e),
@@ -1159,73 +1679,61 @@ async def test_global_search(request: dict):
 
 @app.post("/upload-pdf-s3")
 async def upload_pdf_s3(
+    background_tasks: BackgroundTasks,
     file: UploadFile = File(...),
     user_id: str = Form(default="user_default_001")
 ):
-    """Upload PDF com extração de tabelas e salvamento no S3"""
+    """
+    Upload PDF com extração de tabelas e salvamento no S3
+    
+    A extração roda em background: a resposta traz o task_id para acompanhar em /upload-status/{task_id}
+    """
     if not file.filename.endswith('.pdf'):
         raise HTTPException(status_code=400, detail="Apenas arquivos PDF são permitidos")
+    if not await has_pdf_signature(file):
+        raise HTTPException(status_code=400, detail="O arquivo enviado não é um PDF válido")
 
+    # Verificar se S3 processor está disponível
+    if s3_processor is None:
+        raise HTTPException(status_code=503, detail="S3PDFProcessor não disponível")
+    
+    # Removido no finally se a tarefa em background não chegar a ser agendada (depois, por process_pdf_tables_sync)
+    tmp_file_path = None
     try:
-        # Verificar se S3 processor está disponível
-        if s3_processor is None:
-            raise HTTPException(status_code=503, detail="S3PDFProcessor não disponível")
-            
         # Gera ID único para esta tarefa
         task_id = str(uuid.uuid4())
         
-        # Salva arquivo temporário
-        with tempfile.NamedTemporaryFile(delete=False, suffix='.pdf') as tmp_file:
-            pdf_content = await file.read()
-            tmp_file.write(pdf_content)
-            tmp_file_path = tmp_file.name
-
-        print(f"Processando PDF: {tmp_file_path}")
+        # Salva arquivo temporário (em blocos, sem carregar o PDF inteiro em memória)
+        tmp_file_path = await save_upload_to_tempfile(file)
         
-        # Processa PDF com extração de tabelas
-        result = s3_processor.process_pdf_with_table_extraction(tmp_file_path, original_filename=file.filename)
+        await asyncio.to_thread(
+            update_processing_status, task_id, ProcessingStatus.PENDING, 10,
+            f"Iniciando extração de tabelas de {file.filename}..."
+        )
         
-        # Limpa arquivo temporário
-        os.unlink(tmp_file_path)
+        # Processar em background (pool de processos ou BackgroundTasks)
+        if USE_PROCESS_POOL:
+            _get_pdf_process_pool().submit(process_pdf_tables_sync, tmp_file_path, file.filename, task_id)
+        else:
+            background_tasks.add_task(process_pdf_tables_sync, tmp_file_path, file.filename, task_id)
+        tmp_file_path = None
         
-        if 'error' in result:
-            error_message = result['error']
-            error_type = result.get('error_type', 'unknown')
-            solution = result.get('solution', '')
-            
-            # Criar mensagem de erro mais informativa
-            if error_type == 'dependency':
-                detail_message = f"Dependência faltando: {error_message}"
-                if solution:
-                    detail_message += f" | Solução: {solution}"
-                raise HTTPException(status_code=422, detail=detail_message)
-            elif error_type == 'encryption':
-                detail_message = f"PDF criptografado: {error_message}"
-                if solution:
-                    detail_message += f" | Solução: {solution}"
-                raise HTTPException(status_code=422, detail=detail_message)
-            else:
-                raise HTTPException(status_code=500, detail=error_message)
-        
-        # Retorna resultado com informações do S3
         return {
             "task_id": task_id,
-            "message": f"PDF processado com sucesso. Tabelas extraídas e salvas no S3.",
-            "pdf_info": result["pdf_info"],
-            "tables_extracted": result["tables_extracted"],
-            "s3_csv_files": result["s3_csv_files"],
-            "s3_delta_files": result["s3_delta_files"],
-            "processing_date": result["processing_date"]
+            "status": ProcessingStatus.PENDING,
+            "message": f"PDF '{file.filename}' recebido; extração de tabelas em segundo plano.",
+            "pdf_name": file.filename
         }
 
     except Exception as e:
-        # Limpa arquivo temporário se houver erro
-        if 'tmp_file_path' in locals():
+        logger.error(f"Erro no upload de PDF para S3: {e}")
+        raise HTTPException(status_code=500, detail=f"Erro ao processar PDF: {str(e)}")
+    finally:
+        if tmp_file_path is not None:
             try:
                 os.unlink(tmp_file_path)
-            except:
+            except OSError:
                 pass
-        raise HTTPException(status_code=500, detail=f"Erro ao processar PDF: {str(e)}")
 
 @app.get("/s3-status")
 async def check_s3_status():
@@ -1235,23 +1743,23 @@ async def check_s3_status():
             return {
                 "s3_available": False,
                 "error": "S3PDFProcessor não inicializado",
-                "timestamp": datetime.now().isoformat()
+                "timestamp": utc_timestamp()
             }
             
-        s3_available = s3_processor.test_s3_connection()
+        s3_available = await asyncio.to_thread(check_s3_connection)
         
         return {
             "s3_available": s3_available,
             "bucket_name": s3_processor.bucket_name,
             "s3_folder": s3_processor.s3_folder,
             "google_ai_available": s3_processor.model is not None,
-            "timestamp": datetime.now().isoformat()
+            "timestamp": utc_timestamp()
         }
     except Exception as e:
         return {
             "s3_available": False,
             "error": str(e),
-            "timestamp": datetime.now().isoformat()
+            "timestamp": utc_timestamp()
         }
 
 @app.post("/process-pdf-tables")
@@ -1263,6 +1771,8 @@ async def process_pdf_tables(
     """Processa PDF e extrai tabelas específicas (compatível com logs antigos)"""
     if not file.filename.endswith('.pdf'):
         raise HTTPException(status_code=400, detail="Apenas arquivos PDF são permitidos")
+    if not await has_pdf_signature(file):
+        raise HTTPException(status_code=400, detail="O arquivo enviado não é um PDF válido")
 
     try:
         # Verificar se S3 processor está disponível
@@ -1272,69 +1782,49 @@ async def process_pdf_tables(
         # Converte string de tabelas para lista
         target_tables_list = [table.strip() for table in target_tables.split(',')]
         
-        # Salva arquivo temporário
-        with tempfile.NamedTemporaryFile(delete=False, suffix='.pdf') as tmp_file:
-            pdf_content = await file.read()
-            tmp_file.write(pdf_content)
-            tmp_file_path = tmp_file.name
+        # Salva arquivo temporário (em blocos, sem carregar o PDF inteiro em memória)
+        tmp_file_path = await save_upload_to_tempfile(file)
 
-        print(f"Processando PDF: {tmp_file_path}")
-        
-        # Processa PDF com extração de tabelas
-        result = s3_processor.process_pdf_with_table_extraction(tmp_file_path, target_tables_list, original_filename=file.filename)
+        logger.debug("Processando PDF: %s", tmp_file_path)
         
-        # Limpa arquivo temporário
-        os.unlink(tmp_file_path)
+        # Processa PDF com extração de tabelas (em thread, sem bloquear o event loop)
+        result = await asyncio.to_thread(run_table_extraction, tmp_file_path, file.filename, target_tables_list)
         
         if 'error' in result:
-            error_message = result['error']
-            error_type = result.get('error_type', 'unknown')
-            solution = result.get('solution', '')
-            
-            # Criar mensagem de erro mais informativa
-            if error_type == 'dependency':
-                detail_message = f"Dependência faltando: {error_message}"
-                if solution:
-                    detail_message += f" | Solução: {solution}"
-                raise HTTPException(status_code=422, detail=detail_message)
-            elif error_type == 'encryption':
-                detail_message = f"PDF criptografado: {error_message}"
-                if solution:
-                    detail_message += f" | Solução: {solution}"
-                raise HTTPException(status_code=422, detail=detail_message)
-            else:
-                raise HTTPException(status_code=500, detail=error_message)
+            raise HTTPException(
+                status_code=S3_ERROR_HTTP_STATUS.get(result.get('error_type'), 500),
+                detail=_s3_error_message(result)
+            )
         
         # Gera logs compatíveis com o sistema antigo
         for table_name in result['tables_extracted']:
-            table_count = len(result['tables'][table_name])
-            print(f"Tabela {table_name}: {table_count} linhas extraídas")
+            table_count = result['tables'][table_name]['total_rows']
+            logger.info("Tabela %s: %s linhas extraídas", table_name, table_count)
         
         # Gera tabelas deltas (compatível com logs antigos)
         if result['s3_delta_files']:
-            print(f"Gerando tabelas deltas para {file.filename}...")
-            print(f"Gerando tabelas deltas para {file.filename}...")
+            logger.info("Gerando tabelas deltas para %s...", file.filename)
             
             for delta_name, delta_path in result['s3_delta_files'].items():
-                print(f"{delta_name}: salvo -> {delta_path}")
+                logger.info("%s: salvo -> %s", delta_name, delta_path)
         
-        return {
+        # As linhas já vêm como listas com tipos nativos: serializadas direto pelo orjson,
+        # sem a passagem do jsonable_encoder por cada célula. Os nomes das colunas vão uma única
+        # vez por tabela em tables_columns, na mesma ordem dos valores de cada linha
+        return ORJSONResponse({
             "message": f"PDF processado com sucesso. {len(result['tables_extracted'])} tabelas extraídas.",
             "pdf_info": result["pdf_info"],
             "tables_extracted": result["tables_extracted"],
-            "tables_data": {name: df.to_dict('records') for name, df in result['tables'].items()},
+            "tables_columns": {name: table['columns'] for name, table in result['tables'].items()},
+            "tables_data": {name: table['rows'] for name, table in result['tables'].items()},
             "s3_csv_files": result["s3_csv_files"],
             "s3_delta_files": result["s3_delta_files"],
             "processing_date": result["processing_date"]
-        }
+        })
 
+    except HTTPException:
+        raise
     except Exception as e:
-        # Limpa arquivo temporário se houver erro
-        if 'tmp_file_path' in locals():
-            try:
-                os.unlink(tmp_file_path)
-            except:
-                pass
         raise HTTPException(status_code=500, detail=f"Erro ao processar PDF: {str(e)}")
 
 @app.get("/s3-files")
@@ -1347,29 +1837,32 @@ async def list_s3_files(folder: str = Query(default="csv")):
         if not s3_processor.s3_client:
             raise HTTPException(status_code=503, detail="S3 não configurado")
         
-        # Lista objetos no S3
-        response = s3_processor.s3_client.list_objects_v2(
-            Bucket=s3_processor.bucket_name,
-            Prefix=f"{s3_processor.s3_folder}/{folder}/"
-        )
+        prefix = f"{s3_processor.s3_folder}/{folder}/"
+        with s3_list_cache_lock:
+            files = s3_list_cache.get(prefix)
         
-        files = []
-        if 'Contents' in response:
-            for obj in response['Contents']:
-                files.append({
+        if files is None:
+            # Lista objetos no S3 (todas as páginas, em thread para não bloquear o event loop)
+            objects = await asyncio.to_thread(s3_processor.list_objects, prefix)
+            files = [
+                {
                     "key": obj['Key'],
                     "size": obj['Size'],
                     "last_modified": obj['LastModified'].isoformat(),
                     "storage_class": obj.get('StorageClass', 'STANDARD'),
                     "s3_url": f"s3://{s3_processor.bucket_name}/{obj['Key']}"
-                })
+                }
+                for obj in objects
+            ]
+            with s3_list_cache_lock:
+                s3_list_cache[prefix] = files
         
         return {
             "bucket": s3_processor.bucket_name,
             "folder": f"{s3_processor.s3_folder}/{folder}",
             "files": files,
             "total_files": len(files),
-            "timestamp": datetime.now().isoformat()
+            "timestamp": utc_timestamp()
         }
         
     except Exception as e:
@@ -1377,31 +1870,15 @@ async def list_s3_files(folder: str = Query(default="csv")):
 
 @app.post("/clear-old-status")
 async def clear_old_status():
-    """Limpa status de processamento antigos (mais de 1 hora)"""
+    """Limpa status de processamento antigos (sem atualização há mais de STATUS_CLEAR_AFTER, 1 hora por padrão)"""
     try:
-        current_time = datetime.utcnow()
-        tasks_to_remove = []
-        
-        for task_id, status in processing_status.items():
-            try:
-                status_time = datetime.fromisoformat(status['timestamp'].replace('Z', '+00:00').replace('+00:00', ''))
-                time_diff = (current_time - status_time).total_seconds()
-                
-                # Remove status com mais de 1 hora
-                if time_diff > 3600:
-                    tasks_to_remove.append(task_id)
-            except:
-                # Se houver erro ao parsear o timestamp, remove
-                tasks_to_remove.append(task_id)
-        
-        for task_id in tasks_to_remove:
-            del processing_status[task_id]
+        removed_tasks = await asyncio.to_thread(clear_expired_status)
         
         return {
-            "message": f"Limpeza concluída. {len(tasks_to_remove)} status antigos removidos.",
-            "removed_tasks": len(tasks_to_remove),
-            "active_tasks": len(processing_status),
-            "timestamp": current_time.isoformat()
+            "message": f"Limpeza concluída. {removed_tasks} status antigos removidos.",
+            "removed_tasks": removed_tasks,
+            "active_tasks": await asyncio.to_thread(count_processing_status),
+            "timestamp": utc_timestamp()
         }
         
     except Exception as e:
@@ -1412,10 +1889,11 @@ async def clear_old_status():
 async def get_all_processing_status():
     """Retorna todos os status de processamento ativos"""
     try:
+        tasks = dict(await asyncio.to_thread(snapshot_processing_status))
         return {
-            "active_tasks": len(processing_status),
-            "tasks": processing_status,
-            "timestamp": datetime.utcnow().isoformat()
+            "active_tasks": len(tasks),
+            "tasks": tasks,
+            "timestamp": utc_timestamp()
         }
     except Exception as e:
         logger.error(f"Erro ao obter status: {e}")
@@ -1424,20 +1902,33 @@ async def get_all_processing_status():
 @app.post("/force-complete-status/{task_id}")
 async def force_complete_status(task_id: str):
     """Força a marcação de um status como concluído (para debug)"""
+    def force_complete() -> Optional[dict]:
+        with processing_status_lock:
+            task_status = get_task_status(task_id)
+            if task_status is None:
+                return None
+            
+            task_status = {
+                **task_status,
+                'status': ProcessingStatus.COMPLETED,
+                'progress': 100,
+                'message': "Processamento forçado como concluído",
+                'timestamp': utc_timestamp()
+            }
+            _store_status(task_id, task_status)
+            return task_status
+    
     try:
-        if task_id not in processing_status:
+        # Leitura e gravação (Redis ou memória, sob o lock) fora do event loop
+        task_status = await asyncio.to_thread(force_complete)
+        if task_status is None:
             raise HTTPException(status_code=404, detail="Task ID não encontrado")
         
-        processing_status[task_id]['status'] = ProcessingStatus.COMPLETED
-        processing_status[task_id]['progress'] = 100
-        processing_status[task_id]['message'] = "Processamento forçado como concluído"
-        processing_status[task_id]['timestamp'] = datetime.utcnow().isoformat()
-        
         return {
             "message": f"Status da task {task_id} forçado como concluído",
             "task_id": task_id,
-            "status": processing_status[task_id],
-            "timestamp": datetime.utcnow().isoformat()
+            "status": task_status,
+            "timestamp": utc_timestamp()
         }
         
     except HTTPException:
@@ -1450,10 +1941,10 @@ async def force_complete_status(task_id: str):
 async def check_completion(task_id: str):
     """Verifica especificamente se uma tarefa foi concluída"""
     try:
-        if task_id not in processing_status:
+        task_status = await asyncio.to_thread(get_task_status, task_id)
+        if task_status is None:
             raise HTTPException(status_code=404, detail="Task ID não encontrado")
         
-        task_status = processing_status[task_id]
         is_completed = task_status.get('status') == ProcessingStatus.COMPLETED
         is_error = task_status.get('status') == ProcessingStatus.ERROR
         
@@ -1484,7 +1975,7 @@ async def notify_completion():
     """Endpoint para simular notificação de conclusão (para teste)"""
     try:
         completed_tasks = []
-        for task_id, status in processing_status.items():
+        for task_id, status in await asyncio.to_thread(snapshot_processing_status):
             if status.get('status') == ProcessingStatus.COMPLETED:
                 completed_tasks.append({
                     "task_id": task_id,
@@ -1496,7 +1987,7 @@ async def notify_completion():
             "completed_tasks": completed_tasks,
             "total_completed": len(completed_tasks),
             "message": f"Encontradas {len(completed_tasks)} tarefas concluídas",
-            "timestamp": datetime.utcnow().isoformat()
+            "timestamp": utc_timestamp()
         }
         
     except Exception as e:
@@ -1514,7 +2005,8 @@ async def submit_feedback(
         actual_user_id = request.user_id or user_id
         
         # Salvar no DynamoDB usando message_id como chat_id
-        feedback_saved = dynamodb_service.save_feedback(
+        feedback_saved = await asyncio.to_thread(
+            dynamodb_service.save_feedback,
             chat_id=request.message_id,
             feedback_type=request.feedback_type,
             feedback_comment=request.comment or ""
@@ -1531,7 +2023,7 @@ async def submit_feedback(
             "message_id": request.message_id,
             "feedback_type": request.feedback_type,
             "user_id": actual_user_id,
-            "timestamp": datetime.utcnow().isoformat()
+            "timestamp": utc_timestamp()
         }
         
     except Exception as e:
@@ -1545,13 +2037,13 @@ async def get_user_feedback(
 ):
     """Obtém histórico de feedback do usuário"""
     try:
-        feedbacks = dynamodb_service.get_user_feedback(user_id, limit)
+        feedbacks = await asyncio.to_thread(dynamodb_service.get_user_feedback, user_id, limit)
         
         return {
             "user_id": user_id,
             "feedbacks": feedbacks,
             "total_feedbacks": len(feedbacks),
-            "timestamp": datetime.utcnow().isoformat()
+            "timestamp": utc_timestamp()
         }
         
     except Exception as e:
@@ -1563,14 +2055,15 @@ async def debug_dynamodb():
     """Endpoint de debug para verificar status do DynamoDB"""
     try:
         # Verificar se DynamoDB está disponível
-        is_available = dynamodb_service.is_available()
+        is_available = await asyncio.to_thread(dynamodb_service.is_available)
         
         # Tentar salvar um chat de teste
         test_chat_id = None
         test_save_error = None
         if is_available:
             try:
-                test_chat_id = dynamodb_service.save_chat_interaction(
+                test_chat_id = await asyncio.to_thread(
+                    dynamodb_service.save_chat_interaction,
                     user_id="test_user",
                     pdf_name="test.pdf",
                     question="Test question",
@@ -1584,7 +2077,7 @@ async def debug_dynamodb():
         test_search_error = None
         if is_available:
             try:
-                test_chats = dynamodb_service.get_chat_history("test_user", 5)
+                test_chats = await asyncio.to_thread(dynamodb_service.get_chat_history, "test_user", 5)
             except Exception as e:
                 test_search_error = str(e)
         
@@ -1592,6 +2085,7 @@ async def debug_dynamodb():
             "dynamodb_available": is_available,
             "region": dynamodb_service.region,
             "tables": dynamodb_service.tables,
+            "failed_chat_writes": dynamodb_service.failed_chat_writes,
             "test_save": {
                 "chat_id": test_chat_id,
                 "error": test_save_error
@@ -1601,12 +2095,12 @@ async def debug_dynamodb():
                 "chats": test_chats,
                 "error": test_search_error
             },
-            "timestamp": datetime.utcnow().isoformat()
+            "timestamp": utc_timestamp()
         }
         
     except Exception as e:
         logger.error(f"Erro no debug DynamoDB: {e}")
         return {
             "error": str(e),
-            "timestamp": datetime.utcnow().isoformat()
+            "timestamp": utc_timestamp()
         }
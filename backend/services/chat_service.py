@@ -2,26 +2,171 @@ from langchain_google_genai import GoogleGenerativeAI
 from langchain_aws import ChatBedrock
 from langchain.chains.question_answering import load_qa_chain
 from services.dynamodb_service import DynamoDBService
-from services.chromadb_client import ChromaDBService
+from services.chromadb_client import ChromaDBService, dedupe_similar_docs
 import os
+import asyncio
+import hashlib
+import threading
+from concurrent.futures import Future
 import google.generativeai as genai
+from botocore.config import Config
 import logging
-from typing import List, Dict, Any, Optional
+from typing import List, Dict, Any, Optional, Tuple, AsyncIterator, Callable
 from decimal import Decimal
+import numpy as np
+from cachetools import TTLCache
 
 logger = logging.getLogger(__name__)
 
 genai.configure(api_key=os.getenv("GOOGLE_API_KEY"))
 
+# Cache de respostas do LLM (mesma pergunta sobre o mesmo contexto)
+ANSWER_CACHE_SIZE = int(os.getenv("ANSWER_CACHE_SIZE", "4096"))
+ANSWER_CACHE_TTL = int(os.getenv("ANSWER_CACHE_TTL", "3600"))
+
+# Reaproveitamento de respostas também para perguntas parecidas (não só idênticas): mesmo PDF, usuário e
+# contexto recuperado, com similaridade de cosseno >= ANSWER_SIMILARITY_THRESHOLD entre as perguntas.
+# Desativado por padrão (0): perguntas quase idênticas podem pedir coisas diferentes ("maior" x "menor"
+# valor) e receberiam a resposta da outra. Ativar só com um limiar alto e ciente desse risco
+ANSWER_SIMILARITY_THRESHOLD = float(os.getenv("ANSWER_SIMILARITY_THRESHOLD", "0"))
+# Perguntas guardadas por escopo (as mais recentes)
+ANSWER_SIMILARITY_SCOPE_SIZE = 32
+
+# Cache curto das estatísticas de PDF (get_pdf_stats)
+PDF_STATS_CACHE_SIZE = 1024
+PDF_STATS_CACHE_TTL = float(os.getenv("PDF_STATS_CACHE_TTL", "5"))
+
+# Conexões mantidas com o Bedrock Runtime (reaproveitadas entre chamadas, evitando novo handshake TLS)
+BEDROCK_MAX_POOL_CONNECTIONS = int(os.getenv("BEDROCK_MAX_POOL_CONNECTIONS", "50"))
+
+# Precisão dos tempos gravados no DynamoDB (Decimal direto do float, sem passar por str)
+_SECONDS_QUANTUM = Decimal("0.001")
+_MS_QUANTUM = Decimal("0.1")
+
+# Aquecimento do LLM na inicialização: uma chamada mínima (cobrada) por worker, e /health responde 503 até
+# ela terminar. Desativado por padrão; LLM_WARMUP=true troca esse custo por uma primeira pergunta mais rápida
+LLM_WARMUP = os.getenv("LLM_WARMUP", "false").lower() == "true"
+
+# Marcador usado para o chat geral (sem PDF específico)
+GENERAL_CHAT_PDF = "general_chat"
+
+# Templates dos prompts (montados uma vez, preenchidos com format_map a cada pergunta)
+PDF_PROMPT_TEMPLATE = """
+            Com base no seguinte contexto extraído do documento '{pdf_name}', responda à pergunta de forma clara e detalhada.
+            
+            CONTEXTO:
+            {context}
+            
+            PERGUNTA: {question}
+            
+            RESPOSTA:
+            """
+
+GENERAL_PROMPT_TEMPLATE = """
+            Com base no seguinte contexto extraído dos documentos do usuário, responda à pergunta de forma clara e detalhada.
+            
+            CONTEXTO DOS DOCUMENTOS:
+            {context}
+            
+            PERGUNTA: {question}
+            
+            INSTRUÇÕES:
+            - Use principalmente as informações do contexto fornecido
+            - Se a informação não estiver no contexto, seja claro sobre isso e somente responda que não tem conhecimento sobre o assunto
+            - Cite os documentos relevantes quando possível
+            - Seja conversacional e útil
+            - Não responder perguntas fora do contexto ou que não tenham informações relevantes nos documentos
+            - Não inventar informações, apenas responder com base no contexto fornecido
+            - Responda de forma direta e objetiva
+            - Não incluir informações irrelevantes ou inventadas
+            - Senão encontrar informações nos documentos, informe que você não tem conhecimento sobre o assunto
+            - Quando não houver informações relevantes, informe que não encontrou dados suficientes para responder
+            - Se perguntar sobre tabelas delta, delta lake, informe que deve procurar o time de inteligência de dados para orientação
+            RESPOSTA:
+            """
+
+# Limite de caracteres do contexto enviado ao LLM (os trechos que não couberem são descartados)
+MAX_CTX_CHARS = int(os.getenv("MAX_CTX_CHARS", "24000"))
+
+# Limite estimado do prompt (≈4 caracteres por token), abaixo da janela de contexto do modelo e com folga
+# para a resposta: contextos maiores são truncados antes da chamada, em vez de falhar no provedor
+MAX_PROMPT_TOKENS = int(os.getenv("MAX_PROMPT_TOKENS", "150000"))
+MAX_PROMPT_CHARS = MAX_PROMPT_TOKENS * 4
+
+# Tamanho do trecho de cada fonte devolvido ao frontend
+SOURCE_PREVIEW_CHARS = 200
+
+
+class _GenerationAbandoned(Exception):
+    """A requisição que gerava a resposta foi cancelada: quem aguardava assume a geração"""
+
+
+def _message_text(response) -> str:
+    """Texto de uma resposta (ou chunk) de chat model, como o ChatBedrock"""
+    return response.content
+
+
+def _plain_text(response) -> str:
+    """Texto de uma resposta (ou chunk) de LLM de texto, como o GoogleGenerativeAI"""
+    return response if isinstance(response, str) else str(response)
+
+
+def _head_split(text: str, sep: str = "\n\n", n: int = 5) -> List[str]:
+    """Primeiros n trechos de text.split(sep), sem separar (nem copiar) o restante do texto"""
+    parts = []
+    start = 0
+    while len(parts) < n:
+        end = text.find(sep, start)
+        if end < 0:
+            parts.append(text[start:])
+            break
+        parts.append(text[start:end])
+        start = end + len(sep)
+    return parts
+
+
+def _preview(text: str) -> str:
+    """Trecho inicial do texto exibido como fonte (com reticências quando truncado)"""
+    return text if len(text) <= SOURCE_PREVIEW_CHARS else text[:SOURCE_PREVIEW_CHARS] + "..."
+
+
+def fit_context_docs(similar_docs: List[dict]) -> List[dict]:
+    """
+    Remove trechos repetidos e mantém, em ordem de relevância, os que cabem em MAX_CTX_CHARS
+    (para no primeiro que estoura o limite; o primeiro sempre entra, cortado se preciso)
+    """
+    selected = []
+    total = 0
+    for doc in dedupe_similar_docs(similar_docs):
+        text = doc.get("text", "")
+        if selected and total + len(text) > MAX_CTX_CHARS:
+            break
+        if len(text) > MAX_CTX_CHARS:
+            doc = {**doc, "text": text[:MAX_CTX_CHARS]}
+        selected.append(doc)
+        total += len(text) + 2
+    return selected
+
 
 class ChatService:
-    def __init__(self, use_bedrock: bool = True):
-        """Inicializa o serviço de chat com DynamoDB e ChromaDB"""
+    def __init__(self, use_bedrock: bool = True, dynamodb: Optional[DynamoDBService] = None,
+                 chromadb: Optional[ChromaDBService] = None):
+        """Inicializa o serviço de chat com DynamoDB e ChromaDB (instâncias compartilhadas, se fornecidas)"""
         self.use_bedrock = use_bedrock
         
         # Inicializar serviços
-        self.dynamodb = DynamoDBService()
-        self.chromadb = ChromaDBService()
+        self.dynamodb = dynamodb or DynamoDBService()
+        self.chromadb = chromadb or ChromaDBService()
+        
+        # Cache de respostas: (pdf_name, user_id, pergunta normalizada, hash do contexto) -> resposta
+        self._answer_cache = TTLCache(maxsize=ANSWER_CACHE_SIZE, ttl=ANSWER_CACHE_TTL)
+        self._answer_cache_lock = threading.Lock()
+        # Respostas por escopo (pdf_name, user_id, hash do contexto) -> [(embedding normalizado da pergunta, resposta)]
+        self._similar_answers = TTLCache(maxsize=ANSWER_CACHE_SIZE, ttl=ANSWER_CACHE_TTL)
+        # Estatísticas por (pdf_name, user_id): evita repetir a leitura de todos os chunks no ChromaDB
+        self._pdf_stats_cache = TTLCache(maxsize=PDF_STATS_CACHE_SIZE, ttl=PDF_STATS_CACHE_TTL)
+        # Gerações em andamento: pedidos idênticos simultâneos aguardam a mesma chamada ao LLM
+        self._inflight: Dict[Tuple, Future] = {}
         
         # Configurar modelos LLM
         self.setup_llm_models()
@@ -46,7 +191,12 @@ class ChatService:
                         "top_p": 1,
                         "stop_sequences": [],
                     },
-                    region_name=os.getenv("AWS_DEFAULT_REGION", "us-east-1")
+                    region_name=os.getenv("AWS_DEFAULT_REGION", "us-east-1"),
+                    config=Config(
+                        max_pool_connections=BEDROCK_MAX_POOL_CONNECTIONS,
+                        tcp_keepalive=True,
+                        retries={'mode': 'adaptive'}
+                    )
                 )
                 print("AWS Bedrock (Claude 3.5 Sonnet) configurado para chat")
             except Exception as e:
@@ -73,11 +223,321 @@ class ChatService:
             self.llm = None
             self.model_type = None
         
+        # Resolvidos uma vez: rótulo gravado nos metadados e extração do texto das respostas do modelo escolhido
+        if self.model_type == "bedrock":
+            self._model_label = "bedrock-claude-3.5-sonnet"
+            self._extract_text = _message_text
+        else:
+            self._model_label = "google-gemini-2.5-flash"
+            self._extract_text = _plain_text
+        
         # Carrega chain QA se modelo disponível
         if self.llm:
             self.qa_chain = load_qa_chain(self.llm, chain_type="stuff")
 
-    def ask_question(self, question: str, pdf_name: str, user_id: str = None, context_override: str = None) -> Dict[str, Any]:
+    def warmup_llm(self):
+        """Chamada mínima ao modelo para resolver credenciais e abrir a conexão antes da primeira pergunta"""
+        if self.llm and LLM_WARMUP:
+            self.llm.invoke("ok")
+
+    async def _generate_answer(self, prompt: str) -> str:
+        """Gera a resposta do LLM (API assíncrona do LangChain) e extrai o texto conforme o tipo de modelo"""
+        return self._extract_text(await self.llm.ainvoke(prompt))
+
+    @staticmethod
+    def _answer_cache_key(question: str, pdf_name: str, user_id: str, context: str) -> Tuple:
+        """Gera a chave do cache de respostas (escopo + pergunta normalizada + contexto)"""
+        normalized_question = " ".join(question.lower().split())
+        context_hash = hashlib.sha1(context.encode("utf-8")).hexdigest()
+        return (pdf_name, user_id, normalized_question, context_hash)
+
+    def _get_cached_answer(self, cache_key: Tuple) -> Optional[str]:
+        with self._answer_cache_lock:
+            return self._answer_cache.get(cache_key)
+
+    def _set_cached_answer(self, cache_key: Tuple, answer: str):
+        with self._answer_cache_lock:
+            self._answer_cache[cache_key] = answer
+
+    def _embed_question(self, question: str) -> Optional[np.ndarray]:
+        """Embedding normalizado da pergunta (None se o reaproveitamento por similaridade estiver desativado ou falhar)"""
+        if ANSWER_SIMILARITY_THRESHOLD <= 0:
+            return None
+        try:
+            vector = np.asarray(self.chromadb.client.embed_queries([question])[0], dtype=np.float32)
+        except Exception as e:
+            logger.warning(f"Falha ao gerar embedding da pergunta: {e}")
+            return None
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else None
+
+    @staticmethod
+    def _similarity_scope(cache_key: Tuple) -> Tuple:
+        """Escopo em que respostas podem ser reaproveitadas entre perguntas parecidas: (pdf_name, user_id, contexto)"""
+        return (cache_key[0], cache_key[1], cache_key[3])
+
+    def _get_similar_answer(self, cache_key: Tuple, embedding: np.ndarray) -> Optional[str]:
+        """Resposta da pergunta mais parecida do mesmo escopo, se a similaridade atingir o limiar"""
+        with self._answer_cache_lock:
+            entries = list(self._similar_answers.get(self._similarity_scope(cache_key), ()))
+        if not entries:
+            return None
+        similarities = np.stack([vector for vector, _ in entries]) @ embedding
+        best = int(np.argmax(similarities))
+        return entries[best][1] if similarities[best] >= ANSWER_SIMILARITY_THRESHOLD else None
+
+    def _add_similar_answer(self, cache_key: Tuple, embedding: Optional[np.ndarray], answer: str):
+        if embedding is None:
+            return
+        scope = self._similarity_scope(cache_key)
+        with self._answer_cache_lock:
+            entries = list(self._similar_answers.get(scope, ()))
+            entries.append((embedding, answer))
+            self._similar_answers[scope] = entries[-ANSWER_SIMILARITY_SCOPE_SIZE:]
+
+    async def _get_or_generate_answer(self, cache_key: Tuple, prompt: str, question: str,
+                                      no_cache: bool = False) -> Tuple[str, bool]:
+        """
+        Obtém a resposta do cache (pergunta idêntica ou parecida, sobre o mesmo contexto) ou gera com o LLM,
+        agrupando pedidos idênticos concorrentes
+        
+        Args:
+            question: Pergunta original, usada no embedding para o cache por similaridade (só calculado
+                se a resposta não estiver no cache exato)
+            no_cache: Ignora as respostas em cache e força uma nova geração (que atualiza o cache)
+        
+        Returns:
+            Tupla (resposta, True se não foi necessário chamar o LLM)
+        """
+        if not no_cache:
+            with self._answer_cache_lock:
+                answer = self._answer_cache.get(cache_key)
+            if answer is not None:
+                return answer, True
+        
+        # Embedding só depois de perder o cache exato (sem chamada ao /embed se a similaridade estiver desativada)
+        embedding = None
+        if ANSWER_SIMILARITY_THRESHOLD > 0:
+            embedding = await asyncio.to_thread(self._embed_question, question)
+        
+        if no_cache:
+            answer = await self._generate_answer(prompt)
+            self._set_cached_answer(cache_key, answer)
+            self._add_similar_answer(cache_key, embedding, answer)
+            return answer, False
+        # Pergunta parecida já respondida com o mesmo contexto
+        if embedding is not None:
+            answer = self._get_similar_answer(cache_key, embedding)
+            if answer is not None:
+                return answer, True
+        
+        while True:
+            with self._answer_cache_lock:
+                answer = self._answer_cache.get(cache_key)
+                if answer is not None:
+                    return answer, True
+                future = self._inflight.get(cache_key)
+                is_owner = future is None
+                if is_owner:
+                    future = Future()
+                    self._inflight[cache_key] = future
+            
+            if is_owner:
+                break
+            # Outra requisição já está gerando esta resposta. shield: se esta requisição for cancelada,
+            # o future compartilhado (aguardado pelas demais) não é cancelado junto
+            try:
+                return await asyncio.shield(asyncio.wrap_future(future)), True
+            except _GenerationAbandoned:
+                continue
+        
+        try:
+            answer = await self._generate_answer(prompt)
+        except BaseException as e:
+            # Inclui CancelledError (cliente desconectou, timeout): a entrada sempre sai de _inflight e quem
+            # aguardava é liberado (com o erro do LLM, ou para assumir a geração se esta foi cancelada)
+            with self._answer_cache_lock:
+                self._inflight.pop(cache_key, None)
+            future.set_exception(e if isinstance(e, Exception) else _GenerationAbandoned())
+            raise
+        
+        with self._answer_cache_lock:
+            self._answer_cache[cache_key] = answer
+            self._inflight.pop(cache_key, None)
+        future.set_result(answer)
+        self._add_similar_answer(cache_key, embedding, answer)
+        return answer, False
+
+    def invalidate_answer_cache(self, pdf_name: str = None):
+        """
+        Remove respostas em cache de um PDF (e do chat geral, que também o consulta)
+        
+        Args:
+            pdf_name: Nome do PDF reprocessado. Se None, limpa todo o cache
+        """
+        with self._answer_cache_lock:
+            if pdf_name is None:
+                self._answer_cache.clear()
+                self._similar_answers.clear()
+                self._pdf_stats_cache.clear()
+                return
+            for key in [k for k in self._pdf_stats_cache.keys() if k[0] == pdf_name]:
+                self._pdf_stats_cache.pop(key, None)
+            for cache in (self._answer_cache, self._similar_answers):
+                for key in list(cache.keys()):
+                    if key[0] in (pdf_name, GENERAL_CHAT_PDF):
+                        cache.pop(key, None)
+
+    def _collect_context(self, search: Callable[[], List[dict]], context_override: Optional[str],
+                         override_pdf_name: str, default_pdf_name: str) -> Tuple[str, List[Dict[str, Any]]]:
+        """
+        Monta o contexto combinado e as fontes a partir de uma busca no ChromaDB (ou do contexto fornecido)
+        
+        Args:
+            search: Executa a busca e retorna os documentos similares (chamada só sem context_override)
+            context_override: Contexto pré-processado para usar no lugar da busca (opcional)
+            override_pdf_name: pdf_name das fontes geradas a partir de context_override
+            default_pdf_name: pdf_name das fontes cujos metadados não o trazem
+        
+        Returns:
+            Tupla (contexto combinado, fontes). Contexto vazio se nada foi encontrado
+        """
+        # Se contexto foi fornecido, usar ele diretamente
+        if context_override:
+            sources = []
+            # Criar sources formatados para o frontend
+            for i, chunk in enumerate(_head_split(context_override)):  # Máximo 5 chunks
+                sources.append({
+                    "text": _preview(chunk),
+                    "pdf_name": override_pdf_name,
+                    "chunk_index": i,
+                    "similarity_score": 1.0
+                })
+            return context_override, sources
+        
+        # Preparar contexto para o LLM
+        context_texts = []
+        sources = []
+        
+        for doc in fit_context_docs(search()):
+            text = doc["text"]
+            context_texts.append(text)
+            metadata = doc.get("metadata", {})
+            sources.append({
+                "text": _preview(text),
+                "pdf_name": metadata.get("pdf_name", default_pdf_name),
+                "chunk_index": metadata.get("chunk_index", 0),
+                "similarity_score": doc.get("score", 0)
+            })
+        
+        # Combinar contextos
+        return "\n\n".join(context_texts), sources
+
+    def _prepare_pdf_context(self, question: str, pdf_name: str, user_id: str = None,
+                             context_override: str = None) -> Tuple[str, List[Dict[str, Any]]]:
+        """Monta o contexto e as fontes para uma pergunta sobre um PDF"""
+        return self._collect_context(
+            lambda: self.chromadb.search_similar_content(
+                query=question,
+                pdf_name=pdf_name,
+                user_id=user_id,
+                max_results=5
+            ),
+            context_override, override_pdf_name=pdf_name, default_pdf_name=pdf_name
+        )
+
+    def _prepare_general_context(self, question: str, user_id: str = None,
+                                 context_override: str = None) -> Tuple[str, List[Dict[str, Any]]]:
+        """Monta o contexto e as fontes para uma pergunta geral (todos os PDFs do usuário)"""
+        return self._collect_context(
+            lambda: self.chromadb.search_similar_content(
+                query=question,
+                pdf_name=None,  # Busca em todos os PDFs
+                user_id=user_id,
+                max_results=5
+            ),
+            context_override, override_pdf_name="Context Override", default_pdf_name="Unknown"
+        )
+
+    def _build_request(self, question: str, pdf_name: Optional[str], user_id: str,
+                       combined_context: str) -> Tuple[str, Tuple]:
+        """
+        Monta o prompt e a chave do cache de respostas para um contexto já recuperado
+        
+        Args:
+            pdf_name: PDF da pergunta, ou None para o chat geral (todos os documentos do usuário)
+        
+        Returns:
+            Tupla (prompt, chave do cache de respostas)
+        """
+        template = PDF_PROMPT_TEMPLATE if pdf_name else GENERAL_PROMPT_TEMPLATE
+        context_budget = MAX_PROMPT_CHARS - len(template) - len(question) - len(pdf_name or "")
+        if context_budget <= 0:
+            raise ValueError(f"Pergunta excede o limite de ~{MAX_PROMPT_TOKENS} tokens do prompt")
+        if len(combined_context) > context_budget:
+            logger.warning(f"Contexto de {len(combined_context)} caracteres truncado para {context_budget} (limite do prompt)")
+            combined_context = combined_context[:context_budget]
+        
+        if pdf_name:
+            prompt = self._build_pdf_prompt(question, pdf_name, combined_context)
+        else:
+            prompt = self._build_general_prompt(question, combined_context)
+        return prompt, self._answer_cache_key(question, pdf_name or GENERAL_CHAT_PDF, user_id, combined_context)
+
+    def _prepare_request(self, question: str, pdf_name: Optional[str], user_id: str = None,
+                         context_override: str = None) -> Tuple[str, List[Dict[str, Any]], str, Optional[Tuple]]:
+        """
+        Recupera o contexto e monta fontes, prompt e chave do cache (executado em thread, fora do event loop)
+        
+        Returns:
+            Tupla (contexto combinado, fontes, prompt, chave do cache). Contexto vazio (e prompt/chave
+            vazios) se nada foi encontrado
+        """
+        if pdf_name:
+            combined_context, sources = self._prepare_pdf_context(question, pdf_name, user_id, context_override)
+        else:
+            combined_context, sources = self._prepare_general_context(question, user_id, context_override)
+        if not combined_context:
+            return combined_context, sources, "", None
+        prompt, cache_key = self._build_request(question, pdf_name, user_id, combined_context)
+        return combined_context, sources, prompt, cache_key
+
+    @staticmethod
+    def _build_pdf_prompt(question: str, pdf_name: str, combined_context: str) -> str:
+        """Cria o prompt para perguntas sobre um PDF específico"""
+        return PDF_PROMPT_TEMPLATE.format_map({"pdf_name": pdf_name, "context": combined_context, "question": question})
+
+    @staticmethod
+    def _build_general_prompt(question: str, combined_context: str) -> str:
+        """Cria o prompt para perguntas gerais (todos os documentos do usuário)"""
+        return GENERAL_PROMPT_TEMPLATE.format_map({"context": combined_context, "question": question})
+
+    def _save_interaction(self, user_id: str, pdf_name: str, question: str, answer: str,
+                          num_sources: int, processing_time: float, **extra_metadata) -> Optional[str]:
+        """Agenda a gravação da interação no DynamoDB (em lote, fora da requisição). Retorna o chat_id ou None em caso de falha"""
+        if not user_id:
+            return None
+        try:
+            return self.dynamodb.enqueue_chat_interaction(
+                user_id=user_id,
+                pdf_name=pdf_name,
+                question=question,
+                answer=answer,
+                metadata={
+                    "num_sources": num_sources,
+                    "chromadb_collection": self.chromadb.default_collection,
+                    "model_used": self._model_label,
+                    **extra_metadata,
+                    "processing_time_seconds": Decimal(processing_time).quantize(_SECONDS_QUANTUM),
+                    "processing_time_ms": Decimal(processing_time * 1000).quantize(_MS_QUANTUM)
+                }
+            )
+        except Exception as e:
+            logger.error(f"Erro ao salvar interação no DynamoDB: {e}")
+            return None
+
+    async def ask_question(self, question: str, pdf_name: str, user_id: str = None, context_override: str = None,
+                           no_cache: bool = False) -> Dict[str, Any]:
         """
         Processa uma pergunta usando RAG com ChromaDB
         
@@ -86,6 +546,7 @@ class ChatService:
             pdf_name: Nome do PDF para consultar
             user_id: ID do usuário (opcional)
             context_override: Contexto pré-processado para usar (opcional)
+            no_cache: Ignora respostas em cache e gera uma nova (opcional)
         
         Returns:
             Dicionário com pergunta, resposta e metadados
@@ -94,104 +555,32 @@ class ChatService:
         start_time = time.time()
         
         try:
-            # Se contexto foi fornecido, usar ele diretamente
-            if context_override:
-                combined_context = context_override
-                sources = []
-                # Criar sources formatados para o frontend
-                for i, chunk in enumerate(context_override.split('\n\n')[:5]):  # Máximo 5 chunks
-                    sources.append({
-                        "text": chunk[:200] + "..." if len(chunk) > 200 else chunk,
-                        "pdf_name": pdf_name,
-                        "chunk_index": i,
-                        "similarity_score": 1.0
-                    })
-            else:
-                # Buscar conteúdo similar no ChromaDB
-                similar_docs = self.chromadb.search_similar_content(
-                    query=question,
-                    pdf_name=pdf_name,
-                    user_id=user_id,
-                    max_results=5
-                )
-                
-                if not similar_docs:
-                    error_msg = f"Nenhum conteúdo encontrado para o PDF '{pdf_name}'"
-                    logger.warning(error_msg)
-                    return {
-                        "question": question,
-                        "answer": error_msg,
-                        "error": "PDF não encontrado ou sem conteúdo indexado",
-                        "sources": []
-                    }
-                
-                # Preparar contexto para o LLM
-                context_texts = []
-                sources = []
-                
-                for doc in similar_docs:
-                    context_texts.append(doc["text"])
-                    metadata = doc.get("metadata", {})
-                    sources.append({
-                        "text": doc["text"][:200] + "..." if len(doc["text"]) > 200 else doc["text"],
-                        "pdf_name": metadata.get("pdf_name", pdf_name),
-                        "chunk_index": metadata.get("chunk_index", 0),
-                        "similarity_score": doc.get("score", 0)
-                    })
-                
-                # Combinar contextos
-                combined_context = "\n\n".join(context_texts)
-            
-            # Criar prompt melhorado
-            enhanced_prompt = f"""
-            Com base no seguinte contexto extraído do documento '{pdf_name}', responda à pergunta de forma clara e detalhada.
-            
-            CONTEXTO:
-            {combined_context}
-            
-            PERGUNTA: {question}
-            
-            RESPOSTA:
-            """
+            # Busca no ChromaDB (com montagem do prompt), em thread
+            combined_context, sources, enhanced_prompt, cache_key = await asyncio.to_thread(
+                self._prepare_request, question, pdf_name, user_id, context_override
+            )
+            
+            if not combined_context:
+                error_msg = f"Nenhum conteúdo encontrado para o PDF '{pdf_name}'"
+                logger.warning(error_msg)
+                return {
+                    "question": question,
+                    "answer": error_msg,
+                    "error": "PDF não encontrado ou sem conteúdo indexado",
+                    "sources": []
+                }
             
-            # Gerar resposta usando o modelo LLM
+            # Gerar resposta usando o modelo LLM (perguntas repetidas ou simultâneas reaproveitam a mesma geração)
             try:
-                response = self.llm.invoke(enhanced_prompt)
-                # Extrair conteúdo baseado no tipo de modelo
-                if self.use_bedrock and hasattr(response, 'content'):
-                    answer = response.content
-                elif isinstance(response, str):
-                    answer = response
-                else:
-                    answer = str(response)
+                answer, cache_hit = await self._get_or_generate_answer(cache_key, enhanced_prompt, question, no_cache)
             except Exception as e:
                 logger.error(f"Erro ao gerar resposta com LLM: {e}")
                 answer = f"Erro ao processar a pergunta. Contexto encontrado mas falha na geração da resposta: {e}"
+                cache_hit = False
             
             # Salvar interação no DynamoDB
-            chat_id = None
             processing_time = time.time() - start_time
-            
-            # Determinar modelo usado
-            model_used = "bedrock-claude-3.5-sonnet" if self.use_bedrock and self.bedrock_llm else "google-gemini-2.5-flash"
-            
-            if user_id:
-                try:
-                    chat_id = self.dynamodb.save_chat_interaction(
-                        user_id=user_id,
-                        pdf_name=pdf_name,
-                        question=question,
-                        answer=answer,
-                        metadata={
-                            "num_sources": len(sources),
-                            "chromadb_collection": self.chromadb.default_collection,
-                            "model_used": model_used,
-                            "processing_time_seconds": Decimal(str(round(processing_time, 3))),
-                            "processing_time_ms": Decimal(str(round(processing_time * 1000, 1)))
-                        }
-                    )
-                except Exception as e:
-                    logger.error(f"Erro ao salvar interação no DynamoDB: {e}")
+            chat_id = self._save_interaction(user_id, pdf_name, question, answer, len(sources), processing_time)
             
             result = {
                 "question": question,
@@ -203,9 +592,10 @@ class ChatService:
                     "chat_id": chat_id,
                     "num_sources_found": len(sources),
                     "total_context_length": len(combined_context),
-                    "model_used": model_used,
+                    "model_used": self._model_label,
                     "processing_time_seconds": round(processing_time, 3),
-                    "processing_time_ms": round(processing_time * 1000, 1)
+                    "processing_time_ms": round(processing_time * 1000, 1),
+                    "cache_hit": cache_hit
                 }
             }
             
@@ -222,6 +612,95 @@ class ChatService:
                 "sources": []
             }
 
+    async def stream_question(self, question: str, pdf_name: str, user_id: str = None,
+                              context_override: str = None) -> AsyncIterator[Dict[str, Any]]:
+        """
+        Versão em streaming de ask_question: gera eventos à medida que o LLM produz a resposta
+        
+        Eventos:
+            {"type": "sources", "sources": [...]} antes da resposta
+            {"type": "delta", "text": "..."} para cada trecho gerado
+            {"type": "done", "metadata": {...}} ao final (após salvar a interação)
+            {"type": "error", "error": "..."} em caso de falha
+        """
+        import time
+        start_time = time.time()
+        
+        try:
+            combined_context, sources = await asyncio.to_thread(
+                self._prepare_pdf_context, question, pdf_name, user_id, context_override
+            )
+        except Exception as e:
+            logger.error(f"Erro ao processar pergunta em streaming: {e}")
+            yield {"type": "error", "error": str(e)}
+            return
+        
+        if not combined_context:
+            yield {"type": "error", "error": f"Nenhum conteúdo encontrado para o PDF '{pdf_name}'"}
+            return
+        
+        async for event in self.stream_answer(question, pdf_name, combined_context, sources, user_id, start_time):
+            yield event
+
+    async def stream_answer(self, question: str, pdf_name: Optional[str], combined_context: str,
+                            sources: List[Dict[str, Any]], user_id: str = None,
+                            start_time: float = None) -> AsyncIterator[Dict[str, Any]]:
+        """
+        Gera em streaming a resposta para um contexto já recuperado (mesmos eventos de stream_question).
+        Usa a API assíncrona do LangChain: cada trecho é enviado assim que o LLM o produz, sem ocupar uma thread
+        
+        Args:
+            pdf_name: PDF da pergunta, ou None para o chat geral (todos os documentos do usuário)
+            combined_context: Contexto enviado ao LLM
+            sources: Fontes enviadas no primeiro evento
+            start_time: Início do processamento (para o tempo total), se já começou antes
+        """
+        import time
+        start_time = start_time or time.time()
+        
+        try:
+            yield {"type": "sources", "sources": sources}
+            
+            cache_pdf_name = pdf_name or GENERAL_CHAT_PDF
+            extra_metadata = {} if pdf_name else {"chat_type": "general"}
+            # Prompt e hash do contexto (CPU) em thread, fora do event loop
+            prompt, cache_key = await asyncio.to_thread(
+                self._build_request, question, pdf_name, user_id, combined_context
+            )
+            answer = self._get_cached_answer(cache_key)
+            cache_hit = answer is not None
+            if cache_hit:
+                yield {"type": "delta", "text": answer}
+            else:
+                parts = []
+                async for chunk in self.llm.astream(prompt):
+                    text = self._extract_text(chunk)
+                    if text:
+                        parts.append(text)
+                        yield {"type": "delta", "text": text}
+                answer = "".join(parts)
+                self._set_cached_answer(cache_key, answer)
+            
+            processing_time = time.time() - start_time
+            chat_id = self._save_interaction(user_id, cache_pdf_name, question, answer, len(sources),
+                                             processing_time, **extra_metadata)
+            yield {
+                "type": "done",
+                "metadata": {
+                    "pdf_name": pdf_name,
+                    "user_id": user_id,
+                    "chat_id": chat_id,
+                    "num_sources_found": len(sources),
+                    "model_used": self._model_label,
+                    "processing_time_seconds": round(processing_time, 3),
+                    "cache_hit": cache_hit,
+                    **extra_metadata
+                }
+            }
+        except Exception as e:
+            logger.error(f"Erro ao processar pergunta em streaming: {e}")
+            yield {"type": "error", "error": str(e)}
+
     def get_chat_history(self, user_id: str, pdf_name: str = None, limit: int = 10) -> List[Dict[str, Any]]:
         """
         Obtém histórico de chat do usuário
@@ -335,6 +814,11 @@ class ChatService:
         Returns:
             Dicionário com estatísticas
         """
+        with self._answer_cache_lock:
+            cached = self._pdf_stats_cache.get((pdf_name, user_id))
+        if cached is not None:
+            return dict(cached)
+        
         try:
             # Obter chunks do ChromaDB
             chunks = self.chromadb.get_pdf_chunks(pdf_name, user_id)
@@ -360,13 +844,16 @@ class ChatService:
                     "avg_chunk_size": total_chars / len(chunks) if chunks else 0
                 })
             
-            return stats
+            with self._answer_cache_lock:
+                self._pdf_stats_cache[(pdf_name, user_id)] = stats
+            return dict(stats)
             
         except Exception as e:
             logger.error(f"Erro ao obter estatísticas do PDF: {e}")
             return {"error": str(e)}
 
-    def ask_question_general(self, question: str, user_id: str = None, context_override: str = None) -> Dict[str, Any]:
+    async def ask_question_general(self, question: str, user_id: str = None, context_override: str = None,
+                                   no_cache: bool = False) -> Dict[str, Any]:
         """
         Processa uma pergunta geral (sem PDF específico) usando RAG com ChromaDB
         
@@ -374,6 +861,7 @@ class ChatService:
             question: Pergunta do usuário
             user_id: ID do usuário (opcional)
             context_override: Contexto pré-processado para usar (opcional)
+            no_cache: Ignora respostas em cache e gera uma nova (opcional)
         
         Returns:
             Dicionário com pergunta, resposta e metadados
@@ -382,116 +870,33 @@ class ChatService:
         start_time = time.time()
         
         try:
-            # Se contexto foi fornecido, usar ele diretamente
-            if context_override:
-                combined_context = context_override
-                sources = []
-                # Criar sources formatados para o frontend
-                for i, chunk in enumerate(context_override.split('\n\n')[:5]):  # Máximo 5 chunks
-                    sources.append({
-                        "text": chunk[:200] + "..." if len(chunk) > 200 else chunk,
-                        "pdf_name": "Context Override",
-                        "chunk_index": i,
-                        "similarity_score": 1.0
-                    })
-            else:
-                # Buscar conteúdo similar no ChromaDB em todos os PDFs do usuário
-                similar_docs = self.chromadb.search_similar_content(
-                    query=question,
-                    pdf_name=None,  # Busca em todos os PDFs
-                    user_id=user_id,
-                    max_results=5
-                )
-                
-                if not similar_docs:
-                    error_msg = "Não encontrei informações relevantes nos seus documentos para responder essa pergunta."
-                    logger.warning(error_msg)
-                    return {
-                        "question": question,
-                        "answer": error_msg,
-                        "error": "Nenhum conteúdo relevante encontrado",
-                        "sources": []
-                    }
-                
-                # Preparar contexto para o LLM
-                context_texts = []
-                sources = []
-                
-                for doc in similar_docs:
-                    context_texts.append(doc["text"])
-                    metadata = doc.get("metadata", {})
-                    sources.append({
-                        "text": doc["text"][:200] + "..." if len(doc["text"]) > 200 else doc["text"],
-                        "pdf_name": metadata.get("pdf_name", "Unknown"),
-                        "chunk_index": metadata.get("chunk_index", 0),
-                        "similarity_score": doc.get("score", 0)
-                    })
-                
-                combined_context = "\n\n".join(context_texts)
-            
-            # Criar prompt melhorado para pergunta geral
-            enhanced_prompt = f"""
-            Com base no seguinte contexto extraído dos documentos do usuário, responda à pergunta de forma clara e detalhada.
-            
-            CONTEXTO DOS DOCUMENTOS:
-            {combined_context}
-            
-            PERGUNTA: {question}
-            
-            INSTRUÇÕES:
-            - Use principalmente as informações do contexto fornecido
-            - Se a informação não estiver no contexto, seja claro sobre isso e somente responda que não tem conhecimento sobre o assunto
-            - Cite os documentos relevantes quando possível
-            - Seja conversacional e útil
-            - Não responder perguntas fora do contexto ou que não tenham informações relevantes nos documentos
-            - Não inventar informações, apenas responder com base no contexto fornecido
-            - Responda de forma direta e objetiva
-            - Não incluir informações irrelevantes ou inventadas
-            - Senão encontrar informações nos documentos, informe que você não tem conhecimento sobre o assunto
-            - Quando não houver informações relevantes, informe que não encontrou dados suficientes para responder
-            - Se perguntar sobre tabelas delta, delta lake, informe que deve procurar o time de inteligência de dados para orientação
-            RESPOSTA:
-            """
+            # Busca no ChromaDB (todos os PDFs do usuário, com montagem do prompt), em thread
+            combined_context, sources, enhanced_prompt, cache_key = await asyncio.to_thread(
+                self._prepare_request, question, None, user_id, context_override
+            )
+            
+            if not combined_context:
+                error_msg = "Não encontrei informações relevantes nos seus documentos para responder essa pergunta."
+                logger.warning(error_msg)
+                return {
+                    "question": question,
+                    "answer": error_msg,
+                    "error": "Nenhum conteúdo relevante encontrado",
+                    "sources": []
+                }
             
-            # Gerar resposta usando o modelo LLM
+            # Gerar resposta usando o modelo LLM (perguntas repetidas ou simultâneas reaproveitam a mesma geração)
             try:
-                response = self.llm.invoke(enhanced_prompt)
-                # Extrair conteúdo baseado no tipo de modelo
-                if self.use_bedrock and hasattr(response, 'content'):
-                    answer = response.content
-                elif isinstance(response, str):
-                    answer = response
-                else:
-                    answer = str(response)
+                answer, cache_hit = await self._get_or_generate_answer(cache_key, enhanced_prompt, question, no_cache)
             except Exception as e:
                 logger.error(f"Erro ao gerar resposta com LLM: {e}")
                 answer = f"Erro ao processar a pergunta. Contexto encontrado mas falha na geração da resposta: {e}"
+                cache_hit = False
             
-            # Salvar interação no DynamoDB
-            chat_id = None
+            # Salvar interação no DynamoDB (pdf_name marcador para chat geral)
             processing_time = time.time() - start_time
-            
-            # Determinar modelo usado
-            model_used = "bedrock-claude-3.5-sonnet" if self.use_bedrock and self.bedrock_llm else "google-gemini-2.5-flash"
-            
-            if user_id:
-                try:
-                    chat_id = self.dynamodb.save_chat_interaction(
-                        user_id=user_id,
-                        pdf_name="general_chat",  # Marcador para chat geral
-                        question=question,
-                        answer=answer,
-                        metadata={
-                            "num_sources": len(sources),
-                            "chromadb_collection": self.chromadb.default_collection,
-                            "model_used": model_used,
-                            "chat_type": "general",
-                            "processing_time_seconds": Decimal(str(round(processing_time, 3))),
-                            "processing_time_ms": Decimal(str(round(processing_time * 1000, 1)))
-                        }
-                    )
-                except Exception as e:
-                    logger.error(f"Erro ao salvar interação no DynamoDB: {e}")
+            chat_id = self._save_interaction(user_id, GENERAL_CHAT_PDF, question, answer, len(sources),
+                                             processing_time, chat_type="general")
             
             result = {
                 "question": question,
@@ -503,9 +908,10 @@ class ChatService:
                     "num_sources_found": len(sources),
                     "total_context_length": len(combined_context),
                     "chat_type": "general",
-                    "model_used": model_used,
+                    "model_used": self._model_label,
                     "processing_time_seconds": round(processing_time, 3),
-                    "processing_time_ms": round(processing_time * 1000, 1)
+                    "processing_time_ms": round(processing_time * 1000, 1),
+                    "cache_hit": cache_hit
                 }
             }
             
@@ -1,25 +1,101 @@
 import requests
-import json
+import orjson
 import logging
-from typing import List, Dict, Any, Optional
+from typing import List, Dict, Any, Optional, Callable
 import os
 from urllib.parse import urljoin
-from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from datetime import datetime, timezone
+from tenacity import Retrying, stop_after_attempt, wait_exponential_jitter, retry_if_exception
 
 logger = logging.getLogger(__name__)
 
+# Número de chunks enviados por requisição de inserção
+CHROMA_BATCH_SIZE = int(os.getenv("CHROMA_BATCH_SIZE", "200"))
+# Lotes de inserção em andamento ao mesmo tempo: enquanto o serviço gera os embeddings de um lote,
+# o próximo já é serializado e enviado
+CHROMA_ADD_PARALLELISM = int(os.getenv("CHROMA_ADD_PARALLELISM", "2"))
+
+# Conexões keep-alive mantidas com o serviço ChromaDB. O cliente é usado por várias threads
+# (buscas em lote, endpoints via to_thread, indexação em background); com o padrão do requests (10)
+# as conexões excedentes são abertas e descartadas a cada requisição
+CHROMA_POOL_MAXSIZE = int(os.getenv("CHROMA_POOL_MAXSIZE", "50"))
+
+# Novas tentativas para falhas transitórias (timeout, conexão, 429 e 5xx), com backoff exponencial e jitter
+CHROMA_MAX_RETRIES = int(os.getenv("CHROMA_MAX_RETRIES", "3"))
+CHROMA_RETRY_BASE_DELAY = float(os.getenv("CHROMA_RETRY_BASE_DELAY", "1.0"))
+CHROMA_RETRY_MAX_DELAY = 30.0
+CHROMA_RETRY_JITTER = float(os.getenv("CHROMA_RETRY_JITTER", "0.5"))
+
+# Timeout do health check: uma única tentativa curta, para não atrasar a inicialização nem as sondas
+CHROMA_HEALTH_TIMEOUT = float(os.getenv("CHROMA_HEALTH_TIMEOUT", "5"))
+
+def _is_transient_error(error: BaseException) -> bool:
+    """Falhas que valem nova tentativa; erros 4xx (exceto 429) são definitivos"""
+    if isinstance(error, (requests.exceptions.Timeout, requests.exceptions.ConnectionError)):
+        return True
+    if isinstance(error, requests.exceptions.HTTPError) and error.response is not None:
+        return error.response.status_code == 429 or error.response.status_code >= 500
+    return False
+
+def _is_transient_add_error(error: BaseException) -> bool:
+    """
+    Falhas do /add que valem nova tentativa: timeout de leitura não entra, pois o lote pode ter sido
+    inserido mesmo assim (e repetir seriam mais 120s de embeddings no serviço). Timeout de conexão entra:
+    a requisição nem chegou ao serviço
+    """
+    if isinstance(error, requests.exceptions.Timeout) and not isinstance(error, requests.exceptions.ConnectTimeout):
+        return False
+    return _is_transient_error(error)
+
+def _log_retry(retry_state):
+    logger.warning(
+        f"Falha transitória no ChromaDB ({retry_state.outcome.exception()}); "
+        f"tentativa {retry_state.attempt_number} de {retry_state.retry_object.stop.max_attempt_number}, "
+        f"nova tentativa em {retry_state.next_action.sleep:.1f}s"
+    )
+
+def dedupe_similar_docs(docs: List[dict]) -> List[dict]:
+    """
+    Remove resultados repetidos de uma busca (mesmo chunk do mesmo PDF, ou o mesmo texto em chunks
+    diferentes), mantendo a ordem de relevância, para não repetir trechos no contexto do LLM
+    """
+    seen_chunks = set()
+    seen_texts = set()
+    deduped = []
+    for doc in docs:
+        metadata = doc.get("metadata") or {}
+        chunk_key = (metadata.get("pdf_name"), metadata.get("chunk_index"))
+        text_key = " ".join(doc.get("text", "").split())
+        if (chunk_key[1] is not None and chunk_key in seen_chunks) or text_key in seen_texts:
+            continue
+        seen_chunks.add(chunk_key)
+        seen_texts.add(text_key)
+        deduped.append(doc)
+    return deduped
+
 class ChromaDBClient:
     """Cliente para integração com o serviço ChromaDB via FastAPI"""
     
-    def __init__(self, base_url: str = None):
+    def __init__(self, base_url: str = None, max_retries: int = CHROMA_MAX_RETRIES,
+                 base_delay: float = CHROMA_RETRY_BASE_DELAY, jitter: float = CHROMA_RETRY_JITTER):
         """
         Inicializa o cliente ChromaDB
         
         Args:
             base_url: URL base do serviço ChromaDB (ex: http://chromadb-service:8001)
+            max_retries: Número máximo de tentativas por requisição (1 desativa as novas tentativas)
+            base_delay: Espera inicial (s) antes da segunda tentativa, dobrada a cada falha
+            jitter: Variação aleatória máxima (s) somada a cada espera
         """
         self.base_url = base_url or os.getenv("CHROMADB_SERVICE_URL", "http://chromadb-service:8001")
+        self.max_retries = max(1, max_retries)
+        self.base_delay = base_delay
+        self.jitter = jitter
         self.session = requests.Session()
+        adapter = requests.adapters.HTTPAdapter(pool_connections=1, pool_maxsize=CHROMA_POOL_MAXSIZE)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
         self.session.headers.update({
             'Content-Type': 'application/json',
             'Accept': 'application/json'
@@ -29,50 +105,60 @@ class ChromaDBClient:
         """Faz uma requisição para o serviço ChromaDB"""
         try:
             url = urljoin(self.base_url, endpoint)
-            print(f"DEBUG ChromaDB: Fazendo requisição {method} para {url}")
+            logger.debug("Fazendo requisição %s para %s", method, url)
             
             # Timeout maior para operações de inserção que podem demorar
-            timeout = 120 if method == "POST" and "add" in endpoint else 30
-            print(f"DEBUG ChromaDB: Timeout definido: {timeout}s")
-            
-            if data and len(str(data)) > 1000:
-                print(f"DEBUG ChromaDB: Payload grande: {len(str(data))} chars")
-            
-            response = self.session.request(
-                method=method,
-                url=url,
-                json=data,
-                params=params,
-                timeout=timeout
+            is_add = method == "POST" and "add" in endpoint
+            timeout = 120 if is_add else 30
+            logger.debug("Timeout definido: %ss", timeout)
+            
+            retrying = Retrying(
+                stop=stop_after_attempt(self.max_retries),
+                wait=wait_exponential_jitter(initial=self.base_delay, max=CHROMA_RETRY_MAX_DELAY, jitter=self.jitter),
+                retry=retry_if_exception(_is_transient_add_error if is_add else _is_transient_error),
+                before_sleep=_log_retry,
+                reraise=True
             )
+            # Corpo serializado uma vez (orjson, bytes), reaproveitado nas novas tentativas
+            body = orjson.dumps(data) if data is not None else None
+            response = retrying(self._send, method, url, body, params, timeout)
             
-            print(f"DEBUG ChromaDB: Resposta recebida: status {response.status_code}")
-            response.raise_for_status()
-            result = response.json()
-            print(f"DEBUG ChromaDB: JSON parsado com sucesso")
+            logger.debug("Resposta recebida: status %s", response.status_code)
+            result = orjson.loads(response.content)
+            logger.debug("JSON parsado com sucesso")
             return result
             
         except requests.exceptions.Timeout as e:
             error_msg = f"Timeout na requisição para ChromaDB: {e}"
-            print(f"DEBUG ChromaDB: {error_msg}")
             logger.error(error_msg)
             raise Exception(error_msg)
         except requests.exceptions.RequestException as e:
             error_msg = f"Erro na requisição para ChromaDB: {e}"
-            print(f"DEBUG ChromaDB: {error_msg}")
             logger.error(error_msg)
             raise Exception(error_msg)
         except Exception as e:
             error_msg = f"Erro inesperado na comunicação com ChromaDB: {e}"
-            print(f"DEBUG ChromaDB: {error_msg}")
             logger.error(error_msg)
             raise Exception(error_msg)
     
+    def _send(self, method: str, url: str, body: Optional[bytes], params: Optional[dict],
+              timeout: float) -> requests.Response:
+        """Uma tentativa da requisição (erros HTTP viram exceção, para a política de novas tentativas)"""
+        response = self.session.request(
+            method=method,
+            url=url,
+            data=body,
+            params=params,
+            timeout=timeout
+        )
+        response.raise_for_status()
+        return response
+    
     def health_check(self) -> bool:
-        """Verifica se o serviço ChromaDB está funcionando"""
+        """Verifica se o serviço ChromaDB está funcionando (uma tentativa, sem a política de novas tentativas)"""
         try:
-            response = self._make_request("GET", "/health")
-            return response.get("status") == "healthy"
+            response = self._send("GET", urljoin(self.base_url, "/health"), None, None, CHROMA_HEALTH_TIMEOUT)
+            return orjson.loads(response.content).get("status") == "healthy"
         except Exception as e:
             logger.error(f"ChromaDB health check falhou: {e}")
             return False
@@ -83,21 +169,27 @@ class ChromaDBClient:
         Adiciona documentos a uma coleção - DEPRECATED
         Use add_document_chunks em vez disso
         """
-        print(f"DEBUG ChromaDB: add_documents DEPRECATED - use add_document_chunks")
+        logger.debug("add_documents DEPRECATED - use add_document_chunks")
         raise Exception("Método add_documents não suportado pela API atual. Use add_document_chunks.")
     
     def add_document_chunks(self, collection_name: str, pdf_name: str, chunks: List[str], 
-                           metadata: dict = None) -> dict:
+                           metadata: dict = None,
+                           progress_callback: Optional[Callable[[int, int], None]] = None,
+                           batch_size: int = CHROMA_BATCH_SIZE,
+                           max_parallel: int = CHROMA_ADD_PARALLELISM) -> dict:
         """
-        Adiciona chunks de texto de um PDF como documentos
+        Adiciona chunks de texto de um PDF como documentos, em lotes de batch_size
         
         Args:
             collection_name: Nome da coleção
             pdf_name: Nome do PDF
             chunks: Lista de chunks de texto
             metadata: Metadados adicionais
+            progress_callback: Chamado com (chunks enviados, total) após cada lote
+            batch_size: Chunks por requisição
+            max_parallel: Lotes enviados ao mesmo tempo (cada um com suas próprias novas tentativas)
         """
-        print(f"DEBUG ChromaDB: add_document_chunks - {len(chunks)} chunks para {pdf_name}")
+        logger.debug("add_document_chunks - %s chunks para %s", len(chunks), pdf_name)
         
         documents = []
         for i, chunk in enumerate(chunks):
@@ -115,10 +207,38 @@ class ChromaDBClient:
                 "chunk_id": f"{pdf_name}_chunk_{i}"
             })
         
-        print(f"DEBUG ChromaDB: Documentos preparados, chamando endpoint /collections/{collection_name}/add")
+        logger.debug("Documentos preparados, chamando endpoint /collections/%s/add", collection_name)
         
-        # Usar o endpoint correto da API ChromaDB
-        return self._make_request("POST", f"/collections/{collection_name}/add", documents)
+        # Enviar em lotes: cada requisição gera os embeddings e faz um único add no ChromaDB
+        endpoint = f"/collections/{collection_name}/add"
+        total = len(documents)
+        batches = [documents[start:start + batch_size] for start in range(0, total, batch_size)]
+        batch_ids: List[List[str]] = [[] for _ in batches]
+        sent = 0
+        with ThreadPoolExecutor(max_workers=max(1, min(max_parallel, len(batches) or 1))) as executor:
+            futures = {
+                executor.submit(self._make_request, "POST", endpoint, batch): i
+                for i, batch in enumerate(batches)
+            }
+            try:
+                for future in as_completed(futures):
+                    i = futures[future]
+                    batch_ids[i] = future.result().get("document_ids", [])
+                    sent += len(batches[i])
+                    if progress_callback:
+                        progress_callback(sent, total)
+            except Exception:
+                # Um lote falhou (após as novas tentativas): não envia os que ainda não começaram
+                for future in futures:
+                    future.cancel()
+                raise
+        document_ids = [doc_id for ids in batch_ids for doc_id in ids]
+        
+        return {
+            "message": f"Adicionados {len(document_ids)} documentos",
+            "collection": collection_name,
+            "document_ids": document_ids
+        }
     
     def query_documents(self, collection_name: str, query_text: str, 
                        n_results: int = 5, filter_metadata: dict = None) -> dict:
@@ -141,10 +261,53 @@ class ChromaDBClient:
         if filter_metadata:
             data["where"] = filter_metadata
         
-        print(f"DEBUG ChromaDB: Query payload: {data}")
+        logger.debug("Query: %d chars, n_results=%d, filtro=%s", len(query_text), n_results, filter_metadata)
         
         return self._make_request("POST", f"/collections/{collection_name}/query", data)
     
+    def query_documents_batch(self, collection_name: str, queries: List[dict]) -> dict:
+        """
+        Faz várias queries semânticas em uma única requisição
+        
+        Args:
+            collection_name: Nome da coleção
+            queries: Lista de dicts com "query", "n_results" e opcionalmente "where"
+        """
+        data = {"queries": [dict(q, collection_name=collection_name) for q in queries]}
+        return self._make_request("POST", f"/collections/{collection_name}/query_batch", data)
+    
+    def embed_queries(self, texts: List[str]) -> List[List[float]]:
+        """
+        Gera (ou reaproveita do cache do serviço) os embeddings de queries
+        
+        Args:
+            texts: Textos das queries
+        """
+        return self._make_request("POST", "/embed", {"texts": texts})["embeddings"]
+    
+    def get_documents(self, collection_name: str, where: dict = None, limit: int = None,
+                      include: tuple = ("metadatas",)) -> dict:
+        """
+        Lista documentos por filtro de metadados, sem busca por similaridade
+        
+        Args:
+            collection_name: Nome da coleção
+            where: Filtro de metadados (opcional)
+            limit: Número máximo de documentos (opcional, todos por padrão)
+            include: Campos retornados além dos ids ("documents" e/ou "metadatas")
+        """
+        data = {"where": where, "limit": limit, "include": list(include)}
+        return self._make_request("POST", f"/collections/{collection_name}/get", data)
+    
+    def count_documents(self, collection_name: str) -> int:
+        """
+        Número de documentos armazenados numa coleção
+        
+        Args:
+            collection_name: Nome da coleção
+        """
+        return self._make_request("GET", f"/collections/{collection_name}")["count"]
+    
     def query_by_pdf(self, collection_name: str, query_text: str, pdf_name: str, 
                      n_results: int = 5) -> dict:
         """
@@ -174,19 +337,19 @@ class ChromaDBService:
     def initialize_default_collection(self) -> bool:
         """Inicializa a coleção padrão se não existir"""
         try:
-            print(f"DEBUG ChromaDB: Assumindo que coleção '{self.default_collection}' será criada automaticamente")
+            logger.debug("Assumindo que coleção '%s' será criada automaticamente", self.default_collection)
             # O serviço ChromaDB cria a coleção automaticamente no primeiro add
             # Não precisamos verificar se existe
             logger.info(f"Coleção '{self.default_collection}' será gerenciada automaticamente pelo serviço")
             return True
                 
         except Exception as e:
-            print(f"DEBUG ChromaDB: Erro ao inicializar coleção: {e}")
             logger.error(f"Erro ao inicializar coleção padrão: {e}")
             return False
     
     def store_pdf_embeddings(self, pdf_name: str, text_chunks: List[str], 
-                           user_id: str = None, pdf_metadata: dict = None) -> bool:
+                           user_id: str = None, pdf_metadata: dict = None,
+                           progress_callback: Optional[Callable[[int, int], None]] = None) -> bool:
         """
         Armazena embeddings de um PDF
         
@@ -195,60 +358,61 @@ class ChromaDBService:
             text_chunks: Lista de chunks de texto
             user_id: ID do usuário (salvo nos metadados para controle de acesso)
             pdf_metadata: Metadados adicionais do PDF
+            progress_callback: Chamado com (chunks indexados, total) a cada lote
         """
         try:
             if user_id:
-                print(f"DEBUG ChromaDB: Iniciando store_pdf_embeddings para {pdf_name} com user_id: {user_id}")
+                logger.debug("Iniciando store_pdf_embeddings para %s com user_id: %s", pdf_name, user_id)
             else:
-                print(f"DEBUG ChromaDB: Iniciando store_pdf_embeddings para {pdf_name} SEM user_id")
-            print(f"DEBUG ChromaDB: {len(text_chunks)} chunks a processar")
+                logger.debug("Iniciando store_pdf_embeddings para %s SEM user_id", pdf_name)
+            logger.debug("%s chunks a processar", len(text_chunks))
             
             # Garantir que a coleção existe
-            print(f"DEBUG ChromaDB: Inicializando coleção padrão")
+            logger.debug("Inicializando coleção padrão")
             if not self.initialize_default_collection():
-                print(f"DEBUG ChromaDB: ERRO - Falha ao inicializar coleção")
+                logger.error("Falha ao inicializar coleção")
                 return False
-            print(f"DEBUG ChromaDB: Coleção inicializada com sucesso")
+            logger.debug("Coleção inicializada com sucesso")
             
             # Preparar metadados incluindo user_id
-            print(f"DEBUG ChromaDB: Preparando metadados com user_id: {user_id}")
+            logger.debug("Preparando metadados com user_id: %s", user_id)
             base_metadata = {
                 "pdf_name": pdf_name,
                 "total_chunks": len(text_chunks),
-                "indexed_at": datetime.utcnow().isoformat()
+                "indexed_at": datetime.now(timezone.utc).isoformat()
             }
             
             # Adicionar user_id aos metadados se fornecido
             if user_id:
                 base_metadata["user_id"] = user_id
-                print(f"DEBUG ChromaDB: user_id {user_id} adicionado aos metadados")
+                logger.debug("user_id %s adicionado aos metadados", user_id)
             #     base_metadata["user_id"] = user_id
             
             if pdf_metadata:
                 base_metadata.update(pdf_metadata)
             
-            print(f"DEBUG ChromaDB: Metadados preparados: {base_metadata}")
+            logger.debug("Metadados preparados: %s", base_metadata)
             
             # Adicionar chunks como documentos
-            print(f"DEBUG ChromaDB: Chamando add_document_chunks")
+            logger.debug("Chamando add_document_chunks")
             try:
                 result = self.client.add_document_chunks(
                     collection_name=self.default_collection,
                     pdf_name=pdf_name,
                     chunks=text_chunks,
-                    metadata=base_metadata
+                    metadata=base_metadata,
+                    progress_callback=progress_callback
                 )
-                print(f"DEBUG ChromaDB: add_document_chunks concluído: {result}")
+                logger.debug("add_document_chunks concluído: %d documentos", len(result.get("document_ids", [])))
             except Exception as add_error:
-                print(f"DEBUG ChromaDB: Erro em add_document_chunks: {add_error}")
+                logger.debug("Erro em add_document_chunks: %s", add_error)
                 raise add_error
             
-            print(f"DEBUG ChromaDB: Sucesso - {len(text_chunks)} chunks indexados")
+            logger.debug("Sucesso - %s chunks indexados", len(text_chunks))
             logger.info(f"Embeddings do PDF '{pdf_name}' armazenados com sucesso. {len(text_chunks)} chunks indexados.")
             return True
             
         except Exception as e:
-            print(f"DEBUG ChromaDB: Erro geral em store_pdf_embeddings: {e}")
             logger.error(f"Erro ao armazenar embeddings do PDF '{pdf_name}': {e}")
             return False
     
@@ -268,108 +432,105 @@ class ChromaDBService:
         """
         try:
             if user_id:
-                print(f"DEBUG ChromaDB: Buscando conteúdo similar para USER: '{user_id}' - query: '{query}', pdf_name: '{pdf_name}'")
+                logger.debug("Buscando conteúdo similar para USER: '%s' - query: '%s', pdf_name: '%s'", user_id, query, pdf_name)
             else:
-                print(f"DEBUG ChromaDB: Buscando conteúdo similar GLOBALMENTE - query: '{query}', pdf_name: '{pdf_name}'")
+                logger.debug("Buscando conteúdo similar GLOBALMENTE - query: '%s', pdf_name: '%s'", query, pdf_name)
             
             # Preparar filtros
-            filter_metadata = {}
-            if pdf_name:
-                filter_metadata["pdf_name"] = pdf_name
-            if user_id:
-                filter_metadata["user_id"] = user_id
+            filter_metadata = self._build_where(pdf_name, user_id)
             
-            print(f"DEBUG ChromaDB: Filtros aplicados: {filter_metadata}")
+            logger.debug("Filtros aplicados: %s", filter_metadata)
             
             # Fazer a query usando a API correta
             result = self.client.query_documents(
                 collection_name=self.default_collection,
                 query_text=query,
                 n_results=max_results,
-                filter_metadata=filter_metadata if filter_metadata else None
+                filter_metadata=filter_metadata
             )
             
-            print(f"DEBUG ChromaDB: Resultado da query: {result}")
-            
             # Processar resultados - ajustar para o formato da API ChromaDB
-            documents = []
-            if "documents" in result and result["documents"]:
-                print(f"DEBUG ChromaDB: Processando {len(result['documents'])} documentos")
-                for i, doc in enumerate(result["documents"]):
-                    processed_doc = {
-                        "text": doc,
-                        "metadata": result.get("metadatas", [{}])[i] if "metadatas" in result else {},
-                        "score": result.get("distances", [0])[i] if "distances" in result else 0,
-                        "id": result.get("ids", [""])[i] if "ids" in result else ""
-                    }
-                    documents.append(processed_doc)
-                    print(f"DEBUG ChromaDB: Documento {i}: {len(doc)} chars, score: {processed_doc['score']}")
-            else:
-                print(f"DEBUG ChromaDB: Nenhum documento retornado na resposta: {result}")
+            documents = self._to_documents(result)
             
             logger.info(f"Busca realizada: encontrados {len(documents)} documentos similares")
             return documents
             
         except Exception as e:
-            print(f"DEBUG ChromaDB: Erro na busca semântica: {e}")
             logger.error(f"Erro na busca semântica: {e}")
             return []
     
-    def search_similar_content_global(self, query: str, pdf_name: str = None, max_results: int = 5) -> List[dict]:
+    @staticmethod
+    def _build_where(pdf_name: str = None, user_id: str = None) -> Optional[dict]:
+        """
+        Monta o filtro de metadados aplicado pelo ChromaDB na própria busca
+        
+        Com mais de uma condição usa $and explícito (o ChromaDB aceita um único operador por nível)
+        """
+        conditions = []
+        if pdf_name:
+            conditions.append({"pdf_name": pdf_name})
+        if user_id:
+            conditions.append({"user_id": user_id})
+        
+        if not conditions:
+            return None
+        if len(conditions) == 1:
+            return conditions[0]
+        return {"$and": conditions}
+    
+    @staticmethod
+    def _to_documents(result: dict) -> List[dict]:
         """
-        Busca conteúdo similar baseado em uma query - ACESSO GLOBAL (todos os usuários)
+        Converte a resposta de uma query do serviço para a lista de documentos com scores
+        
+        Metadados, distâncias e ids ausentes (ou mais curtos que a lista de documentos) recebem valores
+        padrão, para nenhum documento ser descartado pelo zip
+        """
+        documents = result.get("documents") or []
+        n = len(documents)
+        metadatas = (result.get("metadatas") or [])[:n]
+        distances = (result.get("distances") or [])[:n]
+        ids = (result.get("ids") or [])[:n]
+        metadatas += [{} for _ in range(n - len(metadatas))]
+        distances += [0] * (n - len(distances))
+        ids += [""] * (n - len(ids))
+        return [
+            {"text": doc, "metadata": metadata or {}, "score": score, "id": doc_id}
+            for doc, metadata, score, doc_id in zip(documents, metadatas, distances, ids, strict=True)
+        ]
+    
+    def search_similar_batch(self, queries: List[str], pdf_names: List[Optional[str]],
+                             user_ids: List[Optional[str]], max_results: List[int]) -> List[List[dict]]:
+        """
+        Versão em lote de search_similar_content: uma requisição para várias queries
         
         Args:
-            query: Texto da query
-            pdf_name: Filtrar por PDF específico (opcional)
-            max_results: Número máximo de resultados
+            queries: Textos das queries
+            pdf_names: Filtro de PDF de cada query (ou None)
+            user_ids: Filtro de usuário de cada query (ou None)
+            max_results: Número máximo de resultados de cada query
         
         Returns:
-            Lista de documentos similares com scores
+            Uma lista de documentos similares por query, na mesma ordem
         """
         try:
-            print(f"DEBUG ChromaDB: Buscando conteúdo similar GLOBALMENTE - query: '{query}', pdf_name: '{pdf_name}'")
+            payload = []
+            for query, pdf_name, user_id, n_results in zip(queries, pdf_names, user_ids, max_results):
+                payload.append({
+                    "query": query,
+                    "n_results": n_results,
+                    "where": self._build_where(pdf_name, user_id)
+                })
             
-            # Preparar filtros - SEM user_id para busca global
-            filter_metadata = {}
-            if pdf_name:
-                filter_metadata["pdf_name"] = pdf_name
+            result = self.client.query_documents_batch(self.default_collection, payload)
+            batch_documents = [self._to_documents(r) for r in result.get("results", [])]
             
-            print(f"DEBUG ChromaDB: Filtros aplicados (SEM user_id): {filter_metadata}")
-            
-            # Fazer a query usando a API correta
-            result = self.client.query_documents(
-                collection_name=self.default_collection,
-                query_text=query,
-                n_results=max_results,
-                filter_metadata=filter_metadata if filter_metadata else None
-            )
-            
-            print(f"DEBUG ChromaDB: Resultado da query: {result}")
-            
-            # Processar resultados
-            documents = []
-            if "documents" in result and result["documents"]:
-                print(f"DEBUG ChromaDB: Processando {len(result['documents'])} documentos")
-                for i, doc in enumerate(result["documents"]):
-                    processed_doc = {
-                        "text": doc,
-                        "metadata": result.get("metadatas", [{}])[i] if "metadatas" in result else {},
-                        "score": result.get("distances", [0])[i] if "distances" in result else 0,
-                        "id": result.get("ids", [""])[i] if "ids" in result else ""
-                    }
-                    documents.append(processed_doc)
-                    print(f"DEBUG ChromaDB: Documento {i}: {len(doc)} chars, score: {processed_doc['score']}")
-            else:
-                print(f"DEBUG ChromaDB: Nenhum documento retornado na resposta: {result}")
-            
-            logger.info(f"Busca global realizada: encontrados {len(documents)} documentos similares")
-            return documents
+            logger.info(f"Busca em lote realizada: {len(batch_documents)} queries")
+            return batch_documents
             
         except Exception as e:
-            print(f"DEBUG ChromaDB: Erro na busca semântica global: {e}")
-            logger.error(f"Erro na busca semântica global: {e}")
-            return []
+            logger.error(f"Erro na busca semântica em lote: {e}")
+            return [[] for _ in queries]
     
     def delete_pdf_embeddings(self, pdf_name: str, user_id: str = None) -> bool:
         """
@@ -380,7 +541,7 @@ class ChromaDBService:
             user_id: ID do usuário (para validação)
         """
         try:
-            print(f"DEBUG ChromaDB: Tentando deletar embeddings do PDF '{pdf_name}'")
+            logger.debug("Tentando deletar embeddings do PDF '%s'", pdf_name)
             # Por enquanto, vamos apenas log que a função foi chamada
             # Implementação completa dependeria de endpoint de delete específico
             logger.info(f"Solicitação de remoção de embeddings do PDF '{pdf_name}' (funcionalidade limitada)")
@@ -402,25 +563,28 @@ class ChromaDBService:
             # Filtrar apenas por PDF, sem user_id para acesso global
             filter_metadata = {"pdf_name": pdf_name}
             
-            print(f"DEBUG ChromaDB: Buscando chunks do PDF '{pdf_name}' GLOBALMENTE (user_id ignorado)")
+            logger.debug("Buscando chunks do PDF '%s' GLOBALMENTE (user_id ignorado)", pdf_name)
             
-            # Usar uma query genérica para obter todos os chunks do PDF
-            result = self.client.query_documents(
+            # Leitura só por metadados (sem busca por similaridade)
+            result = self.client.get_documents(
                 collection_name=self.default_collection,
-                query_text="documento",  # Query genérica para buscar documentos
-                n_results=1000,  # Limite alto para pegar todos os chunks
-                filter_metadata=filter_metadata
+                where=filter_metadata,
+                include=("documents", "metadatas")
             )
             
-            # Reformatar os resultados
-            documents = []
-            if "documents" in result and result["documents"]:
-                for i, doc in enumerate(result["documents"]):
-                    documents.append({
-                        "text": doc,
-                        "metadata": result.get("metadatas", [{}])[i] if "metadatas" in result else {},
-                        "id": result.get("ids", [""])[i] if "ids" in result else ""
-                    })
+            # Reformatar os resultados, na ordem dos chunks no PDF. Textos e metadados ausentes (ou
+            # listas mais curtas que a de ids) recebem valores padrão, como em _to_documents
+            ids = result.get("ids") or []
+            n = len(ids)
+            texts = (result.get("documents") or [])[:n]
+            metadatas = (result.get("metadatas") or [])[:n]
+            texts += [""] * (n - len(texts))
+            metadatas += [{} for _ in range(n - len(metadatas))]
+            documents = [
+                {"text": doc or "", "metadata": metadata or {}, "id": doc_id}
+                for doc_id, doc, metadata in zip(ids, texts, metadatas, strict=True)
+            ]
+            documents.sort(key=lambda d: d["metadata"].get("chunk_index", 0))
             
             return documents
             
@@ -428,6 +592,29 @@ class ChromaDBService:
             logger.error(f"Erro ao obter chunks do PDF '{pdf_name}': {e}")
             return []
     
+    def sample_collection(self, sample_size: int = 3) -> dict:
+        """
+        Amostra da coleção padrão: total de documentos armazenados e os primeiros resultados de uma
+        query genérica ("shown" é quantos deles são exibidos, no máximo sample_size)
+        
+        Args:
+            sample_size: Número de documentos exibidos
+        """
+        result = self.client.query_documents(
+            collection_name=self.default_collection,
+            query_text="documento",  # Query genérica
+            n_results=sample_size
+        )
+        documents = result.get("documents") or []
+        return {
+            "total_found": self.client.count_documents(self.default_collection),
+            "shown": len(documents),
+            "documents": documents,
+            "metadatas": result.get("metadatas") or [],
+            "distances": result.get("distances") or [],
+            "ids": result.get("ids") or []
+        }
+    
     def get_collection_info(self) -> dict:
         """Obtém informações sobre a coleção padrão"""
         try:
@@ -450,19 +637,17 @@ class ChromaDBService:
             user_id: IGNORADO - lista todos os PDFs globalmente
         """
         try:
-            print(f"DEBUG ChromaDB: Listando PDFs indexados GLOBALMENTE (user_id ignorado)")
+            logger.debug("Listando PDFs indexados GLOBALMENTE (user_id ignorado)")
             
-            # Fazer uma query genérica para obter documentos de TODOS os usuários
-            result = self.client.query_documents(
+            # Metadados de TODOS os documentos (sem filtros, sem busca por similaridade)
+            result = self.client.get_documents(
                 collection_name=self.default_collection,
-                query_text="documento",  # Query genérica
-                n_results=1000,
-                filter_metadata=None  # SEM filtros para busca global
+                include=("metadatas",)
             )
             
             # Extrair nomes únicos de PDFs
             pdf_names = set()
-            if "metadatas" in result and result["metadatas"]:
+            if result.get("metadatas"):
                 for metadata in result["metadatas"]:
                     if metadata and "pdf_name" in metadata:
                         pdf_names.add(metadata["pdf_name"])
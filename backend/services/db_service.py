@@ -7,10 +7,10 @@ logger = logging.getLogger(__name__)
 
 
 class DBService:
-    def __init__(self):
-        """Inicializa o serviço de banco de dados com DynamoDB e ChromaDB"""
-        self.dynamodb = DynamoDBService()
-        self.chromadb = ChromaDBService()
+    def __init__(self, dynamodb: Optional[DynamoDBService] = None, chromadb: Optional[ChromaDBService] = None):
+        """Inicializa o serviço de banco de dados com DynamoDB e ChromaDB (instâncias compartilhadas, se fornecidas)"""
+        self.dynamodb = dynamodb or DynamoDBService()
+        self.chromadb = chromadb or ChromaDBService()
 
     def recent_chats(self, user_id: str = None, limit: int = 10) -> List[Dict[str, Any]]:
         """
@@ -7,20 +7,65 @@ from typing import Dict, List, Optional, Any
 import uuid
 from datetime import datetime
 import logging
+from botocore.config import Config
 from botocore.exceptions import ClientError
 import os
+import queue
+import threading
+import time
+from cachetools import TTLCache
 
 logger = logging.getLogger(__name__)
 
+# Pool de conexões HTTP do cliente (compartilhado entre as threads do servidor)
+DYNAMODB_MAX_POOL_CONNECTIONS = int(os.getenv('DYNAMODB_MAX_POOL_CONNECTIONS', '50'))
+
+# Cache curto de leituras de histórico (invalidado quando o usuário grava um novo chat)
+READ_CACHE_TTL = float(os.getenv('DYNAMODB_READ_CACHE_TTL', '2.0'))
+READ_CACHE_SIZE = int(os.getenv('DYNAMODB_READ_CACHE_SIZE', '1024'))
+
+# Gravação de chats em segundo plano: até CHAT_WRITE_BATCH_SIZE itens (limite do BatchWriteItem) por
+# envio, aguardando no máximo CHAT_WRITE_FLUSH_MS pelos itens seguintes do lote
+CHAT_WRITE_BATCH_SIZE = 25
+CHAT_WRITE_FLUSH_MS = float(os.getenv('DYNAMODB_CHAT_WRITE_FLUSH_MS', '50'))
+# Tentativas por lote com falha (espera dobrada a cada uma). O put_item por chat_id é idempotente, então
+# reenviar um lote parcialmente gravado não duplica itens
+CHAT_WRITE_MAX_ATTEMPTS = int(os.getenv('DYNAMODB_CHAT_WRITE_MAX_ATTEMPTS', '3'))
+CHAT_WRITE_RETRY_DELAY = float(os.getenv('DYNAMODB_CHAT_WRITE_RETRY_DELAY', '0.5'))
+
 class DynamoDBService:
     """Serviço simplificado para DynamoDB"""
     
     def __init__(self):
         """Inicializa o serviço DynamoDB com tratamento robusto de erros"""
+        # Fila de chats a gravar e a thread (criada sob demanda) que os envia em lotes
+        self._chat_write_queue: "queue.Queue[Optional[Dict[str, Any]]]" = queue.Queue()
+        self._chat_writer: Optional[threading.Thread] = None
+        self._chat_writer_lock = threading.Lock()
+        # Chats descartados depois de esgotar as tentativas de gravação
+        self.failed_chat_writes = 0
+        
         try:
             # Configurar cliente DynamoDB
             self.region = os.getenv('AWS_REGION', 'ca-central-1')
-            self.dynamodb = boto3.resource('dynamodb', region_name=self.region)
+            self.dynamodb = boto3.resource(
+                'dynamodb',
+                region_name=self.region,
+                config=Config(
+                    max_pool_connections=DYNAMODB_MAX_POOL_CONNECTIONS,
+                    tcp_keepalive=True,
+                    connect_timeout=5,
+                    retries={'mode': 'adaptive'}
+                )
+            )
+            
+            # Handles de tabela e índices verificados (reaproveitados entre requisições)
+            self._table_handles = {}
+            self._gsi_exists = {}
+            
+            # Cache de leituras: (user_id, limit) -> itens
+            self._recent_chats_cache = TTLCache(maxsize=READ_CACHE_SIZE, ttl=READ_CACHE_TTL)
+            self._read_cache_lock = threading.Lock()
             
             # Nomes das tabelas
             self.tables = {
@@ -139,6 +184,31 @@ class DynamoDBService:
             logger.error(f"Erro ao criar tabela '{table_name}': {e}")
             raise e
     
+    def _table(self, table_key: str):
+        """Retorna o handle (em cache) de uma tabela pelo nome lógico"""
+        table = self._table_handles.get(table_key)
+        if table is None:
+            table = self.dynamodb.Table(self.tables[table_key])
+            self._table_handles[table_key] = table
+        return table
+    
+    def _has_gsi(self, table_key: str, index_name: str) -> bool:
+        """Verifica se o GSI existe, consultando describe_table apenas na primeira vez"""
+        cache_key = (table_key, index_name)
+        if cache_key not in self._gsi_exists:
+            table_description = self._table(table_key).meta.client.describe_table(TableName=self.tables[table_key])
+            self._gsi_exists[cache_key] = any(
+                gsi.get('IndexName') == index_name
+                for gsi in table_description.get('Table', {}).get('GlobalSecondaryIndexes', [])
+            )
+        return self._gsi_exists[cache_key]
+    
+    def _invalidate_user_reads(self, user_id: str):
+        """Descarta as leituras em cache de um usuário após uma escrita"""
+        with self._read_cache_lock:
+            for key in [k for k in self._recent_chats_cache.keys() if k[0] == user_id]:
+                self._recent_chats_cache.pop(key, None)
+    
     def is_available(self) -> bool:
         """Verifica se DynamoDB está disponível"""
         is_avail = self.available and self.dynamodb is not None
@@ -147,9 +217,18 @@ class DynamoDBService:
     
     def create_user(self, user_data: Dict[str, Any]) -> str:
         """Cria um novo usuário ou atualiza existente baseado no email"""
+        return self.upsert_user(user_data)['user_id']
+    
+    def upsert_user(self, user_data: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        Cria um novo usuário ou atualiza existente baseado no email
+        
+        Returns:
+            O item gravado (dispensa um get_item para ler o usuário de volta)
+        """
         if not self.is_available():
             logger.warning("DynamoDB não disponível - simulando criação de usuário")
-            return str(uuid.uuid4())
+            return {'user_id': str(uuid.uuid4())}
         
         try:
             email = user_data.get('email', '')
@@ -191,15 +270,15 @@ class DynamoDBService:
                 
                 logger.info(f"Criando novo usuário: {user_id}")
             
-            table = self.dynamodb.Table(self.tables['users'])
+            table = self._table('users')
             table.put_item(Item=item)
             
-            return user_id
+            return item
             
         except Exception as e:
             logger.error(f"Erro ao criar/atualizar usuário: {e}")
             # Retornar ID mesmo com erro para não quebrar a aplicação
-            return str(uuid.uuid4())
+            return {'user_id': str(uuid.uuid4())}
     
     def get_user_by_email(self, email: str) -> Optional[Dict]:
         """Busca usuário por email (scan - não otimizado, mas funciona)"""
@@ -207,7 +286,7 @@ class DynamoDBService:
             return None
         
         try:
-            table = self.dynamodb.Table(self.tables['users'])
+            table = self._table('users')
             response = table.scan(
                 FilterExpression='email = :email',
                 ExpressionAttributeValues={':email': email}
@@ -226,7 +305,7 @@ class DynamoDBService:
             return None
         
         try:
-            table = self.dynamodb.Table(self.tables['users'])
+            table = self._table('users')
             response = table.get_item(Key={'user_id': user_id})
             return response.get('Item')
         except Exception as e:
@@ -254,7 +333,7 @@ class DynamoDBService:
                 'metadata': metadata or {}
             }
             
-            table = self.dynamodb.Table(self.tables['chat_history'])
+            table = self._table('chat_history')
             
             logger.info(f"  Salvando chat no DynamoDB:")
             logger.info(f"   - chat_id: {chat_id}")
@@ -266,6 +345,7 @@ class DynamoDBService:
             logger.info(f"   - table: {self.tables['chat_history']}")
             
             table.put_item(Item=item)
+            self._invalidate_user_reads(user_id)
             
             logger.info(f"Chat salvo com sucesso no DynamoDB: chat_id={chat_id}")
             return chat_id
@@ -277,13 +357,115 @@ class DynamoDBService:
             logger.error(f"   - question: {question[:100]}...")
             return str(uuid.uuid4())
     
+    def enqueue_chat_interaction(self, user_id: str, pdf_name: str, question: str,
+                                 answer: str, metadata: Dict = None) -> str:
+        """
+        Agenda a gravação da interação de chat (enviada em lote por uma thread em segundo plano)
+        
+        Returns:
+            chat_id gerado para a interação (já definitivo, antes mesmo da gravação)
+        """
+        chat_id = str(uuid.uuid4())
+        if not self.is_available():
+            logger.warning("DynamoDB não disponível - simulando salvamento de chat")
+            return chat_id
+        
+        self._chat_write_queue.put({
+            'chat_id': chat_id,
+            'user_id': user_id,
+            'pdf_name': pdf_name,
+            'question': question,
+            'answer': answer,
+            'timestamp': datetime.now().isoformat(),
+            'metadata': metadata or {}
+        })
+        self._ensure_chat_writer()
+        return chat_id
+    
+    def _ensure_chat_writer(self):
+        with self._chat_writer_lock:
+            if self._chat_writer is None or not self._chat_writer.is_alive():
+                self._chat_writer = threading.Thread(
+                    target=self._chat_writer_loop, name="dynamodb-chat-writer", daemon=True
+                )
+                self._chat_writer.start()
+    
+    def _chat_writer_loop(self):
+        """Agrupa os chats da fila e os grava com batch_writer (None encerra a thread)"""
+        while True:
+            item = self._chat_write_queue.get()
+            if item is None:
+                return
+            batch = [item]
+            stop = False
+            deadline = time.monotonic() + CHAT_WRITE_FLUSH_MS / 1000
+            while len(batch) < CHAT_WRITE_BATCH_SIZE:
+                timeout = deadline - time.monotonic()
+                if timeout <= 0:
+                    break
+                try:
+                    item = self._chat_write_queue.get(timeout=timeout)
+                except queue.Empty:
+                    break
+                if item is None:
+                    stop = True
+                    break
+                batch.append(item)
+            
+            self._write_chat_batch(batch)
+            if stop:
+                return
+    
+    def _write_chat_batch(self, batch: List[Dict[str, Any]]):
+        """Grava o lote, com até CHAT_WRITE_MAX_ATTEMPTS tentativas; retorna False se os chats foram perdidos"""
+        written = False
+        for attempt in range(1, CHAT_WRITE_MAX_ATTEMPTS + 1):
+            try:
+                with self._table('chat_history').batch_writer() as writer:
+                    for item in batch:
+                        writer.put_item(Item=item)
+                logger.info(f"{len(batch)} chats salvos no DynamoDB")
+                written = True
+                break
+            except Exception as e:
+                if attempt < CHAT_WRITE_MAX_ATTEMPTS:
+                    logger.warning(f"Erro ao salvar lote de {len(batch)} chats no DynamoDB "
+                                   f"(tentativa {attempt} de {CHAT_WRITE_MAX_ATTEMPTS}): {e}")
+                    time.sleep(CHAT_WRITE_RETRY_DELAY * 2 ** (attempt - 1))
+                else:
+                    chat_ids = [item['chat_id'] for item in batch]
+                    logger.error(f"Lote de {len(batch)} chats descartado após {attempt} tentativas: {e} "
+                                 f"(chat_ids: {chat_ids})")
+                    self.failed_chat_writes += len(batch)
+        for user_id in {item['user_id'] for item in batch}:
+            self._invalidate_user_reads(user_id)
+        return written
+    
+    def flush_chat_writes(self, timeout: float = 10.0):
+        """Grava os chats pendentes e encerra a thread de gravação (no desligamento da aplicação)"""
+        with self._chat_writer_lock:
+            writer = self._chat_writer
+            self._chat_writer = None
+        if writer is not None and writer.is_alive():
+            self._chat_write_queue.put(None)
+            writer.join(timeout)
+            if writer.is_alive():
+                logger.error(f"Gravação de chats não terminou em {timeout}s; "
+                             f"~{self._chat_write_queue.qsize()} chats ainda na fila não foram gravados")
+    
     def get_recent_chats(self, user_id: str, limit: int = 10) -> List[Dict]:
         """Obtém chats recentes do usuário"""
         if not self.is_available():
             return []
         
+        cache_key = (user_id, limit)
+        with self._read_cache_lock:
+            cached = self._recent_chats_cache.get(cache_key)
+        if cached is not None:
+            return list(cached)
+        
         try:
-            table = self.dynamodb.Table(self.tables['chat_history'])
+            table = self._table('chat_history')
             # Usar GSI para query eficiente por user_id
             response = table.query(
                 IndexName='user_id-index',
@@ -291,7 +473,10 @@ class DynamoDBService:
                 Limit=limit,
                 ScanIndexForward=False  # Ordem decrescente (mais recentes primeiro)
             )
-            return response.get('Items', [])
+            items = response.get('Items', [])
+            with self._read_cache_lock:
+                self._recent_chats_cache[cache_key] = items
+            return list(items)
             
         except Exception as e:
             logger.error(f"Erro ao obter chats: {e}")
@@ -303,7 +488,7 @@ class DynamoDBService:
             return []
         
         try:
-            table = self.dynamodb.Table(self.tables['chat_history'])
+            table = self._table('chat_history')
             # Usar GSI e filtrar por PDF
             response = table.query(
                 IndexName='user_id-index',
@@ -342,7 +527,7 @@ class DynamoDBService:
                 item['processing_time_formatted'] = self._format_processing_time(processing_time_seconds)
                 logger.info(f"⏱Incluindo tempo de processamento: {processing_time_seconds}s -> {item['processing_time_formatted']}")
             
-            table = self.dynamodb.Table(self.tables['pdfs'])
+            table = self._table('pdfs')
             
             print(f" DEBUG: Salvando item no DynamoDB:")
             print(f"   - Tabela: {self.tables['pdfs']}")
@@ -421,7 +606,7 @@ class DynamoDBService:
             processing_time_decimal = Decimal(str(processing_time_seconds))
             print(f"DEBUG: Convertido para Decimal: {processing_time_decimal}")
             
-            table = self.dynamodb.Table(self.tables['pdfs'])
+            table = self._table('pdfs')
             
             response = table.update_item(
                 Key={'pdf_id': pdf_id},
@@ -467,7 +652,7 @@ class DynamoDBService:
             return None
         
         try:
-            table = self.dynamodb.Table(self.tables['pdfs'])
+            table = self._table('pdfs')
             response = table.get_item(Key={'pdf_id': pdf_id})
             return response.get('Item')
         except Exception as e:
@@ -511,7 +696,7 @@ class DynamoDBService:
             return []
         
         try:
-            table = self.dynamodb.Table(self.tables['pdfs'])
+            table = self._table('pdfs')
             # Usar GSI para query eficiente por user_id
             response = table.query(
                 IndexName='user_id-index',
@@ -529,7 +714,7 @@ class DynamoDBService:
             return []
         
         try:
-            table = self.dynamodb.Table(self.tables['pdfs'])
+            table = self._table('pdfs')
             
             # Usar scan para obter todos os PDFs
             response = table.scan(
@@ -555,7 +740,7 @@ class DynamoDBService:
             return False
         
         try:
-            table = self.dynamodb.Table(self.tables['chat_history'])
+            table = self._table('chat_history')
             
             # Fazer update do registro existente
             response = table.update_item(
@@ -566,8 +751,12 @@ class DynamoDBService:
                     ':ft': feedback_type,
                     ':fc': feedback_comment
                 },
-                ReturnValues='UPDATED_NEW'
+                ReturnValues='ALL_NEW'
             )
+            # O histórico em cache inclui o feedback: descarta as leituras do dono do chat
+            user_id = response.get('Attributes', {}).get('user_id')
+            if user_id:
+                self._invalidate_user_reads(user_id)
             
             feedback_text = "positivo" if feedback_type == 0 else "negativo"
             logger.info(f"Feedback atualizado - Chat ID: {chat_id}, Type: {feedback_text} ({feedback_type}), Comment: {feedback_comment[:50]}...")
@@ -584,7 +773,7 @@ class DynamoDBService:
             return []
         
         try:
-            table = self.dynamodb.Table(self.tables['chat_history'])
+            table = self._table('chat_history')
             
             # Query por user_id e filtra por feedback_date (indica que tem feedback)
             response = table.query(
@@ -624,20 +813,23 @@ class DynamoDBService:
             logger.warning("DynamoDB não disponível")
             return []
         
+        # Mesmo cache curto de get_recent_chats (a barra lateral consulta o histórico com frequência)
+        cache_key = (user_id, limit, 'history')
+        with self._read_cache_lock:
+            cached = self._recent_chats_cache.get(cache_key)
+        if cached is not None:
+            return list(cached)
+        
         try:
-            table = self.dynamodb.Table(self.tables['chat_history'])
+            table = self._table('chat_history')
             table_name = self.tables['chat_history']
             
             logger.info(f"DynamoDB: Buscando chat history para user_id: {user_id}, limit: {limit}")
             logger.info(f"DynamoDB: Tabela: {table_name}")
             
-            # Primeiro, verificar se o GSI existe
+            # Primeiro, verificar se o GSI existe (resultado mantido em cache)
             try:
-                table_description = table.meta.client.describe_table(TableName=table_name)
-                gsi_exists = any(
-                    gsi.get('IndexName') == 'user_id-index' 
-                    for gsi in table_description.get('Table', {}).get('GlobalSecondaryIndexes', [])
-                )
+                gsi_exists = self._has_gsi('chat_history', 'user_id-index')
                 logger.info(f"DynamoDB: GSI 'user_id-index' existe: {gsi_exists}")
             except Exception as gsi_error:
                 logger.error(f"DynamoDB: Erro ao verificar GSI: {gsi_error}")
@@ -681,7 +873,9 @@ class DynamoDBService:
                 logger.info(f"   - timestamp: {first_chat.get('timestamp')}")
                 logger.info(f"   - question: {first_chat.get('question', '')[:50]}...")
             
-            return chats
+            with self._read_cache_lock:
+                self._recent_chats_cache[cache_key] = chats
+            return list(chats)
             
         except Exception as e:
             logger.error(f"DynamoDB: Erro ao obter chat history: {e}")
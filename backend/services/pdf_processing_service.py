@@ -1,12 +1,12 @@
 import os
 import tempfile
 import logging
-from typing import List, Dict, Any, Optional, Tuple
+from typing import List, Dict, Any, Optional, Tuple, Callable
 import PyPDF2
 from services.chromadb_client import ChromaDBService
 from services.dynamodb_service import DynamoDBService
 import uuid
-from datetime import datetime
+from datetime import datetime, timezone
 import re
 
 logger = logging.getLogger(__name__)
@@ -15,10 +15,10 @@ logger = logging.getLogger(__name__)
 class PDFProcessingService:
     """Serviço para processamento de PDFs com armazenamento em ChromaDB e DynamoDB"""
     
-    def __init__(self):
-        """Inicializa o serviço de processamento de PDF"""
-        self.chromadb = ChromaDBService()
-        self.dynamodb = DynamoDBService()
+    def __init__(self, dynamodb: Optional[DynamoDBService] = None, chromadb: Optional[ChromaDBService] = None):
+        """Inicializa o serviço de processamento de PDF (instâncias compartilhadas, se fornecidas)"""
+        self.chromadb = chromadb or ChromaDBService()
+        self.dynamodb = dynamodb or DynamoDBService()
         
         # Configurações de chunking
         self.chunk_size = 1000  # Tamanho base dos chunks em caracteres
@@ -36,17 +36,17 @@ class PDFProcessingService:
             Dicionário com texto extraído e metadados
         """
         try:
-            print(f"DEBUG: Abrindo arquivo PDF: {pdf_path}")
+            logger.debug("Abrindo arquivo PDF: %s", pdf_path)
             with open(pdf_path, 'rb') as file:
-                print(f"DEBUG: Criando PdfReader")
+                logger.debug("Criando PdfReader")
                 pdf_reader = PyPDF2.PdfReader(file)
-                print(f"DEBUG: PDF tem {len(pdf_reader.pages)} páginas")
+                logger.debug("PDF tem %s páginas", len(pdf_reader.pages))
                 
                 text = ""
                 pages_info = []
                 
                 for page_num, page in enumerate(pdf_reader.pages):
-                    print(f"DEBUG: Processando página {page_num + 1}")
+                    logger.debug("Processando página %s", page_num + 1)
                     try:
                         page_text = page.extract_text()
                         text += page_text + "\n\n"
@@ -57,9 +57,8 @@ class PDFProcessingService:
                             'char_count': len(page_text),
                             'word_count': len(page_text.split()) if page_text else 0
                         })
-                        print(f"DEBUG: Página {page_num + 1} processada: {len(page_text)} chars")
+                        logger.debug("Página %s processada: %s chars", page_num + 1, len(page_text))
                     except Exception as e:
-                        print(f"DEBUG: Erro na página {page_num + 1}: {e}")
                         logger.warning(f"Erro ao extrair texto da página {page_num + 1}: {e}")
                         pages_info.append({
                             'page_number': page_num + 1,
@@ -69,7 +68,7 @@ class PDFProcessingService:
                             'error': str(e)
                         })
                 
-                print(f"DEBUG: Extração concluída. Total: {len(text)} caracteres")
+                logger.debug("Extração concluída. Total: %s caracteres", len(text))
                 return {
                     'success': True,
                     'full_text': text.strip(),
@@ -81,7 +80,6 @@ class PDFProcessingService:
                 }
                 
         except Exception as e:
-            print(f"DEBUG: Erro em extract_text_from_pdf: {e}")
             logger.error(f"Erro ao extrair texto do PDF: {e}")
             return {
                 'success': False,
@@ -105,15 +103,15 @@ class PDFProcessingService:
             Lista de chunks com metadados
         """
         try:
-            print(f"DEBUG: Iniciando create_text_chunks para {pdf_name}, texto: {len(text)} chars")
+            logger.debug("Iniciando create_text_chunks para %s, texto: %s chars", pdf_name, len(text))
             
             # Limpar e normalizar texto
-            print(f"DEBUG: Limpando texto...")
+            logger.debug("Limpando texto...")
             text = self._clean_text(text)
-            print(f"DEBUG: Texto limpo: {len(text)} chars")
+            logger.debug("Texto limpo: %s chars", len(text))
             
             if len(text) < self.min_chunk_size:
-                print(f"DEBUG: Texto menor que min_chunk_size ({self.min_chunk_size}), criando chunk único")
+                logger.debug("Texto menor que min_chunk_size (%s), criando chunk único", self.min_chunk_size)
                 return [{
                     'text': text,
                     'chunk_index': 0,
@@ -124,7 +122,7 @@ class PDFProcessingService:
                     'pdf_name': pdf_name
                 }]
             
-            print(f"DEBUG: Iniciando loop de chunking...")
+            logger.debug("Iniciando loop de chunking...")
             chunks = []
             chunk_index = 0
             start = 0
@@ -133,30 +131,30 @@ class PDFProcessingService:
             
             while start < len(text) and iteration_count < max_iterations:
                 iteration_count += 1
-                print(f"DEBUG: Chunk {chunk_index}, start: {start}, iteration: {iteration_count}")
+                logger.debug("Chunk %s, start: %s, iteration: %s", chunk_index, start, iteration_count)
                 
                 if iteration_count % 10 == 0:  # Log a cada 10 iterações
-                    print(f"DEBUG: Progresso chunking: {iteration_count}/{max_iterations}, start: {start}/{len(text)}")
+                    logger.debug("Progresso chunking: %s/%s, start: %s/%s", iteration_count, max_iterations, start, len(text))
                 
                 # Calcular fim do chunk
                 end = start + self.chunk_size
                 
                 # Se não é o último chunk, tentar encontrar uma quebra natural
                 if end < len(text):
-                    print(f"DEBUG: Procurando quebra natural...")
+                    logger.debug("Procurando quebra natural...")
                     try:
                         end = self._find_natural_break(text, start, end)
-                        print(f"DEBUG: Quebra natural encontrada em: {end}")
+                        logger.debug("Quebra natural encontrada em: %s", end)
                     except Exception as e:
-                        print(f"DEBUG: Erro ao procurar quebra natural: {e}, usando end original")
+                        logger.debug("Erro ao procurar quebra natural: %s, usando end original", e)
                         end = start + self.chunk_size
                 else:
                     end = len(text)
-                    print(f"DEBUG: Último chunk, end: {end}")
+                    logger.debug("Último chunk, end: %s", end)
                 
                 # Extrair chunk
                 chunk_text = text[start:end].strip()
-                print(f"DEBUG: Chunk extraído: {len(chunk_text)} chars")
+                logger.debug("Chunk extraído: %s chars", len(chunk_text))
                 
                 if len(chunk_text) >= self.min_chunk_size:
                     chunk_info = {
@@ -170,7 +168,7 @@ class PDFProcessingService:
                     }
                     chunks.append(chunk_info)
                     chunk_index += 1
-                    print(f"DEBUG: Chunk {chunk_index-1} adicionado")
+                    logger.debug("Chunk %s adicionado", chunk_index-1)
                 
                 # Avançar com sobreposição
                 old_start = start
@@ -180,26 +178,24 @@ class PDFProcessingService:
                 
                 # Proteção contra loop infinito - se start não avançou suficientemente
                 if start <= old_start:
-                    print(f"DEBUG: Start não avançou suficientemente ({old_start} -> {start}), forçando avanço")
+                    logger.debug("Start não avançou suficientemente (%s -> %s), forçando avanço", old_start, start)
                     start = old_start + max(1, self.chunk_size // 2)
                 
-                print(f"DEBUG: Próximo start: {start}")
+                logger.debug("Próximo start: %s", start)
                 
                 # Se start >= end, algo deu errado
                 if start >= end and end < len(text):
-                    print(f"DEBUG: ERRO: start >= end, corrigindo...")
+                    logger.debug("start >= end, corrigindo...")
                     start = end
                     
             if iteration_count >= max_iterations:
-                print(f"DEBUG: AVISO: Atingido limite de iterações ({max_iterations})")
                 logger.warning(f"Chunking atingiu limite de iterações para PDF '{pdf_name}'")
             
-            print(f"DEBUG: Chunking concluído: {len(chunks)} chunks criados em {iteration_count} iterações")
+            logger.debug("Chunking concluído: %s chunks criados em %s iterações", len(chunks), iteration_count)
             logger.info(f"Texto dividido em {len(chunks)} chunks para PDF '{pdf_name}'")
             return chunks
             
         except Exception as e:
-            print(f"DEBUG: Erro em create_text_chunks: {e}")
             logger.error(f"Erro ao criar chunks: {e}")
             return []
     
@@ -214,15 +210,15 @@ class PDFProcessingService:
     def _find_natural_break(self, text: str, start: int, preferred_end: int) -> int:
         """Encontra um ponto natural para quebrar o texto"""
         try:
-            print(f"DEBUG: _find_natural_break - start: {start}, preferred_end: {preferred_end}, text_len: {len(text)}")
+            logger.debug("_find_natural_break - start: %s, preferred_end: %s, text_len: %s", start, preferred_end, len(text))
             
             # Validar entrada
             if preferred_end >= len(text):
-                print(f"DEBUG: preferred_end >= text_len, retornando len(text)")
+                logger.debug("preferred_end >= text_len, retornando len(text)")
                 return len(text)
             
             if preferred_end <= start:
-                print(f"DEBUG: preferred_end <= start, retornando preferred_end")
+                logger.debug("preferred_end <= start, retornando preferred_end")
                 return preferred_end
             
             # Procurar por quebras naturais em uma janela menor para evitar travamento
@@ -230,7 +226,7 @@ class PDFProcessingService:
             search_start = max(preferred_end - search_window, start)
             search_end = min(preferred_end + search_window, len(text))
             
-            print(f"DEBUG: search_window: {search_window}, search_start: {search_start}, search_end: {search_end}")
+            logger.debug("search_window: %s, search_start: %s, search_end: %s", search_window, search_start, search_end)
             
             # Busca simples sem regex complexo para evitar travamento
             search_text = text[search_start:search_end]
@@ -249,27 +245,28 @@ class PDFProcessingService:
                     if distance < best_distance:
                         best_distance = distance
                         best_pos = absolute_pos
-                        print(f"DEBUG: Encontrou quebra '{break_char}' em pos {absolute_pos}, distancia {distance}")
+                        logger.debug("Encontrou quebra '%s' em pos %s, distancia %s", break_char, absolute_pos, distance)
             
             if best_pos is not None:
-                print(f"DEBUG: Melhor quebra em: {best_pos}")
+                logger.debug("Melhor quebra em: %s", best_pos)
                 return best_pos
             
             # Se não encontrar quebra natural, procurar espaço mais próximo
             for i in range(preferred_end, search_start - 1, -1):
                 if i < len(text) and text[i] == ' ':
-                    print(f"DEBUG: Encontrou espaço em: {i}")
+                    logger.debug("Encontrou espaço em: %s", i)
                     return i + 1
             
             # Último recurso: usar posição preferida
-            print(f"DEBUG: Nenhuma quebra encontrada, usando preferred_end: {preferred_end}")
+            logger.debug("Nenhuma quebra encontrada, usando preferred_end: %s", preferred_end)
             return preferred_end
             
         except Exception as e:
-            print(f"DEBUG: Erro em _find_natural_break: {e}")
+            logger.debug("Erro em _find_natural_break: %s", e)
             return preferred_end
     
-    def process_pdf_file(self, pdf_path: str, pdf_name: str, user_id: str = None) -> Dict[str, Any]:
+    def process_pdf_file(self, pdf_path: str, pdf_name: str, user_id: str = None,
+                         progress_callback: Optional[Callable[[int, int], None]] = None) -> Dict[str, Any]:
         """
         Processa um arquivo PDF completo: extração, chunking e armazenamento
         
@@ -277,21 +274,22 @@ class PDFProcessingService:
             pdf_path: Caminho para o arquivo PDF
             pdf_name: Nome do PDF
             user_id: ID do usuário
+            progress_callback: Chamado com (chunks indexados, total) durante a indexação
         
         Returns:
             Dicionário com resultado do processamento
         """
         try:
-            print(f"DEBUG: Iniciando process_pdf_file para {pdf_name}")
+            logger.debug("Iniciando process_pdf_file para %s", pdf_name)
             logger.info(f"Iniciando processamento do PDF: {pdf_name}")
             
             # 1. Extrair texto do PDF
-            print(f"DEBUG: Iniciando extração de texto para {pdf_name}")
+            logger.debug("Iniciando extração de texto para %s", pdf_name)
             extraction_result = self.extract_text_from_pdf(pdf_path)
-            print(f"DEBUG: Extração concluída para {pdf_name}: {extraction_result.get('success', False)}")
+            logger.debug("Extração concluída para %s: %s", pdf_name, extraction_result.get('success', False))
             
             if not extraction_result['success']:
-                print(f"DEBUG: Erro na extração: {extraction_result.get('error', 'Unknown')}")
+                logger.debug("Erro na extração: %s", extraction_result.get('error', 'Unknown'))
                 return {
                     'success': False,
                     'error': f"Erro na extração: {extraction_result['error']}",
@@ -300,22 +298,22 @@ class PDFProcessingService:
             
             full_text = extraction_result['full_text']
             if not full_text.strip():
-                print(f"DEBUG: PDF não contém texto extraível")
+                logger.debug("PDF não contém texto extraível")
                 return {
                     'success': False,
                     'error': "PDF não contém texto extraível",
                     'pdf_name': pdf_name
                 }
             
-            print(f"DEBUG: Texto extraído: {len(full_text)} caracteres")
+            logger.debug("Texto extraído: %s caracteres", len(full_text))
             
             # 2. Criar chunks
-            print(f"DEBUG: Iniciando criação de chunks para {pdf_name}")
+            logger.debug("Iniciando criação de chunks para %s", pdf_name)
             chunks = self.create_text_chunks(full_text, pdf_name)
-            print(f"DEBUG: Chunks criados: {len(chunks)}")
+            logger.debug("Chunks criados: %s", len(chunks))
             
             if not chunks:
-                print(f"DEBUG: Não foi possível criar chunks")
+                logger.debug("Não foi possível criar chunks")
                 return {
                     'success': False,
                     'error': "Não foi possível criar chunks do texto",
@@ -323,36 +321,36 @@ class PDFProcessingService:
                 }
             
             # 3. Armazenar embeddings no ChromaDB
-            print(f"DEBUG: Iniciando armazenamento no ChromaDB para {pdf_name}")
+            logger.debug("Iniciando armazenamento no ChromaDB para %s", pdf_name)
             chunk_texts = [chunk['text'] for chunk in chunks]
-            print(f"DEBUG: Preparados {len(chunk_texts)} textos de chunks para ChromaDB")
+            logger.debug("Preparados %s textos de chunks para ChromaDB", len(chunk_texts))
             
             pdf_metadata = {
                 'page_count': extraction_result['page_count'],
                 'total_chars': extraction_result['total_chars'],
                 'total_words': extraction_result['total_words'],
                 'chunks_count': len(chunks),
-                'processing_date': datetime.utcnow().isoformat(),
+                'processing_date': datetime.now(timezone.utc).isoformat(),
                 'extraction_method': extraction_result['extraction_method']
             }
-            print(f"DEBUG: Metadados preparados: {pdf_metadata}")
+            logger.debug("Metadados preparados: %s", pdf_metadata)
             
-            print(f"DEBUG: Chamando store_pdf_embeddings para {pdf_name}")
+            logger.debug("Chamando store_pdf_embeddings para %s", pdf_name)
             try:
                 chromadb_success = self.chromadb.store_pdf_embeddings(
                     pdf_name=pdf_name,
                     text_chunks=chunk_texts,
                     user_id=user_id,
-                    pdf_metadata=pdf_metadata
+                    pdf_metadata=pdf_metadata,
+                    progress_callback=progress_callback
                 )
-                print(f"DEBUG: ChromaDB storage result: {chromadb_success}")
+                logger.debug("ChromaDB storage result: %s", chromadb_success)
             except Exception as chromadb_error:
-                print(f"DEBUG: Erro durante store_pdf_embeddings: {chromadb_error}")
                 logger.error(f"Erro específico no ChromaDB: {chromadb_error}")
                 chromadb_success = False
             
             if not chromadb_success:
-                print(f"DEBUG: Erro ao armazenar no ChromaDB")
+                logger.error(f"Erro ao armazenar embeddings do PDF '{pdf_name}' no ChromaDB")
                 return {
                     'success': False,
                     'error': "Erro ao armazenar embeddings no ChromaDB",
@@ -360,7 +358,7 @@ class PDFProcessingService:
                 }
             
             # 4. Salvar metadados no DynamoDB
-            print(f"DEBUG: Iniciando salvamento no DynamoDB para {pdf_name}")
+            logger.debug("Iniciando salvamento no DynamoDB para %s", pdf_name)
             dynamodb_metadata = {
                 **pdf_metadata,
                 'file_path': pdf_path,
@@ -371,16 +369,15 @@ class PDFProcessingService:
             pdf_id = None
             if user_id:
                 try:
-                    print(f"DEBUG: Salvando metadados no DynamoDB {user_id}")
+                    logger.debug("Salvando metadados no DynamoDB %s", user_id)
                     # Salva sem tempo de processamento primeiro, será atualizado depois
                     pdf_id = self.dynamodb.save_pdf_metadata(user_id, pdf_name, dynamodb_metadata)
-                    print(f"DEBUG: DynamoDB save result: {pdf_id}")
+                    logger.debug("DynamoDB save result: %s", pdf_id)
                 except Exception as e:
-                    print(f"DEBUG: Erro ao salvar no DynamoDB: {e}")
                     logger.warning(f"Erro ao salvar metadados no DynamoDB: {e}")
             
             # 5. Resultado final
-            print(f"DEBUG: Preparando resultado final para {pdf_name}")
+            logger.debug("Preparando resultado final para %s", pdf_name)
             result = {
                 'success': True,
                 'pdf_name': pdf_name,
@@ -396,16 +393,15 @@ class PDFProcessingService:
                     'dynamodb_metadata_saved': pdf_id is not None,
                     'total_chunks_stored': len(chunks)
                 },
-                'processing_time': datetime.utcnow().isoformat()
+                'processing_time': datetime.now(timezone.utc).isoformat()
             }
             
-            print(f"DEBUG: Processamento completo para {pdf_name}")
+            logger.debug("Processamento completo para %s", pdf_name)
             logger.info(f"PDF '{pdf_name}' processado com sucesso. {len(chunks)} chunks indexados.")
             return result
             
         except Exception as e:
             error_msg = f"Erro ao processar PDF '{pdf_name}': {e}"
-            print(f"DEBUG: Exception em process_pdf_file: {error_msg}")
             logger.error(error_msg)
             return {
                 'success': False,
@@ -413,14 +409,16 @@ class PDFProcessingService:
                 'pdf_name': pdf_name
             }
     
-    def process_uploaded_pdf(self, file_content: bytes, filename: str, user_id: str = None) -> Dict[str, Any]:
+    def process_pdf_path(self, pdf_path: str, filename: str, user_id: str = None,
+                         progress_callback: Optional[Callable[[int, int], None]] = None) -> Dict[str, Any]:
         """
-        Processa um PDF enviado via upload
+        Processa um PDF já gravado em disco e registra o tempo de processamento no DynamoDB
         
         Args:
-            file_content: Conteúdo do arquivo em bytes
-            filename: Nome do arquivo
+            pdf_path: Caminho do arquivo PDF (não é removido)
+            filename: Nome original do arquivo
             user_id: ID do usuário
+            progress_callback: Chamado com (chunks indexados, total) durante a indexação
         
         Returns:
             Resultado do processamento
@@ -428,85 +426,77 @@ class PDFProcessingService:
         import time
         start_time = time.time()
         
-        print('*********************Processing uploaded PDF*******************:', filename)
+        # Processar o arquivo
+        result = self.process_pdf_file(pdf_path, filename, user_id, progress_callback)
+        
+        logger.debug("Resultado do process_pdf_file: success=%s, pdf_id=%s, pdf_name=%s, chaves=%s",
+                     result.get('success', False), result.get('pdf_id', 'N/A'),
+                     result.get('pdf_name', 'N/A'), list(result.keys()))
+        
+        # Calcular tempo de processamento
+        processing_time = time.time() - start_time
+        
+        # Atualizar resultado com tempo de processamento
+        result['processing_time_seconds'] = processing_time
+        result['processing_time_formatted'] = self._format_processing_time(processing_time)
+        
+        # Agora atualizar o DynamoDB com tempo de processamento se PDF foi salvo
+        if user_id and result.get('pdf_id'):
+            try:
+                pdf_id = result['pdf_id']
+                logger.debug("Atualizando PDF %s com tempo: %ss", pdf_id, processing_time)
+                
+                success = self.dynamodb.update_pdf_processing_time(pdf_id, processing_time)
+                
+                if success:
+                    logger.debug("Tempo de processamento salvo no DynamoDB: %s", result['processing_time_formatted'])
+                    # Leitura de conferência só com o log de debug ativo (é uma chamada a mais ao DynamoDB)
+                    if logger.isEnabledFor(logging.DEBUG):
+                        logger.debug("PDF após o update: %s", self.dynamodb.verify_pdf_processing_time(pdf_id))
+                else:
+                    logger.warning(f"Falha ao salvar tempo de processamento do PDF {pdf_id} no DynamoDB")
+                    
+            except Exception as update_error:
+                logger.error(f"Erro ao atualizar tempo no DynamoDB: {update_error}")
+        elif not user_id:
+            logger.debug("Não atualizando tempo: user_id não fornecido")
+        else:
+            logger.debug("Não atualizando tempo: pdf_id não encontrado no resultado (success=%s, erro=%s)",
+                         result.get('success', 'N/A'), result.get('error'))
+        
+        logger.debug("Tempo de processamento de %s: %s", filename, result['processing_time_formatted'])
+        return result
+
+    def process_uploaded_pdf(self, file_content: bytes, filename: str, user_id: str = None,
+                             progress_callback: Optional[Callable[[int, int], None]] = None) -> Dict[str, Any]:
+        """
+        Processa um PDF enviado via upload
+        
+        Args:
+            file_content: Conteúdo do arquivo em bytes
+            filename: Nome do arquivo
+            user_id: ID do usuário
+            progress_callback: Chamado com (chunks indexados, total) durante a indexação
+        
+        Returns:
+            Resultado do processamento
+        """
+        logger.debug("Processando PDF enviado: %s", filename)
         try:
             # Criar arquivo temporário
             with tempfile.NamedTemporaryFile(delete=False, suffix='.pdf') as temp_file:
                 temp_file.write(file_content)
                 temp_path = temp_file.name
-                print(f"Arquivo temporário criado: {temp_path}")
+                logger.debug("Arquivo temporário criado: %s", temp_path)
             try:
-                # Processar o arquivo
-                result = self.process_pdf_file(temp_path, filename, user_id)
-                
-                print(f"DEBUG: Resultado do process_pdf_file:")
-                print(f"   - Success: {result.get('success', False)}")
-                print(f"   - PDF ID: {result.get('pdf_id', 'N/A')}")
-                print(f"   - PDF Name: {result.get('pdf_name', 'N/A')}")
-                print(f"   - Keys disponíveis: {list(result.keys())}")
-                
-                # Calcular tempo de processamento
-                processing_time = time.time() - start_time
-                print(f"⏱DEBUG: Tempo calculado: {processing_time}s")
-                
-                # Atualizar resultado com tempo de processamento
-                result['processing_time_seconds'] = processing_time
-                result['processing_time_formatted'] = self._format_processing_time(processing_time)
-                
-                print(f"DEBUG: Verificando condições para update:")
-                print(f"   - user_id fornecido: {user_id is not None} (valor: {user_id})")
-                print(f"   - result tem pdf_id: {'pdf_id' in result}")
-                print(f"   - pdf_id não é None: {result.get('pdf_id') is not None}")
-                print(f"   - Condição geral: {user_id and result.get('pdf_id')}")
-                
-                # Agora atualizar o DynamoDB com tempo de processamento se PDF foi salvo
-                if user_id and result.get('pdf_id'):
-                    try:
-                        pdf_id = result['pdf_id']
-                        print(f"Atualizando PDF {pdf_id} com tempo: {processing_time}s")
-                        
-                        # Verificar PDF antes do update
-                        verification_before = self.dynamodb.verify_pdf_processing_time(pdf_id)
-                        print(f"PDF antes do update: {verification_before}")
-                        
-                        success = self.dynamodb.update_pdf_processing_time(pdf_id, processing_time)
-                        
-                        if success:
-                            print(f"Tempo de processamento salvo no DynamoDB: {self._format_processing_time(processing_time)}")
-                            
-                            # Verificar PDF após o update
-                            verification_after = self.dynamodb.verify_pdf_processing_time(pdf_id)
-                            print(f"PDF após o update: {verification_after}")
-                            
-                        else:
-                            print(f"Falha ao salvar tempo no DynamoDB")
-                            
-                    except Exception as update_error:
-                        print(f"Erro ao atualizar tempo no DynamoDB: {update_error}")
-                elif not user_id:
-                    print(f"Não atualizando tempo: user_id não fornecido")
-                elif not result.get('pdf_id'):
-                    print(f"Não atualizando tempo: pdf_id não encontrado no resultado")
-                    print(f"Resultado disponível: {list(result.keys())}")
-                    print(f"Success status: {result.get('success', 'N/A')}")
-                    if 'error' in result:
-                        print(f"Error message: {result['error']}")
-                else:
-                    print(f"Condição não atendida por motivo desconhecido")
-                    print(f"   - user_id: {user_id}")
-                    print(f"   - pdf_id: {result.get('pdf_id')}")
-                
-                print(f"Resultado do processamento: {result}")
-                print(f"Tempo de processamento: {result.get('processing_time_formatted', 'N/A')}")
-                return result
+                return self.process_pdf_path(temp_path, filename, user_id, progress_callback)
             finally:
                 # Limpar arquivo temporário
-                print(f"Removendo arquivo temporário: {temp_path}")
+                logger.debug("Removendo arquivo temporário: %s", temp_path)
                 try:
                     os.unlink(temp_path)
                 except:
                     pass
-            print('*********************Processing uploaded PDF completed*******************:', filename)
         except Exception as e:
             error_msg = f"Erro ao processar upload do PDF '{filename}': {e}"
             logger.error(error_msg)
@@ -1,19 +1,31 @@
+import asyncio
+import os
+
 import fitz
 from backend.services.mongo import db
+from services.upload_utils import save_upload_to_tempfile
 
 class PDFService:
     def __init__(self):
         self.db = db
         self.collection = self.db["pdfs"]
 
-    def upload_pdf(self, file):
-        contents = file.file.read()
-        doc = fitz.open(stream=contents, filetype="pdf")
-        text = "".join(page.get_text() for page in doc)
+    async def upload_pdf(self, file):
+        # Upload gravado em disco em blocos, sem manter o PDF inteiro em memória
+        tmp_path = await save_upload_to_tempfile(file)
+        try:
+            # Parsing do PDF e escrita no banco são bloqueantes: executar em thread
+            return await asyncio.to_thread(self._store_pdf, file.filename, tmp_path)
+        finally:
+            os.unlink(tmp_path)
+
+    def _store_pdf(self, filename, pdf_path):
+        with fitz.open(pdf_path) as doc:
+            text = "".join(page.get_text() for page in doc)
 
-        self.collection.insert_one({"name": file.filename, "content": text})
-        return {"message": "PDF enviado com sucesso!", "pdf_name": file.filename}
+        self.collection.insert_one({"name": filename, "content": text})
+        return {"message": "PDF enviado com sucesso!", "pdf_name": filename}
 
     def list_pdfs(self):
         pdfs = self.collection.find({}, {"_id": 0, "name": 1})
-        return [pdf["name"] for pdf in pdfs]
\ No newline at end of file
+        return [pdf["name"] for pdf in pdfs]
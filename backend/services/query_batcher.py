@@ -0,0 +1,78 @@
+import asyncio
+import os
+import logging
+from typing import List, Optional, Set
+
+logger = logging.getLogger(__name__)
+
+# Máximo de buscas por lote e janela de espera para agrupar buscas concorrentes
+QUERY_BATCH_MAX = int(os.getenv("QUERY_BATCH_MAX", "32"))
+QUERY_BATCH_WAIT_MS = float(os.getenv("QUERY_BATCH_WAIT_MS", "5"))
+
+
+class QueryBatcher:
+    """Agrupa buscas semânticas que chegam numa janela curta em uma única requisição ao ChromaDB"""
+
+    def __init__(self, chromadb_service, max_batch: int = QUERY_BATCH_MAX,
+                 max_wait_ms: float = QUERY_BATCH_WAIT_MS):
+        """
+        Args:
+            chromadb_service: ChromaDBService usado para a busca em lote
+            max_batch: Número máximo de buscas por lote
+            max_wait_ms: Tempo máximo que a primeira busca do lote espera por outras
+        """
+        self.chromadb_service = chromadb_service
+        self.max_batch = max_batch
+        self.max_wait = max_wait_ms / 1000
+        self._queue: Optional[asyncio.Queue] = None
+        self._worker: Optional[asyncio.Task] = None
+        self._dispatches: Set[asyncio.Task] = set()
+
+    async def search(self, query: str, pdf_name: str = None, user_id: str = None,
+                     max_results: int = 5) -> List[dict]:
+        """Mesmo contrato de ChromaDBService.search_similar_content, mas executada em lote"""
+        # O worker é criado sob demanda, dentro do event loop da aplicação
+        if self._worker is None or self._worker.done():
+            self._queue = asyncio.Queue()
+            self._worker = asyncio.create_task(self._run())
+
+        future = asyncio.get_running_loop().create_future()
+        await self._queue.put((query, pdf_name, user_id, max_results, future))
+        return await future
+
+    async def _run(self):
+        """Coleta buscas até encher o lote ou esgotar a janela e as despacha"""
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = [await self._queue.get()]
+            deadline = loop.time() + self.max_wait
+            while len(batch) < self.max_batch:
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    batch.append(await asyncio.wait_for(self._queue.get(), timeout))
+                except asyncio.TimeoutError:
+                    break
+
+            # Despachar sem bloquear a coleta do próximo lote
+            task = asyncio.create_task(self._dispatch(batch))
+            self._dispatches.add(task)
+            task.add_done_callback(self._dispatches.discard)
+
+    async def _dispatch(self, batch: list):
+        """Executa um lote (em thread, o cliente HTTP é síncrono) e resolve os futures"""
+        queries, pdf_names, user_ids, max_results, futures = zip(*batch)
+        try:
+            results = await asyncio.to_thread(
+                self.chromadb_service.search_similar_batch,
+                list(queries), list(pdf_names), list(user_ids), list(max_results)
+            )
+        except Exception as e:
+            logger.error(f"Erro na busca em lote: {e}")
+            results = [[] for _ in batch]
+
+        logger.info(f"Lote de busca despachado: {len(batch)} queries")
+        for i, future in enumerate(futures):
+            if not future.done():
+                future.set_result(results[i] if i < len(results) else [])
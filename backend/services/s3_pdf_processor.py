@@ -10,7 +10,9 @@ from typing import Dict, List, Any, Optional
 import PyPDF2
 import tempfile
 import google.generativeai as genai
+from botocore.config import Config
 from botocore.exceptions import ClientError
+from concurrent.futures import ThreadPoolExecutor
 import re
 import hashlib
 import pyarrow as pa
@@ -20,6 +22,9 @@ from langchain_aws import ChatBedrock
 # Configurações do Athena
 ATHENA_DATABASE = "chathib_stage"
 
+# Uploads simultâneos ao S3 (CSVs e arquivos das tabelas Delta); 1 = sequencial
+S3_UPLOAD_CONCURRENCY = max(1, int(os.getenv("S3_UPLOAD_CONCURRENCY", "8")))
+
 class S3PDFProcessor:
     """Processador de PDF com extração de tabelas e salvamento no S3"""
     
@@ -39,13 +44,53 @@ class S3PDFProcessor:
                 's3',
                 aws_access_key_id=os.getenv('AWS_ACCESS_KEY_ID'),
                 aws_secret_access_key=os.getenv('AWS_SECRET_ACCESS_KEY'),
-                region_name=os.getenv('AWS_DEFAULT_REGION', 'ca-central-1')
+                region_name=os.getenv('AWS_DEFAULT_REGION', 'ca-central-1'),
+                config=Config(max_pool_connections=max(10, S3_UPLOAD_CONCURRENCY))
             )
             print("Cliente S3 configurado com sucesso")
         except Exception as e:
             print(f"Erro ao configurar S3: {str(e)}")
             self.s3_client = None
     
+    def put_objects(self, objects: List[Dict[str, Any]]) -> List[Optional[Exception]]:
+        """
+        Envia vários objetos ao S3 em paralelo (o cliente boto3 é thread-safe)
+        
+        Args:
+            objects: Lista de kwargs para put_object (Key, Body, ContentType)
+        
+        Returns:
+            Lista com o erro de cada objeto (None se enviado com sucesso), na mesma ordem
+        """
+        def put(obj: Dict[str, Any]) -> Optional[Exception]:
+            try:
+                self.s3_client.put_object(Bucket=self.bucket_name, **obj)
+                return None
+            except Exception as e:
+                return e
+        
+        if len(objects) <= 1 or S3_UPLOAD_CONCURRENCY == 1:
+            return [put(obj) for obj in objects]
+        
+        with ThreadPoolExecutor(max_workers=min(S3_UPLOAD_CONCURRENCY, len(objects))) as upload_executor:
+            return list(upload_executor.map(put, objects))
+    
+    def list_objects(self, prefix: str) -> List[Dict[str, Any]]:
+        """
+        Lista todos os objetos sob o prefixo (paginado: sem o limite de 1000 chaves por chamada)
+        
+        Args:
+            prefix: Prefixo das chaves no bucket
+        
+        Returns:
+            Lista de objetos (Key, Size, LastModified, StorageClass...) como retornados pelo S3
+        """
+        paginator = self.s3_client.get_paginator('list_objects_v2')
+        objects = []
+        for page in paginator.paginate(Bucket=self.bucket_name, Prefix=prefix):
+            objects.extend(page.get('Contents', []))
+        return objects
+    
     def setup_ai_models(self):
         """Configura modelos de IA (Bedrock e Google AI)"""
         self.bedrock_model = None
@@ -352,16 +397,17 @@ class S3PDFProcessor:
                     else:
                         df_copy[col] = df_copy[col].astype(str)
                 
-                # Converte para lista de dicionários
+                # Linhas como listas posicionais (ordem de 'columns'): to_numpy().tolist() roda em C,
+                # sem alocar um dicionário por linha como to_dict('records')
                 json_friendly_tables[table_name] = {
-                    'data': df_copy.to_dict('records'),
+                    'rows': df_copy.to_numpy().tolist(),
                     'columns': list(df_copy.columns),
                     'shape': df_copy.shape,
                     'total_rows': len(df_copy)
                 }
             else:
                 json_friendly_tables[table_name] = {
-                    'data': [],
+                    'rows': [],
                     'columns': [],
                     'shape': [0, 0],
                     'total_rows': 0
@@ -591,6 +637,8 @@ class S3PDFProcessor:
         saved_files = {}
         timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
         
+        # Converte os DataFrames para CSV em memória
+        pending = []
         for table_type, df in tables.items():
             if not df.empty:
                 # Prepara nome do arquivo
@@ -598,28 +646,29 @@ class S3PDFProcessor:
                 s3_key = f"{self.s3_folder}/csv/{filename}"
                 
                 try:
-                    # Converte DataFrame para CSV em memória
                     csv_buffer = io.StringIO()
                     df.to_csv(csv_buffer, index=False, encoding='utf-8')
-                    csv_content = csv_buffer.getvalue()
-                    
-                    # Upload para S3
-                    self.s3_client.put_object(
-                        Bucket=self.bucket_name,
-                        Key=s3_key,
-                        Body=csv_content,
-                        ContentType='text/csv'
-                    )
-                    
-                    s3_path = f"s3://{self.bucket_name}/{s3_key}"
-                    saved_files[table_type] = s3_path
-                    
-                    print(f"Tabela {table_type} salva: {s3_path} ({len(df)} linhas)")
-                    
+                    pending.append((table_type, len(df), {
+                        'Key': s3_key,
+                        'Body': csv_buffer.getvalue(),
+                        'ContentType': 'text/csv'
+                    }))
                 except Exception as e:
                     print(f"Erro ao salvar {table_type} no S3: {str(e)}")
                     continue
         
+        # Upload para S3 (em paralelo)
+        errors = self.put_objects([obj for _, _, obj in pending])
+        for (table_type, row_count, obj), error in zip(pending, errors):
+            if error is not None:
+                print(f"Erro ao salvar {table_type} no S3: {str(error)}")
+                continue
+            
+            s3_path = f"s3://{self.bucket_name}/{obj['Key']}"
+            saved_files[table_type] = s3_path
+            
+            print(f"Tabela {table_type} salva: {s3_path} ({row_count} linhas)")
+        
         return saved_files
     
     def generate_and_save_delta_tables_to_s3(self, tables_data: Dict[str, pd.DataFrame], filename: str) -> Dict[str, str]:
@@ -1192,7 +1241,8 @@ class S3PDFProcessor:
             return False
     
     def upload_delta_structure_to_s3(self, local_delta_path: str, s3_delta_path: str):
-        """Upload completo da estrutura Delta para S3"""
+        """Upload completo da estrutura Delta para S3 (arquivos enviados em paralelo)"""
+        objects = []
         for root, dirs, files in os.walk(local_delta_path):
             for file in files:
                 local_file = os.path.join(root, file)
@@ -1202,16 +1252,15 @@ class S3PDFProcessor:
                 # Determina content type
                 content_type = 'application/json' if file.endswith('.json') else 'application/parquet'
                 
-                # Upload do arquivo
                 with open(local_file, 'rb') as f:
-                    self.s3_client.put_object(
-                        Bucket=self.bucket_name,
-                        Key=s3_key,
-                        Body=f.read(),
-                        ContentType=content_type
-                    )
-                
-                print(f"Uploaded: {s3_key}")
+                    objects.append({'Key': s3_key, 'Body': f.read(), 'ContentType': content_type})
+        
+        # Upload dos arquivos
+        errors = self.put_objects(objects)
+        for obj, error in zip(objects, errors):
+            if error is not None:
+                raise error
+            print(f"Uploaded: {obj['Key']}")
     
     def save_delta_table_to_s3(self, df: pd.DataFrame, table_name: str) -> str:
         """Salva tabela Delta simples no S3"""
@@ -0,0 +1,113 @@
+import asyncio
+import hashlib
+import os
+import tempfile
+import logging
+from typing import Optional
+
+logger = logging.getLogger(__name__)
+
+# Tamanho dos blocos lidos do upload (1 MiB)
+UPLOAD_CHUNK_SIZE = 1 << 20
+
+# Uploads de até UPLOAD_SHM_MAX_BYTES são gravados em /dev/shm (tmpfs): o arquivo é lido logo em
+# seguida e removido, então não precisa chegar ao disco. 0 desativa
+UPLOAD_SHM_DIR = "/dev/shm"
+UPLOAD_SHM_MAX_BYTES = int(os.getenv("UPLOAD_SHM_MAX_BYTES", str(16 << 20)))
+
+# Assinatura de PDF e janela inicial onde ela pode aparecer (leitores aceitam bytes antes do cabeçalho)
+PDF_MAGIC = b"%PDF-"
+PDF_HEADER_WINDOW = 1024
+
+
+def _sendfile_to(src_file, dst_file) -> int:
+    """
+    Copia o arquivo de upload (já em disco) para dst_file com os.sendfile, dentro do kernel
+    
+    Returns:
+        Número de bytes copiados
+    """
+    # fileno() de um SpooledTemporaryFile força o rollover para disco, se ainda não ocorreu
+    src_fd = src_file.fileno()
+    dst_fd = dst_file.fileno()
+    size = os.fstat(src_fd).st_size
+    offset = 0
+    while offset < size:
+        sent = os.sendfile(dst_fd, src_fd, offset, size - offset)
+        if sent == 0:
+            break
+        offset += sent
+    return offset
+
+
+async def has_pdf_signature(file) -> bool:
+    """
+    Verifica se o upload traz a assinatura de PDF no primeiro KiB (lê só esse trecho e volta ao início)
+    
+    Args:
+        file: UploadFile recebido pelo FastAPI
+    """
+    head = await file.read(PDF_HEADER_WINDOW)
+    await file.seek(0)
+    return PDF_MAGIC in head
+
+
+def _tempdir_for(size: Optional[int]) -> Optional[str]:
+    """Diretório do arquivo temporário: o tmpfs se o upload for pequeno e couber no espaço livre, senão o padrão (None)"""
+    if not size or size > UPLOAD_SHM_MAX_BYTES or not os.path.isdir(UPLOAD_SHM_DIR):
+        return None
+    try:
+        stats = os.statvfs(UPLOAD_SHM_DIR)
+    except OSError:
+        return None
+    return UPLOAD_SHM_DIR if size < stats.f_bavail * stats.f_frsize else None
+
+
+async def _copy_upload(file, tmp_dir: Optional[str], suffix: str, chunk_size: int) -> str:
+    """Copia o upload para um novo arquivo temporário em tmp_dir e retorna o caminho"""
+    tmp_file = await asyncio.to_thread(tempfile.NamedTemporaryFile, delete=False, suffix=suffix, dir=tmp_dir)
+    try:
+        if hasattr(os, "sendfile"):
+            await asyncio.to_thread(_sendfile_to, file.file, tmp_file)
+        else:
+            while chunk := await file.read(chunk_size):
+                await asyncio.to_thread(tmp_file.write, chunk)
+    except Exception:
+        tmp_file.close()
+        os.unlink(tmp_file.name)
+        raise
+    tmp_file.close()
+    return tmp_file.name
+
+
+async def save_upload_to_tempfile(file, suffix: str = ".pdf", chunk_size: int = UPLOAD_CHUNK_SIZE) -> str:
+    """
+    Grava um UploadFile em um arquivo temporário sem carregar o arquivo inteiro em memória
+    
+    O Starlette já mantém uploads grandes em um arquivo temporário; nesse caso os bytes são
+    copiados com sendfile (sem passar pelo espaço do usuário). Caso contrário, a cópia é
+    feita em blocos. Uploads pequenos vão para o tmpfs (/dev/shm); se faltar espaço lá,
+    a cópia é refeita no diretório temporário padrão.
+    
+    Args:
+        file: UploadFile recebido pelo FastAPI
+        suffix: Extensão do arquivo temporário
+        chunk_size: Tamanho de cada bloco lido (cópia em blocos)
+    
+    Returns:
+        Caminho do arquivo temporário (o chamador é responsável por removê-lo)
+    """
+    tmp_dir = _tempdir_for(getattr(file, "size", None))
+    if tmp_dir is not None:
+        try:
+            return await _copy_upload(file, tmp_dir, suffix, chunk_size)
+        except OSError as e:
+            logger.warning(f"Falha ao gravar upload em {tmp_dir}, usando o diretório temporário padrão: {e}")
+            await file.seek(0)
+    return await _copy_upload(file, None, suffix, chunk_size)
+
+
+def file_digest(path: str) -> str:
+    """Impressão digital (BLAKE2b de 128 bits) do conteúdo do arquivo, para detectar uploads repetidos"""
+    with open(path, "rb") as f:
+        return hashlib.file_digest(f, lambda: hashlib.blake2b(digest_size=16)).hexdigest()
@@ -0,0 +1,5 @@
+import os
+import sys
+
+# Os módulos do backend são importados como "services.*" (mesmo layout do uvicorn em backend/)
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -0,0 +1,47 @@
+import pytest
+from fastapi import FastAPI, routing
+from fastapi.responses import ORJSONResponse
+from fastapi.testclient import TestClient
+from pydantic import BaseModel
+
+from api import models
+from api.models import build_response
+
+
+class _UploadResponse(BaseModel):
+    message: str
+    pdf_name: str
+
+
+def test_build_response_skips_validation_by_default(monkeypatch):
+    monkeypatch.setattr(models, "ENABLE_VALIDATION", False)
+    
+    response = build_response(_UploadResponse, message="ok", pdf_name="doc.pdf")
+    
+    assert isinstance(response, ORJSONResponse)
+    assert response.body == b'{"message":"ok","pdf_name":"doc.pdf"}'
+
+
+@pytest.mark.parametrize("enable_validation", [False, True])
+def test_route_documented_with_responses_is_not_revalidated(monkeypatch, enable_validation):
+    monkeypatch.setattr(models, "ENABLE_VALIDATION", enable_validation)
+    validated_fields = []
+    serialize_response = routing.serialize_response
+    
+    async def spy(*, field=None, **kwargs):
+        validated_fields.append(field)
+        return await serialize_response(field=field, **kwargs)
+    
+    monkeypatch.setattr(routing, "serialize_response", spy)
+    app = FastAPI()
+    
+    @app.post("/upload", responses={200: {"model": _UploadResponse}})
+    async def upload():
+        return build_response(_UploadResponse, message="ok", pdf_name="doc.pdf")
+    
+    response = TestClient(app).post("/upload")
+    
+    assert response.json() == {"message": "ok", "pdf_name": "doc.pdf"}
+    # Sem response_model o FastAPI não revalida a resposta (e o modelo continua documentado no OpenAPI)
+    assert all(field is None for field in validated_fields)
+    assert "_UploadResponse" in app.openapi()["components"]["schemas"]
@@ -0,0 +1,212 @@
+import asyncio
+
+import pytest
+
+from services import chat_service
+from services.chat_service import ChatService, _plain_text, fit_context_docs
+
+
+class _FakeChromaClient:
+    def __init__(self):
+        self.embedded = []
+    
+    def health_check(self):
+        return True
+    
+    def embed_queries(self, queries):
+        self.embedded.extend(queries)
+        return [[1.0, 0.0] for _ in queries]
+
+
+class _FakeChroma:
+    def __init__(self, docs=None):
+        self.client = _FakeChromaClient()
+        self.docs = docs or []
+        self.searches = []
+    
+    def search_similar_content(self, query, pdf_name=None, user_id=None, max_results=5):
+        self.searches.append((query, pdf_name, user_id))
+        return self.docs
+
+
+class _FakeLLM:
+    """LLM falso: conta as chamadas e só responde quando `release` é liberado"""
+    
+    def __init__(self):
+        self.calls = 0
+        self.release = asyncio.Event()
+    
+    async def ainvoke(self, prompt):
+        self.calls += 1
+        await self.release.wait()
+        return f"resposta {self.calls}"
+
+
+@pytest.fixture
+def service(monkeypatch):
+    monkeypatch.setattr(ChatService, "setup_llm_models", lambda self: None)
+    svc = ChatService(use_bedrock=False, dynamodb=object(), chromadb=_FakeChroma())
+    svc._extract_text = _plain_text
+    svc._model_label = "fake"
+    return svc
+
+
+def test_concurrent_identical_questions_share_one_generation(service):
+    async def scenario():
+        service.llm = _FakeLLM()
+        key = ("doc.pdf", "pergunta", "ctx")
+        tasks = [asyncio.create_task(service._get_or_generate_answer(key, "prompt", "pergunta")) for _ in range(3)]
+        await asyncio.sleep(0)
+        service.llm.release.set()
+        return await asyncio.gather(*tasks), service.llm.calls
+    
+    results, calls = asyncio.run(scenario())
+    
+    assert calls == 1
+    assert [answer for answer, _ in results] == ["resposta 1"] * 3
+    assert sorted(hit for _, hit in results) == [False, True, True]
+
+
+def test_cancelled_owner_does_not_leave_waiters_stuck(service):
+    async def scenario():
+        service.llm = _FakeLLM()
+        key = ("doc.pdf", "pergunta", "ctx")
+        owner = asyncio.create_task(service._get_or_generate_answer(key, "prompt", "pergunta"))
+        await asyncio.sleep(0)
+        waiter = asyncio.create_task(service._get_or_generate_answer(key, "prompt", "pergunta"))
+        await asyncio.sleep(0)
+        
+        owner.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await owner
+        
+        # Quem aguardava assume a geração em vez de ficar preso no future abandonado
+        service.llm.release.set()
+        answer, _ = await asyncio.wait_for(waiter, timeout=1)
+        late, late_hit = await asyncio.wait_for(service._get_or_generate_answer(key, "prompt", "pergunta"), timeout=1)
+        return answer, late, late_hit
+    
+    answer, late, late_hit = asyncio.run(scenario())
+    
+    assert answer == "resposta 2"
+    assert (late, late_hit) == ("resposta 2", True)
+    assert service._inflight == {}
+
+
+def test_cancelled_waiter_does_not_cancel_the_shared_generation(service):
+    async def scenario():
+        service.llm = _FakeLLM()
+        key = ("doc.pdf", "pergunta", "ctx")
+        owner = asyncio.create_task(service._get_or_generate_answer(key, "prompt", "pergunta"))
+        await asyncio.sleep(0)
+        waiter = asyncio.create_task(service._get_or_generate_answer(key, "prompt", "pergunta"))
+        await asyncio.sleep(0)
+        
+        waiter.cancel()
+        service.llm.release.set()
+        return await asyncio.wait_for(owner, timeout=1)
+    
+    assert asyncio.run(scenario()) == ("resposta 1", False)
+
+
+def test_failed_generation_is_propagated_and_not_cached(service):
+    class _FailingLLM:
+        async def ainvoke(self, prompt):
+            raise RuntimeError("LLM indisponível")
+    
+    service.llm = _FailingLLM()
+    key = ("doc.pdf", "pergunta", "ctx")
+    
+    with pytest.raises(RuntimeError):
+        asyncio.run(service._get_or_generate_answer(key, "prompt", "pergunta"))
+    assert service._inflight == {}
+    assert service._answer_cache.get(key) is None
+
+
+def test_exact_cache_hit_does_not_embed_the_question(service, monkeypatch):
+    monkeypatch.setattr(chat_service, "ANSWER_SIMILARITY_THRESHOLD", 0.95)
+    key = ("doc.pdf", "user", "pergunta", "ctx")
+    service._set_cached_answer(key, "em cache")
+    
+    assert asyncio.run(service._get_or_generate_answer(key, "prompt", "pergunta")) == ("em cache", True)
+    assert service.chromadb.client.embedded == []
+
+
+def test_similarity_cache_is_disabled_by_default(service):
+    class _CountingLLM:
+        calls = 0
+        
+        async def ainvoke(self, prompt):
+            self.calls += 1
+            return "resposta"
+    
+    service.llm = _CountingLLM()
+    asyncio.run(service._get_or_generate_answer(("doc.pdf", "user", "qual o maior valor", "ctx"), "p1", "qual o maior valor"))
+    asyncio.run(service._get_or_generate_answer(("doc.pdf", "user", "qual o menor valor", "ctx"), "p2", "qual o menor valor"))
+    
+    assert chat_service.ANSWER_SIMILARITY_THRESHOLD == 0
+    assert service.llm.calls == 2
+    assert service.chromadb.client.embedded == []
+
+
+def test_fit_context_docs_respects_the_context_budget(monkeypatch):
+    monkeypatch.setattr(chat_service, "MAX_CTX_CHARS", 100)
+    docs = [
+        {"text": "a" * 60, "id": "1", "metadata": {"pdf_name": "doc.pdf", "chunk_index": 0}},
+        {"text": "b" * 30, "id": "2", "metadata": {"pdf_name": "doc.pdf", "chunk_index": 1}},
+        {"text": "c" * 30, "id": "3", "metadata": {"pdf_name": "doc.pdf", "chunk_index": 2}},
+    ]
+    
+    assert [doc["id"] for doc in fit_context_docs(docs)] == ["1", "2"]
+    # O primeiro trecho sempre entra, cortado no limite
+    assert fit_context_docs([{"text": "x" * 500, "id": "1", "metadata": {}}])[0]["text"] == "x" * 100
+
+
+def test_pdf_and_general_context_share_the_same_assembly(service):
+    service.chromadb.docs = [
+        {"text": "trecho 1", "score": 0.1, "metadata": {"pdf_name": "a.pdf", "chunk_index": 3}},
+        {"text": "trecho 2", "score": 0.2, "metadata": {}},
+    ]
+    
+    pdf_context, pdf_sources = service._prepare_pdf_context("pergunta", "b.pdf", "user")
+    general_context, general_sources = service._prepare_general_context("pergunta", "user")
+    
+    assert pdf_context == general_context == "trecho 1\n\ntrecho 2"
+    assert [source["pdf_name"] for source in pdf_sources] == ["a.pdf", "b.pdf"]
+    assert [source["pdf_name"] for source in general_sources] == ["a.pdf", "Unknown"]
+    assert service.chromadb.searches == [("pergunta", "b.pdf", "user"), ("pergunta", None, "user")]
+
+
+def test_context_override_skips_the_search(service):
+    context, sources = service._prepare_general_context("pergunta", "user", context_override="a\n\nb")
+    
+    assert context == "a\n\nb"
+    assert [source["pdf_name"] for source in sources] == ["Context Override"] * 2
+    assert service.chromadb.searches == []
+
+
+def test_reindexing_a_pdf_invalidates_its_answers_and_the_general_chat(service):
+    class _CountingLLM:
+        calls = 0
+        
+        async def ainvoke(self, prompt):
+            self.calls += 1
+            return f"resposta {self.calls}"
+    
+    service.llm = _CountingLLM()
+    keys = {
+        "doc": ("doc.pdf", "user", "pergunta", "ctx"),
+        "general": (chat_service.GENERAL_CHAT_PDF, "user", "pergunta", "ctx"),
+        "other": ("outro.pdf", "user", "pergunta", "ctx"),
+    }
+    for key in keys.values():
+        asyncio.run(service._get_or_generate_answer(key, "prompt", "pergunta"))
+    service._pdf_stats_cache[("doc.pdf", "user")] = {"chunks": 1}
+    
+    # Evento pdf_indexed (recebido do pool de processos ou da indexação em thread)
+    service.invalidate_answer_cache("doc.pdf")
+    
+    hits = {name: asyncio.run(service._get_or_generate_answer(key, "prompt", "pergunta"))[1]
+            for name, key in keys.items()}
+    assert hits == {"doc": False, "general": False, "other": True}
+    assert ("doc.pdf", "user") not in service._pdf_stats_cache
@@ -0,0 +1,171 @@
+import pytest
+import requests
+
+from services.chromadb_client import (
+    CHROMA_HEALTH_TIMEOUT, ChromaDBClient, ChromaDBService, _is_transient_add_error, _is_transient_error
+)
+
+
+def _http_error(status_code: int) -> requests.exceptions.HTTPError:
+    response = requests.Response()
+    response.status_code = status_code
+    return requests.exceptions.HTTPError(response=response)
+
+
+@pytest.mark.parametrize("error, expected", [
+    (requests.exceptions.ReadTimeout(), True),
+    (requests.exceptions.ConnectTimeout(), True),
+    (requests.exceptions.ConnectionError(), True),
+    (_http_error(429), True),
+    (_http_error(503), True),
+    (_http_error(400), False),
+    (_http_error(404), False),
+    (ValueError("resposta inválida"), False),
+])
+def test_retry_predicate(error, expected):
+    assert _is_transient_error(error) is expected
+
+
+@pytest.mark.parametrize("error, expected", [
+    # O lote pode ter sido inserido: não repete
+    (requests.exceptions.ReadTimeout(), False),
+    # A requisição nem chegou ao serviço: repete
+    (requests.exceptions.ConnectTimeout(), True),
+    (requests.exceptions.ConnectionError(), True),
+    (_http_error(503), True),
+    (_http_error(400), False),
+])
+def test_add_retry_predicate_skips_read_timeouts(error, expected):
+    assert _is_transient_add_error(error) is expected
+
+
+class _FakeSession:
+    def __init__(self, errors):
+        self.errors = list(errors)
+        self.calls = []
+    
+    def request(self, method, url, data=None, params=None, timeout=None):
+        self.calls.append((method, url, timeout))
+        if self.errors:
+            raise self.errors.pop(0)
+        response = requests.Response()
+        response.status_code = 200
+        response._content = b'{"status": "healthy", "document_ids": ["a"]}'
+        return response
+
+
+def _client(errors, max_retries=3):
+    client = ChromaDBClient("http://chroma:8001", max_retries=max_retries, base_delay=0, jitter=0)
+    client.session = _FakeSession(errors)
+    return client
+
+
+def test_query_is_retried_after_a_read_timeout():
+    client = _client([requests.exceptions.ReadTimeout()])
+    
+    assert client._make_request("POST", "/collections/rag/query", {"query": "x"})["status"] == "healthy"
+    assert len(client.session.calls) == 2
+
+
+def test_add_is_not_retried_after_a_read_timeout():
+    client = _client([requests.exceptions.ReadTimeout()])
+    
+    with pytest.raises(Exception):
+        client._make_request("POST", "/collections/rag/add", [{"text": "x"}])
+    assert len(client.session.calls) == 1
+
+
+def test_health_check_makes_a_single_short_attempt():
+    client = _client([requests.exceptions.ConnectionError()])
+    
+    assert client.health_check() is False
+    assert len(client.session.calls) == 1
+    assert client.session.calls[0][2] == CHROMA_HEALTH_TIMEOUT
+
+
+def test_to_documents_keeps_documents_when_lists_are_shorter():
+    documents = ChromaDBService._to_documents({
+        "documents": ["a", "b", "c"],
+        "metadatas": [{"pdf_name": "doc.pdf"}, None],
+        "distances": [0.1],
+    })
+    
+    assert [doc["text"] for doc in documents] == ["a", "b", "c"]
+    assert [doc["metadata"] for doc in documents] == [{"pdf_name": "doc.pdf"}, {}, {}]
+    assert [doc["score"] for doc in documents] == [0.1, 0, 0]
+    assert [doc["id"] for doc in documents] == ["", "", ""]
+
+
+def test_to_documents_of_an_empty_result():
+    assert ChromaDBService._to_documents({}) == []
+
+
+class _FakeChromaClient:
+    def __init__(self, result, count):
+        self.result = result
+        self.count = count
+        self.queries = []
+    
+    def query_documents(self, collection_name, query_text, n_results=5, filter_metadata=None):
+        self.queries.append((collection_name, n_results))
+        return self.result
+    
+    def count_documents(self, collection_name):
+        return self.count
+
+
+def _service(client):
+    service = ChromaDBService.__new__(ChromaDBService)
+    service.client = client
+    service.default_collection = "rag_documents"
+    return service
+
+
+def test_sample_collection_reports_the_collection_total_and_the_shown_documents():
+    client = _FakeChromaClient({
+        "documents": ["a", "b", "c"],
+        "metadatas": [{"pdf_name": "doc.pdf"}] * 3,
+        "distances": [0.1, 0.2, 0.3],
+        "ids": ["1", "2", "3"],
+    }, count=42)
+    
+    sample = _service(client).sample_collection(3)
+    
+    assert set(sample) == {"total_found", "shown", "documents", "metadatas", "distances", "ids"}
+    assert sample["total_found"] == 42
+    assert sample["shown"] == 3
+    assert sample["documents"] == ["a", "b", "c"]
+    assert client.queries == [("rag_documents", 3)]
+
+
+def test_sample_collection_of_an_empty_collection():
+    sample = _service(_FakeChromaClient({}, count=0)).sample_collection()
+    
+    assert sample == {"total_found": 0, "shown": 0, "documents": [], "metadatas": [], "distances": [], "ids": []}
+
+
+class _FakeGetClient:
+    def __init__(self, result):
+        self.result = result
+    
+    def get_documents(self, collection_name, where=None, limit=None, include=("metadatas",)):
+        return self.result
+
+
+def test_get_pdf_chunks_keeps_chunks_when_documents_are_shorter():
+    service = _service(_FakeGetClient({
+        "ids": ["c2", "c1", "c3"],
+        "documents": ["dois", "um"],
+        "metadatas": [{"chunk_index": 2}, {"chunk_index": 1}, {"chunk_index": 3}],
+    }))
+    
+    chunks = service.get_pdf_chunks("doc.pdf")
+    
+    assert [chunk["id"] for chunk in chunks] == ["c1", "c2", "c3"]
+    assert [chunk["text"] for chunk in chunks] == ["um", "dois", ""]
+
+
+def test_get_pdf_chunks_without_metadatas():
+    service = _service(_FakeGetClient({"ids": ["c1"], "documents": ["um"], "metadatas": None}))
+    
+    assert service.get_pdf_chunks("doc.pdf") == [{"text": "um", "metadata": {}, "id": "c1"}]
@@ -0,0 +1,82 @@
+import pytest
+
+from services import dynamodb_service
+from services.dynamodb_service import DynamoDBService
+
+
+class _FakeBatchWriter:
+    def __init__(self, table):
+        self.table = table
+        self.pending = []
+    
+    def __enter__(self):
+        return self
+    
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.table.commit(self.pending)
+        return False
+    
+    def put_item(self, Item):
+        self.pending.append(Item)
+
+
+class _FakeTable:
+    """Tabela falsa: falha nos primeiros `failures` envios de lote"""
+    
+    def __init__(self, failures=0):
+        self.failures = failures
+        self.items = {}
+    
+    def batch_writer(self):
+        if self.failures:
+            self.failures -= 1
+            raise RuntimeError("ProvisionedThroughputExceededException")
+        return _FakeBatchWriter(self)
+    
+    def commit(self, items):
+        for item in items:
+            self.items[item["chat_id"]] = item
+
+
+@pytest.fixture
+def service(monkeypatch):
+    monkeypatch.setattr(dynamodb_service.boto3, "resource", lambda *args, **kwargs: object())
+    monkeypatch.setattr(DynamoDBService, "_ensure_tables_exist", lambda self: None)
+    monkeypatch.setattr(dynamodb_service, "CHAT_WRITE_RETRY_DELAY", 0)
+    return DynamoDBService()
+
+
+def _enqueue(svc, n):
+    return [svc.enqueue_chat_interaction("user", "doc.pdf", f"pergunta {i}", f"resposta {i}") for i in range(n)]
+
+
+def test_flush_on_shutdown_writes_pending_chats(service):
+    table = service._table_handles["chat_history"] = _FakeTable()
+    
+    chat_ids = _enqueue(service, 30)
+    service.flush_chat_writes(timeout=5)
+    
+    assert sorted(table.items) == sorted(chat_ids)
+    assert service._chat_writer is None
+    assert service.failed_chat_writes == 0
+
+
+def test_failed_batches_are_retried(service):
+    table = service._table_handles["chat_history"] = _FakeTable(failures=dynamodb_service.CHAT_WRITE_MAX_ATTEMPTS - 1)
+    
+    chat_ids = _enqueue(service, 3)
+    service.flush_chat_writes(timeout=5)
+    
+    assert sorted(table.items) == sorted(chat_ids)
+    assert service.failed_chat_writes == 0
+
+
+def test_batches_that_keep_failing_are_counted(service):
+    table = service._table_handles["chat_history"] = _FakeTable(failures=10 ** 6)
+    
+    _enqueue(service, 3)
+    service.flush_chat_writes(timeout=5)
+    
+    assert table.items == {}
+    assert service.failed_chat_writes == 3
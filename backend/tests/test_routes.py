@@ -0,0 +1,34 @@
+import orjson
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from api.routes import router
+
+
+class _FakeChatService:
+    def __init__(self):
+        self.questions = []
+    
+    async def stream_question(self, question, pdf_name, user_id=None, context_override=None):
+        self.questions.append((question, pdf_name))
+        yield {"type": "sources", "sources": [{"pdf_name": pdf_name}]}
+        yield {"type": "delta", "text": "olá "}
+        yield {"type": "delta", "text": "mundo"}
+        yield {"type": "done", "metadata": {"cache_hit": False}}
+
+
+def test_ask_streams_every_event_until_done():
+    app = FastAPI()
+    app.include_router(router)
+    app.state.chat_service = _FakeChatService()
+    
+    response = TestClient(app).post("/ask", json={"question": "pergunta", "pdf_name": "doc.pdf"})
+    
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/event-stream")
+    payloads = [line[len("data: "):] for line in response.text.split("\n\n") if line]
+    assert payloads[-1] == "[DONE]"
+    events = [orjson.loads(payload) for payload in payloads[:-1]]
+    assert [event["type"] for event in events] == ["sources", "delta", "delta", "done"]
+    assert "".join(event["text"] for event in events if event["type"] == "delta") == "olá mundo"
+    assert app.state.chat_service.questions == [("pergunta", "doc.pdf")]
@@ -2,22 +2,55 @@ from fastapi import FastAPI, HTTPException
 from fastapi.middleware.cors import CORSMiddleware
 from pydantic import BaseModel
 from typing import List, Optional, Dict, Any
+from contextlib import asynccontextmanager
+import asyncio
 import chromadb
 from chromadb.config import Settings
 import uuid
+import json
 import logging
 from datetime import datetime
 import os
+import threading
+from collections import OrderedDict
+import numpy as np
 from sentence_transformers import SentenceTransformer
 
 # Configurar logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# Fica True quando o aquecimento termina (com sucesso ou não); até lá /health responde 503
+warmup_done = False
+
+def warmup():
+    """Carrega o modelo de embeddings e o índice da coleção padrão antes do primeiro pedido"""
+    global warmup_done
+    try:
+        collection = get_or_create_collection("rag_documents")
+        collection.query(
+            query_embeddings=embed_queries(["warmup"]),
+            n_results=1,
+            include=["distances"]
+        )
+        logger.info("Aquecimento concluído")
+    except Exception as e:
+        logger.warning(f"Falha no aquecimento: {e}")
+    finally:
+        warmup_done = True
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Aquece o serviço em segundo plano na inicialização"""
+    warmup_task = asyncio.create_task(asyncio.to_thread(warmup))
+    yield
+    warmup_task.cancel()
+
 app = FastAPI(
     title="ChromaDB RAG Service",
     description="Serviço para gerenciar embeddings RAG com ChromaDB",
-    version="0.0.7"
+    version="0.0.7",
+    lifespan=lifespan
 )
 
 # Configurar CORS
@@ -102,6 +135,24 @@ def get_chromadb_client():
 # Inicializar modelo de embeddings de forma robusta
 embedding_model = None
 
+# Tamanho dos lotes usados pelo modelo ao gerar embeddings de vários chunks
+EMBEDDING_BATCH_SIZE = int(os.getenv("EMBEDDING_BATCH_SIZE", "64"))
+
+# Cache LRU de embeddings de queries, por texto normalizado. O modelo é uncased, então
+# normalizar caixa e espaços não altera o vetor gerado
+QUERY_EMBEDDING_CACHE_SIZE = int(os.getenv("QUERY_EMBEDDING_CACHE_SIZE", "4096"))
+query_embedding_cache: "OrderedDict[str, List[float]]" = OrderedDict()
+query_embedding_cache_lock = threading.Lock()
+
+# Cache semântico de resultados: uma query cujo embedding tem similaridade de cosseno >= SEMANTIC_CACHE_THRESHOLD
+# com o de uma query recente (mesma coleção, filtros e n_results) reaproveita o resultado dela sem consultar
+# o índice. SEMANTIC_CACHE_SIZE é o total de entradas (LRU); 0 desativa o cache.
+# Desativado por padrão: queries parecidas mas distintas (ex.: "receita de 2022" x "receita de 2023") podem
+# passar do limiar e receber os trechos da outra, piorando o contexto do LLM sem nenhum aviso. Só ativar
+# (ex.: SEMANTIC_CACHE_SIZE=10000) com um limiar alto, aceitando essa perda de precisão em troca de latência
+SEMANTIC_CACHE_SIZE = int(os.getenv("SEMANTIC_CACHE_SIZE", "0"))
+SEMANTIC_CACHE_THRESHOLD = float(os.getenv("SEMANTIC_CACHE_THRESHOLD", "0.95"))
+
 def get_embedding_model():
     """Inicializa o modelo de embeddings com lazy loading"""
     global embedding_model
@@ -133,28 +184,197 @@ class QueryResponse(BaseModel):
     distances: List[float]
     ids: List[str]
 
+class BatchQueryRequest(BaseModel):
+    queries: List[QueryRequest]
+
+class BatchQueryResponse(BaseModel):
+    results: List[QueryResponse]
+
+class GetRequest(BaseModel):
+    where: Optional[Dict[str, Any]] = None
+    limit: Optional[int] = None
+    offset: Optional[int] = None
+    include: List[str] = ["metadatas"]
+
+class GetResponse(BaseModel):
+    ids: List[str]
+    documents: Optional[List[str]] = None
+    metadatas: Optional[List[Dict[str, Any]]] = None
+
+class EmbedRequest(BaseModel):
+    texts: List[str]
+
+class EmbedResponse(BaseModel):
+    embeddings: List[List[float]]
+
 class CollectionInfo(BaseModel):
     name: str
     count: int
     metadata: Optional[Dict[str, Any]] = None
 
+class SemanticQueryCache:
+    """Cache de resultados de busca indexado pelo embedding da query (vizinho mais próximo por cosseno)"""
+    
+    def __init__(self, capacity: int, threshold: float):
+        self.capacity = capacity
+        self.threshold = threshold
+        self._lock = threading.Lock()
+        # (coleção, filtros) -> {"vectors": matriz de embeddings normalizados, "valid": máscara dos slots
+        # ocupados, "results": resultado de cada slot, "free": slots livres}
+        self._groups: Dict[tuple, Dict[str, Any]] = {}
+        # Ordem de uso das entradas (grupo, slot), da menos para a mais recente
+        self._lru: "OrderedDict[tuple, None]" = OrderedDict()
+    
+    @staticmethod
+    def group_key(collection_name: str, request: QueryRequest) -> tuple:
+        """Chave do grupo de queries comparáveis entre si"""
+        return (collection_name, json.dumps([request.n_results, request.where], sort_keys=True))
+    
+    @staticmethod
+    def _normalize(embedding: List[float]) -> np.ndarray:
+        vector = np.asarray(embedding, dtype=np.float32)
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
+    
+    def get(self, key: tuple, embedding: List[float]) -> Optional["QueryResponse"]:
+        """Resultado da query mais parecida do grupo, se a similaridade atingir o limiar"""
+        if self.capacity <= 0:
+            return None
+        
+        with self._lock:
+            group = self._groups.get(key)
+            if group is None or not group["valid"].any():
+                return None
+            
+            similarities = group["vectors"] @ self._normalize(embedding)
+            similarities[~group["valid"]] = -1.0
+            slot = int(np.argmax(similarities))
+            if similarities[slot] < self.threshold:
+                return None
+            
+            self._lru.move_to_end((key, slot))
+            return group["results"][slot]
+    
+    def put(self, key: tuple, embedding: List[float], result: "QueryResponse"):
+        """Guarda o resultado da query (removendo a entrada usada há mais tempo se o cache estiver cheio)"""
+        if self.capacity <= 0:
+            return
+        
+        vector = self._normalize(embedding)
+        with self._lock:
+            while len(self._lru) >= self.capacity:
+                self._evict(*self._lru.popitem(last=False)[0])
+            
+            group = self._groups.get(key)
+            if group is None:
+                group = self._groups[key] = {
+                    "vectors": np.zeros((8, vector.shape[0]), dtype=np.float32),
+                    "valid": np.zeros(8, dtype=bool),
+                    "results": [None] * 8,
+                    "free": list(range(7, -1, -1))
+                }
+            
+            if not group["free"]:
+                # Grupo cheio: dobra a capacidade da matriz
+                size = len(group["results"])
+                group["vectors"] = np.vstack([group["vectors"], np.zeros_like(group["vectors"])])
+                group["valid"] = np.concatenate([group["valid"], np.zeros(size, dtype=bool)])
+                group["results"].extend([None] * size)
+                group["free"] = list(range(2 * size - 1, size - 1, -1))
+            
+            slot = group["free"].pop()
+            group["vectors"][slot] = vector
+            group["valid"][slot] = True
+            group["results"][slot] = result
+            self._lru[(key, slot)] = None
+    
+    def _evict(self, key: tuple, slot: int):
+        group = self._groups[key]
+        group["valid"][slot] = False
+        group["results"][slot] = None
+        group["free"].append(slot)
+        if not group["valid"].any():
+            del self._groups[key]
+    
+    def invalidate(self, collection_name: str):
+        """Descarta os resultados de uma coleção (documentos adicionados, removidos ou coleção recriada)"""
+        with self._lock:
+            stale = [entry for entry in self._lru if entry[0][0] == collection_name]
+            for entry in stale:
+                del self._lru[entry]
+            for key in [key for key in self._groups if key[0] == collection_name]:
+                del self._groups[key]
+
+semantic_cache = SemanticQueryCache(SEMANTIC_CACHE_SIZE, SEMANTIC_CACHE_THRESHOLD)
+
+# Handles das coleções já abertas (evita get_collection a cada requisição)
+collection_handles: Dict[str, Any] = {}
+
 # Funções auxiliares
 def get_or_create_collection(name: str):
-    """Obtém ou cria uma coleção no ChromaDB"""
+    """Obtém ou cria uma coleção no ChromaDB (handle mantido em cache)"""
+    collection = collection_handles.get(name)
+    if collection is not None:
+        return collection
+    
     client = get_chromadb_client()
     try:
-        return client.get_collection(name=name)
+        collection = client.get_collection(name=name)
     except Exception:
-        return client.create_collection(
+        collection = client.create_collection(
             name=name,
             metadata={"created_at": datetime.now().isoformat()}
         )
+    collection_handles[name] = collection
+    return collection
+
+def forget_collection(name: str):
+    """Descarta o handle em cache (e os resultados em cache) de uma coleção removida ou recriada"""
+    collection_handles.pop(name, None)
+    semantic_cache.invalidate(name)
 
 def generate_embedding(text: str) -> List[float]:
     """Gera embedding para um texto"""
     model = get_embedding_model()
     return model.encode(text).tolist()
 
+def generate_embeddings(texts: List[str]) -> List[List[float]]:
+    """Gera embeddings para vários textos em uma única chamada (lotes no modelo)"""
+    model = get_embedding_model()
+    return model.encode(texts, batch_size=EMBEDDING_BATCH_SIZE).tolist()
+
+def normalize_query(text: str) -> str:
+    """Normaliza o texto da query para uso como chave do cache de embeddings"""
+    return " ".join(text.lower().split())
+
+def embed_queries(texts: List[str]) -> List[List[float]]:
+    """Gera embeddings de queries usando o cache LRU; as ausentes do cache são geradas em um único lote"""
+    keys = [normalize_query(text) for text in texts]
+    embeddings: List[Optional[List[float]]] = [None] * len(keys)
+    missing: Dict[str, List[int]] = {}
+    
+    with query_embedding_cache_lock:
+        for i, key in enumerate(keys):
+            cached = query_embedding_cache.get(key)
+            if cached is not None:
+                query_embedding_cache.move_to_end(key)
+                embeddings[i] = cached
+            else:
+                missing.setdefault(key, []).append(i)
+    
+    if missing:
+        new_embeddings = generate_embeddings(list(missing))
+        with query_embedding_cache_lock:
+            for key, embedding in zip(missing, new_embeddings):
+                query_embedding_cache[key] = embedding
+                query_embedding_cache.move_to_end(key)
+                for i in missing[key]:
+                    embeddings[i] = embedding
+            while len(query_embedding_cache) > QUERY_EMBEDDING_CACHE_SIZE:
+                query_embedding_cache.popitem(last=False)
+    
+    return embeddings
+
 # Endpoints
 @app.get("/")
 async def root():
@@ -167,7 +387,10 @@ async def root():
 
 @app.get("/health")
 async def health_check():
-    """Endpoint de verificação de saúde"""
+    """Endpoint de verificação de saúde (503 enquanto o aquecimento não terminar)"""
+    if not warmup_done:
+        raise HTTPException(status_code=503, detail="Aquecendo: carregando modelo de embeddings e índice")
+    
     try:
         collections = get_chromadb_client().list_collections()
         return {
@@ -189,15 +412,14 @@ async def add_documents(collection_name: str, chunks: List[DocumentChunk]):
         documents = []
         metadatas = []
         ids = []
-        embeddings = []
+        
+        # Gerar embeddings de todos os chunks de uma vez
+        embeddings = generate_embeddings([chunk.text for chunk in chunks])
         
         for chunk in chunks:
             # Gerar ID único se não fornecido
             chunk_id = chunk.chunk_id or str(uuid.uuid4())
             
-            # Gerar embedding
-            embedding = generate_embedding(chunk.text)
-            
             # Adicionar timestamp aos metadados
             metadata = chunk.metadata.copy()
             metadata.update({
@@ -208,7 +430,6 @@ async def add_documents(collection_name: str, chunks: List[DocumentChunk]):
             documents.append(chunk.text)
             metadatas.append(metadata)
             ids.append(chunk_id)
-            embeddings.append(embedding)
         
         # Inserir no ChromaDB
         collection.add(
@@ -218,6 +439,7 @@ async def add_documents(collection_name: str, chunks: List[DocumentChunk]):
             embeddings=embeddings
         )
         
+        semantic_cache.invalidate(collection_name)
         logger.info(f"Adicionados {len(chunks)} documentos à coleção {collection_name}")
         
         return {
@@ -236,8 +458,15 @@ async def query_documents(collection_name: str, request: QueryRequest):
     try:
         collection = get_or_create_collection(collection_name)
         
-        # Gerar embedding da query
-        query_embedding = generate_embedding(request.query)
+        # Gerar embedding da query (ou reaproveitar do cache)
+        query_embedding = embed_queries([request.query])[0]
+        
+        # Query praticamente igual a uma recente: reaproveita o resultado
+        cache_key = SemanticQueryCache.group_key(collection_name, request)
+        cached = semantic_cache.get(cache_key, query_embedding)
+        if cached is not None:
+            logger.info(f"Query na coleção {collection_name} atendida pelo cache semântico")
+            return cached
         
         # Realizar busca
         results = collection.query(
@@ -249,17 +478,102 @@ async def query_documents(collection_name: str, request: QueryRequest):
         
         logger.info(f"Query realizada na coleção {collection_name}: {len(results['documents'][0])} resultados")
         
-        return QueryResponse(
+        response = QueryResponse(
             documents=results['documents'][0],
             metadatas=results['metadatas'][0],
             distances=results['distances'][0],
             ids=results['ids'][0]
         )
+        semantic_cache.put(cache_key, query_embedding, response)
+        return response
         
     except Exception as e:
         logger.error(f"Erro na query: {str(e)}")
         raise HTTPException(status_code=500, detail=str(e))
 
+@app.post("/collections/{collection_name}/query_batch", response_model=BatchQueryResponse)
+async def query_documents_batch(collection_name: str, request: BatchQueryRequest):
+    """Busca várias queries de uma vez: embeddings gerados em lote e uma única consulta
+    ao ChromaDB para cada grupo de queries com os mesmos filtros e n_results"""
+    try:
+        collection = get_or_create_collection(collection_name)
+        queries = request.queries
+        
+        if not queries:
+            return BatchQueryResponse(results=[])
+        
+        # Gerar embeddings de todas as queries de uma vez (as repetidas vêm do cache)
+        query_embeddings = embed_queries([q.query for q in queries])
+        
+        # Queries praticamente iguais a uma recente saem do cache semântico; as demais são agrupadas
+        # por (n_results, where), já que o ChromaDB aplica o mesmo filtro à consulta inteira
+        results: List[Optional[QueryResponse]] = [None] * len(queries)
+        cache_keys = [SemanticQueryCache.group_key(collection_name, q) for q in queries]
+        groups: Dict[tuple, List[int]] = {}
+        for i, q in enumerate(queries):
+            results[i] = semantic_cache.get(cache_keys[i], query_embeddings[i])
+            if results[i] is None:
+                groups.setdefault(cache_keys[i], []).append(i)
+        
+        for indices in groups.values():
+            first = queries[indices[0]]
+            group_results = collection.query(
+                query_embeddings=[query_embeddings[i] for i in indices],
+                n_results=first.n_results,
+                where=first.where,
+                include=["documents", "metadatas", "distances"]
+            )
+            for pos, i in enumerate(indices):
+                results[i] = QueryResponse(
+                    documents=group_results['documents'][pos],
+                    metadatas=group_results['metadatas'][pos],
+                    distances=group_results['distances'][pos],
+                    ids=group_results['ids'][pos]
+                )
+                semantic_cache.put(cache_keys[i], query_embeddings[i], results[i])
+        
+        logger.info(f"Query em lote na coleção {collection_name}: {len(queries)} queries em {len(groups)} consultas")
+        
+        return BatchQueryResponse(results=results)
+        
+    except Exception as e:
+        logger.error(f"Erro na query em lote: {str(e)}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+@app.post("/collections/{collection_name}/get", response_model=GetResponse)
+async def get_documents(collection_name: str, request: GetRequest):
+    """Lista documentos por filtro de metadados (sem embedding da query nem busca por similaridade)"""
+    try:
+        collection = get_or_create_collection(collection_name)
+        include = [field for field in request.include if field in ("documents", "metadatas")]
+        results = collection.get(
+            where=request.where,
+            limit=request.limit,
+            offset=request.offset,
+            include=include
+        )
+        
+        logger.info(f"Get na coleção {collection_name}: {len(results['ids'])} documentos")
+        
+        return GetResponse(
+            ids=results['ids'],
+            documents=results.get('documents') if "documents" in include else None,
+            metadatas=results.get('metadatas') if "metadatas" in include else None
+        )
+        
+    except Exception as e:
+        logger.error(f"Erro no get: {str(e)}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+@app.post("/embed", response_model=EmbedResponse)
+async def embed_texts(request: EmbedRequest):
+    """Gera embeddings de queries (mesmo cache LRU usado pelas buscas)"""
+    try:
+        return EmbedResponse(embeddings=embed_queries(request.texts) if request.texts else [])
+    except Exception as e:
+        logger.error(f"Erro ao gerar embeddings: {str(e)}")
+        raise HTTPException(status_code=500, detail=str(e))
+
 @app.get("/collections")
 async def list_collections():
     """Lista todas as coleções"""
@@ -303,6 +617,7 @@ async def delete_collection(collection_name: str):
     """Deleta uma coleção"""
     try:
         get_chromadb_client().delete_collection(collection_name)
+        forget_collection(collection_name)
         
         return {
             "message": f"Coleção {collection_name} deletada com sucesso"
@@ -317,6 +632,7 @@ async def delete_documents(collection_name: str, document_ids: List[str]):
     try:
         collection = get_chromadb_client().get_collection(collection_name)
         collection.delete(ids=document_ids)
+        semantic_cache.invalidate(collection_name)
         
         return {
             "message": f"Removidos {len(document_ids)} documentos da coleção {collection_name}",
@@ -335,6 +651,7 @@ async def reset_collection(collection_name: str):
             get_chromadb_client().delete_collection(collection_name)
         except:
             pass  # Coleção pode não existir
+        forget_collection(collection_name)
         
         collection = get_chromadb_client().create_collection(
             name=collection_name,
@@ -378,4 +695,4 @@ async def get_stats():
 
 if __name__ == "__main__":
     import uvicorn
-    uvicorn.run(app, host="0.0.0.0", port=8001)
+    uvicorn.run(app, host="0.0.0.0", port=8001, timeout_keep_alive=75)
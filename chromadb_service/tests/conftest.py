@@ -0,0 +1,5 @@
+import os
+import sys
+
+# main.py é importado como módulo de nível superior (mesmo layout do uvicorn em chromadb_service/)
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
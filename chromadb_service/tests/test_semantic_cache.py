@@ -0,0 +1,40 @@
+import main
+from main import SemanticQueryCache
+
+KEY = ("rag_documents", "[5, null]")
+
+
+def test_semantic_cache_is_disabled_by_default():
+    assert main.SEMANTIC_CACHE_SIZE == 0
+    
+    cache = SemanticQueryCache(main.SEMANTIC_CACHE_SIZE, main.SEMANTIC_CACHE_THRESHOLD)
+    cache.put(KEY, [1.0, 0.0], "resultado")
+    assert cache.get(KEY, [1.0, 0.0]) is None
+
+
+def test_distinct_queries_below_threshold_are_not_merged():
+    cache = SemanticQueryCache(16, 0.95)
+    cache.put(KEY, [1.0, 0.0], "resultado A")
+    
+    # Cosseno ~0.9 com a query guardada: abaixo do limiar, não pode receber o resultado dela
+    assert cache.get(KEY, [0.9, 0.436]) is None
+    
+    cache.put(KEY, [0.9, 0.436], "resultado B")
+    assert cache.get(KEY, [1.0, 0.0]) == "resultado A"
+    assert cache.get(KEY, [0.9, 0.436]) == "resultado B"
+
+
+def test_queries_from_other_groups_are_not_merged():
+    cache = SemanticQueryCache(16, 0.95)
+    cache.put(KEY, [1.0, 0.0], "resultado")
+    
+    assert cache.get(("rag_documents", "[10, null]"), [1.0, 0.0]) is None
+    assert cache.get(("outra_colecao", "[5, null]"), [1.0, 0.0]) is None
+
+
+def test_invalidate_drops_collection_results():
+    cache = SemanticQueryCache(16, 0.95)
+    cache.put(KEY, [1.0, 0.0], "resultado")
+    
+    cache.invalidate("rag_documents")
+    assert cache.get(KEY, [1.0, 0.0]) is None